@@ -56,6 +56,13 @@ class User(AbstractBaseUser):
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = [ "first_name", "last_name", "phone_number"]
+
+    class Meta:
+        indexes = [
+            # Customer (non-staff) signups by date
+            models.Index(fields=['is_staff', 'date_joined'], name='user_staff_joined_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -1,5 +1,6 @@
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
 from djoser.serializers import UserSerializer as BaseUserSerializer
+from backend.sparse import SparseFieldsMixin
 from .models import User
 
 
@@ -9,7 +10,7 @@ class UserCreateSerializer(BaseUserCreateSerializer):
         fields = ("id", "email", "password", "first_name", "last_name", "phone_number")
 
 
-class UserSerializer(BaseUserSerializer):
+class UserSerializer(SparseFieldsMixin, BaseUserSerializer):
     class Meta(BaseUserSerializer.Meta):
         model = User
         fields = [
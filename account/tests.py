@@ -1,3 +1,26 @@
+from datetime import timedelta
+from unittest import skipUnless
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from backend.explain import QueryPlanTestMixin
+from .models import User
 
-# Create your tests here.
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are checked on PostgreSQL")
+class UserQueryPlanTests(QueryPlanTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create([
+            User(
+                email=f'user{i}@example.com', first_name='User', last_name=str(i),
+                phone_number=f'97{i:08d}', is_staff=i % 50 == 0
+            )
+            for i in range(2000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_customer_signups_by_date(self):
+        queryset = User.objects.filter(is_staff=False, date_joined__gte=timezone.now() - timedelta(days=30))
+        self.assertUsesIndex(queryset, 'user_staff_joined_idx')
@@ -0,0 +1,44 @@
+"""Small timing helpers shared by the benchmark management commands."""
+import math
+import subprocess
+import time
+from django.conf import settings
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (pct in 0-100)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples_ms):
+    """p50/p90/p99/mean/max in milliseconds for a list of samples"""
+    return {
+        'runs': len(samples_ms),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p90_ms': round(percentile(samples_ms, 90), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'mean_ms': round(sum(samples_ms) / len(samples_ms), 3),
+        'max_ms': round(max(samples_ms), 3),
+    }
+
+
+def time_call(func, *args, **kwargs):
+    """Run ``func`` once and return (elapsed milliseconds, result)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def git_commit():
+    """Short hash of the checked out commit, for benchmark reports"""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
@@ -0,0 +1,135 @@
+"""
+Read-replica routing.
+
+PrimaryReplicaRouter sends reads of the DATABASE_REPLICA_APPS models (the
+catalogue, reviews, dashboard rollups and recommendations) to a random
+DATABASE_REPLICAS alias, and everything else to the primary. Code that can
+tolerate replication lag for other models too, like the dashboard
+statistics, opts in with replica_reads().
+
+Reads go to the primary whenever they could miss a write:
+
+* once the current request (or management command) has written anything;
+* for the whole of an unsafe (POST, PUT, PATCH, DELETE) request, so that
+  validation reads before the first write see fresh rows;
+* inside a transaction on the primary;
+* for DATABASE_PRIMARY_PIN_SECONDS after a request of the same client
+  wrote, through a cookie set by PrimaryPinningMiddleware, so a client
+  reads its own writes back.
+
+Without replicas configured every query goes to the primary.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class PrimaryPin:
+    """Whether the current request reads from the primary, and whether it wrote"""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_pin = ContextVar('db_primary_pin', default=None)
+_replica_reads = ContextVar('db_replica_reads', default=False)
+
+
+def _current_pin():
+    pin = _pin.get()
+    if pin is None:
+        # Outside a request: the pin lasts for the rest of this context
+        pin = PrimaryPin()
+        _pin.set(pin)
+    return pin
+
+
+def pin_to_primary():
+    """Read from the primary for the rest of the current request"""
+    _current_pin().pinned = True
+
+
+@contextmanager
+def primary_pin_scope(pinned=False):
+    """A fresh pin for the code inside, like each request gets; yields the PrimaryPin"""
+    pin = PrimaryPin(pinned)
+    token = _pin.set(pin)
+    try:
+        yield pin
+    finally:
+        _pin.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    """Let reads of every model inside go to a replica, unless pinned to the primary"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or _current_pin().pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if _replica_reads.get() or model._meta.app_label in settings.DATABASE_REPLICA_APPS:
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin = _current_pin()
+        pin.pinned = pin.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinningMiddleware:
+    """Gives each request its own PrimaryPin and keeps writing clients on the primary for a while"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with primary_pin_scope(self.pinned(request)) as pin:
+            response = self.get_response(request)
+        return self.finish(pin, response)
+
+    async def __acall__(self, request):
+        # Sync views and the async ORM run in sync_to_async, which copies
+        # the context; the pin is shared by reference, so their writes count
+        with primary_pin_scope(self.pinned(request)) as pin:
+            response = await self.get_response(request)
+        return self.finish(pin, response)
+
+    def pinned(self, request):
+        return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    def finish(self, pin, response):
+        if pin.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DATABASE_PRIMARY_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
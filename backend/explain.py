@@ -0,0 +1,52 @@
+"""
+Query plan checks for the hot-path indexes (PostgreSQL only).
+
+QueryPlanTestMixin asserts that a queryset can be served without a
+sequential scan. Plans are taken with enable_seqscan off: the planner still
+falls back to a Seq Scan when no index can serve the query, so the check
+does not depend on table sizes the way a plain EXPLAIN on test data would.
+
+Plans that depend on index-only scans need vacuumed tables: build their
+data in a TransactionTestCase and call vacuum_analyze() before checking.
+"""
+import json
+from django.db import connections, transaction
+
+
+def explain(queryset):
+    """EXPLAIN (FORMAT JSON) of ``queryset``, as the root plan node"""
+    connection = connections[queryset.db]
+    with transaction.atomic(using=queryset.db), connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        try:
+            plan = queryset.explain(format='json')
+        finally:
+            cursor.execute('SET LOCAL enable_seqscan = on')
+    return json.loads(plan)[0]['Plan']
+
+
+def vacuum_analyze(*models, using='default'):
+    """VACUUM ANALYZE the models' tables; must run outside a transaction"""
+    with connections[using].cursor() as cursor:
+        for model in models:
+            cursor.execute(f'VACUUM ANALYZE {connections[using].ops.quote_name(model._meta.db_table)}')
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+class QueryPlanTestMixin:
+    """Assertions over query plans"""
+
+    def assertNoSeqScan(self, queryset):
+        plan = explain(queryset)
+        scanned = [node['Relation Name'] for node in plan_nodes(plan) if node['Node Type'] == 'Seq Scan']
+        self.assertFalse(scanned, f"Sequential scan on {', '.join(scanned)}:\n{json.dumps(plan, indent=2)}")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = explain(queryset)
+        used = {node.get('Index Name') for node in plan_nodes(plan)}
+        self.assertIn(index_name, used, f"{index_name} not used:\n{json.dumps(plan, indent=2)}")
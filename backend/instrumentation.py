@@ -0,0 +1,256 @@
+"""
+Per-endpoint query and timing metrics for the REST API.
+
+QueryMetricsMiddleware counts the SQL queries and database time of every
+request (through connection.execute_wrapper) along with the wall time and
+response size. Views using InstrumentedViewMixin label the request with
+their class and action ("ProductViewSet.list") and time the top-level
+serializer's to_representation(); other requests are labelled with their
+URL name.
+
+Each request's figures go to:
+
+* the X-Query-Count and Server-Timing response headers, when
+  QUERY_METRICS_HEADERS is on (default: DEBUG);
+* the in-process registry, served in the Prometheus text format by
+  metrics_view. Counters are per process: scrape every worker.
+
+Viewsets declare ``query_budgets = {action: max queries}``. A request over
+its budget is logged and counted, and raises QueryBudgetExceeded when
+QUERY_BUDGETS_STRICT is on, which QueryBudgetTestMixin turns on in tests.
+"""
+import logging
+import threading
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    """Figures of one request; also the execute wrapper that counts its queries"""
+
+    def __init__(self):
+        self.endpoint = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += perf_counter() - started
+
+    @contextmanager
+    def collect(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+class MetricsRegistry:
+    """Counters per endpoint, shared by the threads of this process"""
+
+    COUNTERS = (
+        ('requests', 'api_requests_total', "Requests handled"),
+        ('queries', 'api_db_queries_total', "SQL queries executed"),
+        ('db_seconds', 'api_db_seconds_total', "Time spent in SQL queries"),
+        ('serializer_seconds', 'api_serializer_seconds_total', "Time spent serializing responses"),
+        ('response_bytes', 'api_response_bytes_total', "Response body bytes"),
+        ('seconds', 'api_request_seconds_total', "Wall time spent handling requests"),
+        ('budget_exceeded', 'api_query_budget_exceeded_total', "Requests over their query budget"),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(lambda: dict.fromkeys((key for key, _, _ in self.COUNTERS), 0))
+
+    def record(self, endpoint, **values):
+        with self._lock:
+            counters = self._endpoints[endpoint]
+            for key, value in values.items():
+                counters[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: dict(counters) for endpoint, counters in self._endpoints.items()}
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def render(self):
+        """The counters in the Prometheus text exposition format"""
+        snapshot = sorted(self.snapshot().items())
+        lines = []
+        for key, name, description in self.COUNTERS:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for endpoint, counters in snapshot:
+                label = endpoint.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{name}{{endpoint="{label}"}} {counters[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match._func_path
+
+
+class QueryMetricsMiddleware:
+    """
+    Under ASGI, queries run on the request's sync_to_async thread (the
+    async ORM and sync views alike), so that is where the counting wrappers
+    are installed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = request.metrics = RequestMetrics()
+        started = perf_counter()
+        with metrics.collect():
+            response = self.get_response(request)
+        return self.finish(request, response, metrics, perf_counter() - started)
+
+    async def __acall__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        collecting = ExitStack()
+        await sync_to_async(collecting.enter_context)(metrics.collect())
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(collecting.close)()
+        return self.finish(request, response, metrics, perf_counter() - started)
+
+    def finish(self, request, response, metrics, elapsed):
+        size = 0 if response.streaming else len(response.content)
+        registry.record(
+            metrics.endpoint or _endpoint_name(request),
+            requests=1,
+            queries=metrics.queries,
+            db_seconds=metrics.db_time,
+            serializer_seconds=metrics.serializer_time,
+            response_bytes=size,
+            seconds=elapsed,
+        )
+        if getattr(settings, 'QUERY_METRICS_HEADERS', settings.DEBUG):
+            response['X-Query-Count'] = str(metrics.queries)
+            response['Server-Timing'] = (
+                f'db;dur={metrics.db_time * 1000:.2f}, '
+                f'serializer;dur={metrics.serializer_time * 1000:.2f}, '
+                f'total;dur={elapsed * 1000:.2f}'
+            )
+        return response
+
+
+class SerializerTimingMixin:
+    """Adds the time spent in to_representation() to the request's metrics"""
+
+    def to_representation(self, instance):
+        started = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            request = self.context.get('request')
+            metrics = getattr(request, 'metrics', None)
+            if metrics is not None:
+                metrics.serializer_time += perf_counter() - started
+
+
+_timed_classes = {}
+
+
+def timed_serializer_class(serializer_class):
+    """``serializer_class`` with SerializerTimingMixin, created once per class"""
+    if serializer_class not in _timed_classes:
+        _timed_classes[serializer_class] = type(
+            serializer_class.__name__, (SerializerTimingMixin, serializer_class), {'__module__': serializer_class.__module__}
+        )
+    return _timed_classes[serializer_class]
+
+
+class InstrumentedViewMixin:
+    """
+    Labels the request's metrics with the view and action, times the
+    serializers built by get_serializer() and checks ``query_budgets``.
+    """
+    query_budgets = {}
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = timed_serializer_class(self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
+
+    def get_endpoint_name(self):
+        action = getattr(self, 'action', None) or self.request.method.lower()
+        return f'{type(self).__name__}.{action}'
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics.endpoint = self.get_endpoint_name()
+            self.check_query_budget(metrics)
+        return response
+
+    def check_query_budget(self, metrics):
+        budget = self.query_budgets.get(getattr(self, 'action', None))
+        if budget is None or metrics.queries <= budget:
+            return
+        registry.record(metrics.endpoint, budget_exceeded=1)
+        message = f'{metrics.endpoint} ran {metrics.queries} queries, over its budget of {budget}'
+        if getattr(settings, 'QUERY_BUDGETS_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class QueryBudgetTestMixin:
+    """Makes requests over their view's query budget fail the test (mix into a Django TestCase)"""
+
+    def setUp(self):
+        super().setUp()
+        budgets = self.settings(QUERY_BUDGETS_STRICT=True)
+        budgets.enable()
+        self.addCleanup(budgets.disable)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape target. Requires ``Authorization: Bearer <METRICS_TOKEN>``
+    when METRICS_TOKEN is set, otherwise it is only served with DEBUG on.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            raise Http404
+    elif not settings.DEBUG:
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
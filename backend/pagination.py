@@ -0,0 +1,145 @@
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a fixed set of keyset orderings.
+
+    Cursors are opaque and encode the values of every ordering column of the
+    row they start after, so a page is a seek on the compound key, e.g.
+    ``(price, id) > (cursor price, cursor id)``: fetching a deep page costs
+    the same as fetching the first one, ties included. Clients pick a sort
+    with ``?ordering=<key>`` and a page size with ``?page_size=<n>`` (capped at
+    API_MAX_PAGE_SIZE).
+
+    Every ordering ends with ``id`` so the key is unique, and its columns are
+    never null.
+    """
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering_query_param = 'ordering'
+    orderings = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+    }
+    default_ordering = 'newest'
+
+    def get_ordering(self, request, queryset, view):
+        key = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        return self.orderings.get(key, self.orderings[self.default_ordering])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.page_window(queryset, request, view)
+        if window is None:
+            return None
+        return self.set_page(list(window))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, fetching the page through the async ORM"""
+        window = self.page_window(queryset, request, view)
+        if window is None:
+            return None
+        return self.set_page([row async for row in window])
+
+    def page_window(self, queryset, request, view):
+        """The unevaluated rows of the requested page, plus one to tell whether another follows"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if self.cursor is not None and self.cursor.position is not None:
+            queryset = self.seek(queryset, self.cursor.position, reverse)
+        return queryset[:self.page_size + 1]
+
+    def seek(self, queryset, position, reverse):
+        """
+        Rows after ``position`` in the ordering (before it when ``reverse``):
+        for (a, b, id) that is a > x, or a = x and b > y, or a = x, b = y and id > z.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            # A cursor of another ordering
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if reverse != field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        try:
+            return queryset.filter(condition)
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def set_page(self, rows):
+        """Keep the page out of the fetched window and work out its links"""
+        seeking = self.cursor is not None and self.cursor.position is not None
+        reverse = self.cursor is not None and self.cursor.reverse
+        self.page = rows[:self.page_size]
+        has_following = len(rows) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = seeking, has_following
+        else:
+            self.has_next, self.has_previous = has_following, seeking
+
+        if self.page:
+            self.previous_position = self._get_position_from_instance(self.page[0], self.ordering)
+            self.next_position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            # Rows vanished since the cursor was made: both links start from it
+            self.previous_position = self.next_position = self.cursor.position if seeking else None
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([str(getattr(instance, field.lstrip('-'))) for field in ordering])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.previous_position))
+
+    def get_paginated_data(self, data):
+        """The body get_paginated_response() returns, for views that render it themselves"""
+        return {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+
+
+class ProductPagination(KeysetPagination):
+    orderings = {
+        **KeysetPagination.orderings,
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'rating': ('-rating', '-id'),
+    }
+
+
+class SearchPagination(ProductPagination):
+    """Search results, best matches first (needs the ``relevance`` annotation)"""
+    orderings = {
+        **ProductPagination.orderings,
+        'relevance': ('-relevance', '-id'),
+    }
+    default_ordering = 'relevance'
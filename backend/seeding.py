@@ -0,0 +1,285 @@
+"""
+Seeded benchmark fixtures at configurable scale.
+
+seed() bulk-inserts users (with an address each), categories, products,
+reviews, orders, carts and wishlists from a seeded RNG, so the same
+arguments produce the same data on SQLite or PostgreSQL. bulk_create sends
+no signals, so the denormalized tables (category counts, rating summaries,
+search vectors, dashboard rollups, related products, recommendations) are
+rebuilt at the end.
+
+Seeded rows are recognisable (SEED_EMAIL_DOMAIN, SEED_SLUG_PREFIX) and
+flush() removes them again.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.utils import timezone
+from carts.models import Cart, CartItem
+from dashboard.rollups import rebuild_rollups
+from orders.models import Order, OrderItem
+from orders.snapshots import backfill_line_snapshots
+from products.counters import rebuild_product_counts
+from products.models import PRODUCT_SIZES, Category, Product, Review
+from products.ratings import rebuild_rating_summaries
+from products.related import refresh_related_products
+from products.search import rebuild_search_vectors
+from recommendations.refresh import rebuild_neighbours
+from users.models import Address
+from wishlists.models import Wishlist, WishlistItem
+
+User = get_user_model()
+
+SEED_EMAIL_DOMAIN = 'seed.example'
+SEED_SLUG_PREFIX = 'seed-'
+SEED_PASSWORD = 'benchmark'
+ADMIN_EMAIL = f'admin@{SEED_EMAIL_DOMAIN}'
+
+SCALES = {
+    'small': {'users': 500, 'categories': 12, 'products': 1_000, 'reviews': 10_000, 'orders': 5_000},
+    'medium': {'users': 5_000, 'categories': 24, 'products': 10_000, 'reviews': 200_000, 'orders': 50_000},
+    'large': {'users': 50_000, 'categories': 48, 'products': 100_000, 'reviews': 2_000_000, 'orders': 500_000},
+}
+CART_SHARE = 0.5  # of users with a cart
+WISHLIST_SHARE = 0.4  # of users with a wishlist
+HISTORY_DAYS = 365
+BATCH_SIZE = 5000
+
+ADJECTIVES = ['floral', 'silk', 'cotton', 'linen', 'velvet', 'denim', 'pleated', 'embroidered', 'striped', 'vintage']
+GARMENTS = ['dress', 'kurta', 'saree', 'skirt', 'blouse', 'jacket', 'lehenga', 'shawl', 'trouser', 'top']
+COLOURS = ['red', 'ivory', 'black', 'emerald', 'mustard', 'navy', 'blush', 'maroon', 'teal', 'grey']
+
+
+def seed_users():
+    return User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}')
+
+
+def seed_categories():
+    return Category.objects.filter(slug__startswith=SEED_SLUG_PREFIX)
+
+
+def is_seeded():
+    return seed_users().exists() or seed_categories().exists()
+
+
+def flush():
+    """Delete the seeded rows; returns the number of objects deleted"""
+    deleted = seed_users().delete()[0] + seed_categories().delete()[0]
+    _rebuild_derived()
+    return deleted
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create store the given created_at/date_joined values"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _in_batches(rows, model, batch_size=BATCH_SIZE):
+    """bulk_create ``rows`` (an iterable) without holding them all in memory"""
+    batch, created = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            created += len(model.objects.bulk_create(batch, batch_size=batch_size))
+            batch = []
+    if batch:
+        created += len(model.objects.bulk_create(batch, batch_size=batch_size))
+    return created
+
+
+class Seeder:
+    def __init__(self, users, categories, products, reviews, orders, seed=42, log=None):
+        if reviews > products * users:
+            raise ValueError("Each user reviews a product at most once: reviews must not exceed products x users")
+        self.counts = {
+            'users': users, 'categories': categories, 'products': products, 'reviews': reviews, 'orders': orders,
+        }
+        self.rng = random.Random(seed)
+        self.now = timezone.now()
+        self.log = log or (lambda message: None)
+
+    def moment(self, days=HISTORY_DAYS):
+        return self.now - timedelta(seconds=self.rng.randrange(days * 86400))
+
+    def popular(self, count):
+        """``count`` distinct products, skewed so some sell and get wishlisted far more than others"""
+        picks = {int(len(self.products) * self.rng.random() ** 3) for _ in range(count)}
+        return [self.products[index] for index in sorted(picks)]
+
+    def create_users(self):
+        password = make_password(SEED_PASSWORD)
+
+        def users():
+            for i in range(self.counts['users']):
+                joined = self.moment()
+                yield User(
+                    email=f'customer{i}@{SEED_EMAIL_DOMAIN}', first_name='Customer', last_name=str(i),
+                    phone_number=f'96{i + 1:08d}', password=password, date_joined=joined, created_at=joined,
+                )
+
+        _in_batches(users(), User)
+        self.user_ids = list(seed_users().filter(is_staff=False).order_by('id').values_list('id', flat=True))
+        _in_batches((
+            Address(
+                user_id=user_id, address_name='Home', recipient_name=f'Customer {i}',
+                street_name=f'{i} Durbar Marg', phone_number=f'96{i + 1:08d}', city='Kathmandu', is_default=True,
+            )
+            for i, user_id in enumerate(self.user_ids)
+        ), Address)
+        self.address_ids = dict(Address.objects.filter(user__in=seed_users()).values_list('user_id', 'id'))
+        self.log(f"{len(self.user_ids)} users")
+
+    def create_catalogue(self):
+        Category.objects.bulk_create([
+            Category(name=f'{garment.title()}s {i}', slug=f'{SEED_SLUG_PREFIX}category-{i}', description=f'Seeded {garment}s')
+            for i, garment in ((i, GARMENTS[i % len(GARMENTS)]) for i in range(self.counts['categories']))
+        ])
+        category_ids = list(seed_categories().order_by('id').values_list('id', flat=True))
+
+        def products():
+            rng = self.rng
+            for i in range(self.counts['products']):
+                price = Decimal(rng.randrange(500, 20000, 50))
+                on_sale = rng.random() < 0.15
+                stocked = rng.sample(PRODUCT_SIZES, rng.randint(1, len(PRODUCT_SIZES)))
+                sizes = {size: rng.randint(0, 10) for size in stocked}
+                yield Product(
+                    name=f'{rng.choice(COLOURS)} {rng.choice(ADJECTIVES)} {rng.choice(GARMENTS)}'.title(),
+                    slug=f'{SEED_SLUG_PREFIX}product-{i}',
+                    category_id=category_ids[i % len(category_ids)],
+                    description=' '.join(rng.choice(ADJECTIVES + GARMENTS + COLOURS) for _ in range(30)),
+                    price=price,
+                    is_sale=on_sale,
+                    sale_price=(price * Decimal('0.8')).quantize(Decimal('1')) if on_sale else None,
+                    sizes=sizes,
+                    stock=sum(sizes.values()),
+                    created_at=self.moment(2 * HISTORY_DAYS),
+                )
+
+        _in_batches(products(), Product)
+        self.products = list(
+            Product.objects.filter(category_id__in=category_ids).order_by('id').values_list('id', 'price', 'sizes')
+        )
+        self.log(f"{len(self.products)} products in {len(category_ids)} categories")
+
+    def create_reviews(self):
+        products, user_ids = self.products, self.user_ids
+
+        def reviews():
+            rng = self.rng
+            for k in range(self.counts['reviews']):
+                # The k-th review of a product goes to a different user each time
+                index, nth = k % len(products), k // len(products)
+                product_id, _, sizes = products[index]
+                quality = min(5, max(1, round(rng.gauss(3.8, 1))))
+                yield Review(
+                    product_id=product_id,
+                    user_id=user_ids[(index * 7919 + nth) % len(user_ids)],
+                    quality_rating=quality,
+                    value_rating=min(5, max(1, quality + rng.choice((-1, 0, 0, 1)))),
+                    size=next(iter(sizes), 'M'),
+                    comment=rng.choice(['', 'Lovely fabric', 'Runs small', 'Great value', 'Colour as pictured']),
+                    created_at=self.moment(),
+                )
+
+        self.log(f"{_in_batches(reviews(), Review)} reviews")
+
+    def create_orders(self):
+        rng = self.rng
+        created = 0
+        for start in range(0, self.counts['orders'], BATCH_SIZE):
+            orders, lines = [], []
+            for _ in range(min(BATCH_SIZE, self.counts['orders'] - start)):
+                user_id = rng.choice(self.user_ids)
+                order_lines = [
+                    (product_id, rng.randint(1, 3), next(iter(sizes), None), price)
+                    for product_id, price, sizes in self.popular(rng.randint(1, 4))
+                ]
+                paid = rng.random() < 0.7
+                orders.append(Order(
+                    user_id=user_id,
+                    address_id=self.address_ids[user_id],
+                    total_amount=sum(price * quantity for _, quantity, _, price in order_lines) + 100,
+                    payment_status='Paid' if paid else 'Pending',
+                    status=rng.choice(['Shipped', 'Delivered']) if paid else 'Pending',
+                    created_at=self.moment(),
+                ))
+                lines.append(order_lines)
+            Order.objects.bulk_create(orders, batch_size=BATCH_SIZE)
+            OrderItem.objects.bulk_create([
+                OrderItem(order_id=order.pk, product_id=product_id, quantity=quantity, size=size, unit_price=price)
+                for order, order_lines in zip(orders, lines)
+                for product_id, quantity, size, price in order_lines
+            ], batch_size=BATCH_SIZE)
+            created += len(orders)
+        backfill_line_snapshots()
+        self.log(f"{created} orders")
+
+    def create_carts_and_wishlists(self):
+        rng = self.rng
+        shoppers = [user_id for user_id in self.user_ids if rng.random() < CART_SHARE]
+        Cart.objects.bulk_create([Cart(user_id=user_id) for user_id in shoppers], batch_size=BATCH_SIZE)
+        cart_ids = Cart.objects.filter(user__in=seed_users()).order_by('id').values_list('id', flat=True)
+        _in_batches((
+            CartItem(cart_id=cart_id, product_id=product_id, size=next(iter(sizes), 'M'), quantity=rng.randint(1, 2))
+            for cart_id in list(cart_ids)
+            for product_id, _, sizes in self.popular(rng.randint(1, 5))
+        ), CartItem)
+
+        wishers = [user_id for user_id in self.user_ids if rng.random() < WISHLIST_SHARE]
+        Wishlist.objects.bulk_create([Wishlist(user_id=user_id) for user_id in wishers], batch_size=BATCH_SIZE)
+        wishlist_ids = Wishlist.objects.filter(user__in=seed_users()).order_by('id').values_list('id', flat=True)
+        _in_batches((
+            WishlistItem(wishlist_id=wishlist_id, product_id=product_id)
+            for wishlist_id in list(wishlist_ids)
+            for product_id, _, _ in self.popular(rng.randint(1, 10))
+        ), WishlistItem)
+        self.log(f"{len(shoppers)} carts, {len(wishers)} wishlists")
+
+    def run(self):
+        User.objects.create_superuser(
+            email=ADMIN_EMAIL, first_name='Seed', last_name='Admin', phone_number='9600000000', password=SEED_PASSWORD
+        )
+        with explicit_timestamps(User, Product, Review, Order):
+            self.create_users()
+            self.create_catalogue()
+            self.create_reviews()
+            self.create_orders()
+            self.create_carts_and_wishlists()
+        _rebuild_derived(self.log)
+
+
+def _rebuild_derived(log=None):
+    log = log or (lambda message: None)
+    rebuild_product_counts()
+    rebuild_rating_summaries(batch_size=BATCH_SIZE)
+    rebuild_search_vectors()
+    rebuild_rollups(batch_size=BATCH_SIZE)
+    refresh_related_products(batch_size=BATCH_SIZE)
+    rebuild_neighbours()
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    log("Rebuilt counters, rating summaries, search vectors, rollups, related products and recommendations")
+
+
+def seed(scale='small', seed=42, log=None, **overrides):
+    """Generate a ``scale`` dataset, with any of its counts overridden"""
+    counts = {**SCALES[scale], **{key: value for key, value in overrides.items() if value is not None}}
+    Seeder(seed=seed, log=log, **counts).run()
+    return counts
@@ -0,0 +1,132 @@
+"""
+Sparse fieldsets for the REST API.
+
+GET requests may pass ``fields=`` to choose the fields of the response and
+``expand=`` to swap a related id for its nested representation. Both take
+comma separated names, with dots reaching into nested serializers:
+
+    /api/orders/?fields=id,status,items.quantity,items.product.name
+    /api/orders/?expand=items.product
+
+Naming a nested field without sub-fields (``fields=id,items``) keeps all of
+it. Serializers using SparseFieldsMixin drop unrequested fields before
+serializing, so their SerializerMethodFields never run; views use
+field_requested() to skip the prefetches of fields nobody asked for.
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+SELECTION_PARAMS = ('fields', 'expand')
+
+
+def parse_selection(value):
+    """'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}"""
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def get_selection(request, param):
+    """Parsed ``param`` selection of a GET request, None when absent"""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    cache = request.__dict__.setdefault('_sparse_selections', {})
+    if param not in cache:
+        value = request.query_params.get(param)
+        cache[param] = parse_selection(value) if value else None
+    return cache[param]
+
+
+def _subtree(tree, path):
+    """Selection below ``path``: None means everything, {} nothing in particular"""
+    node = tree
+    for name in path:
+        if node is None or name not in node:
+            return {}
+        node = node[name]
+        if not node:
+            return None
+    return node
+
+
+def field_requested(request, *path):
+    """Whether the response for ``request`` includes the field at ``path``"""
+    tree = get_selection(request, 'fields')
+    if tree is None:
+        return True
+    node = tree
+    for name in path:
+        if name not in node:
+            return False
+        node = node[name]
+        if not node:
+            return True
+    return True
+
+
+def expand_requested(request, *path):
+    tree = get_selection(request, 'expand')
+    if tree is None:
+        return False
+    node = tree
+    for name in path:
+        if name not in node:
+            return False
+        node = node[name]
+    return True
+
+
+class SparseFieldsMixin:
+    """
+    ``fields=``/``expand=`` support for serializers.
+
+    Meta options:
+
+    * ``expandable_fields``: {name: (serializer_class, kwargs)} fields
+      replaced by the nested serializer when expanded
+    * ``derived_fields``: {output_name: [fields]} for keys a serializer's
+      to_representation() builds from other fields; requesting the key
+      keeps those fields, and sparse_representation() drops them again
+    """
+
+    def _sparse_path(self):
+        path = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        return path[::-1]
+
+    def _sparse_selection(self, param):
+        tree = get_selection(self.context.get('request'), param)
+        if tree is None:
+            return None
+        return _subtree(tree, self._sparse_path())
+
+    def get_fields(self):
+        fields = super().get_fields()
+        meta = getattr(self, 'Meta', None)
+
+        expand = self._sparse_selection('expand')
+        for name in expand or ():
+            if name in getattr(meta, 'expandable_fields', {}):
+                serializer_class, kwargs = meta.expandable_fields[name]
+                fields[name] = serializer_class(read_only=True, **kwargs)
+
+        requested = self._sparse_selection('fields')
+        if not requested:
+            return fields
+        keep = set(requested)
+        for name in requested:
+            keep.update(getattr(meta, 'derived_fields', {}).get(name, ()))
+        return {name: field for name, field in fields.items() if name in keep}
+
+    def sparse_representation(self, representation):
+        """Drop keys kept only to build ``derived_fields``"""
+        requested = self._sparse_selection('fields')
+        if not requested:
+            return representation
+        return {key: value for key, value in representation.items() if key in requested}
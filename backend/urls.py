@@ -2,14 +2,18 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from backend.instrumentation import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
     path("public/api/", include("account.urls")),
     path('public/api/', include('users.urls')),
     path('public/api/', include('products.urls')),
+    path('public/api/async/', include('products.async_urls')),
     path('public/api/', include('orders.urls')),
     path('public/api/', include('carts.urls')),
     path('public/api/', include('wishlists.urls')),
     path('public/api/', include('dashboard.urls')),
+    path('public/api/', include('recommendations.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,3 +1,4 @@
+from decimal import Decimal
 from django.db import models
 from django.contrib.auth import get_user_model
 from products.models import Product
@@ -12,6 +13,15 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart of {self.user.email}"
 
+    @property
+    def subtotal(self):
+        """Sum of the line totals; uses prefetched items and products"""
+        return sum((item.line_total for item in self.items.all()), Decimal('0'))
+
+    @property
+    def item_count(self):
+        return sum(item.quantity for item in self.items.all())
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -21,6 +31,10 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.product.name} ({self.size}) x {self.quantity}"
 
+    @property
+    def line_total(self):
+        return self.product.current_price * self.quantity
+
     def clean(self):
         """
         Override clean method to validate size selection based on product's available sizes.
@@ -1,27 +1,58 @@
 from rest_framework import serializers
+from backend.sparse import SparseFieldsMixin
 from .models import Cart, CartItem
-from products.models import Product
+from .services import ADD, MAX_OPERATIONS, REMOVE, SET
+from products.serializers import ProductCardSerializer
+
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
-class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
-        fields = ['id', 'product', 'size', 'quantity', 'cart']
+        fields = ['id', 'product', 'size', 'quantity', 'cart', 'line_total']
+        read_only_fields = ['cart']
 
-    def validate_size(self, value):
+    def validate(self, attrs):
         """
-        Custom validation to ensure the selected size is available for the product.
+        Ensure the selected size is available for the product. The product
+        field has already loaded the product (or the instance holds it), so
+        this needs no query of its own.
         """
-        product = self.initial_data.get('product')
-        if product:
-            product_instance = Product.objects.get(pk=product)
-            available_sizes = product_instance.sizes.keys()
-            if value not in available_sizes:
-                raise serializers.ValidationError(f"Size '{value}' is not available for this product.")
-        return value
-    
-class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+        product = attrs.get('product') or getattr(self.instance, 'product', None)
+        size = attrs.get('size', getattr(self.instance, 'size', None))
+        if product is not None and size not in product.sizes:
+            raise serializers.ValidationError({'size': f"Size '{size}' is not available for this product."})
+        return attrs
+
+class CartLineSerializer(CartItemSerializer):
+    """Cart item as embedded in the cart, with its product card"""
+    product = ProductCardSerializer(read_only=True)
+
+    class Meta(CartItemSerializer.Meta):
+        fields = ['id', 'product', 'size', 'quantity', 'line_total']
+
+class CartSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = CartLineSerializer(many=True, read_only=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Cart
-        fields = '__all__'
+        fields = ['id', 'user', 'items', 'item_count', 'subtotal', 'created_at']
+
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=[ADD, SET, REMOVE])
+    # validated against one prefetch of all the batch's products, not per operation
+    product = serializers.IntegerField(min_value=1)
+    size = serializers.CharField(max_length=3)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] == ADD and not attrs.get('quantity'):
+            raise serializers.ValidationError({'quantity': "Adding needs a quantity of at least 1."})
+        if attrs['op'] == SET and 'quantity' not in attrs:
+            raise serializers.ValidationError({'quantity': "This field is required."})
+        return attrs
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=MAX_OPERATIONS)
@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from products.models import Product
+from .models import Cart, CartItem
+
+ADD, SET, REMOVE = 'add', 'set', 'remove'
+MAX_OPERATIONS = 200
+
+
+class InvalidCartOperations(Exception):
+    """Raised with the errors per operation index when a batch cannot be applied"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f'{len(errors)} invalid cart operation(s)')
+
+
+def cart_for(user, lock=False):
+    """
+    The user's oldest cart and whether it was just created. Reading an
+    existing cart is a plain SELECT (``lock`` adds FOR UPDATE, inside a
+    transaction). On a miss the user's row is locked first, so concurrent
+    first requests create a single cart between them.
+    """
+    carts = Cart.objects.filter(user=user).order_by('id')
+    cart = (carts.select_for_update() if lock else carts).first()
+    if cart is not None:
+        return cart, False
+    with transaction.atomic():
+        get_user_model().objects.select_for_update().only('pk').get(pk=user.pk)
+        cart = carts.first()
+        if cart is not None:
+            return cart, False
+        return Cart.objects.create(user=user), True
+
+
+def _validate(operations, products):
+    errors = {}
+    for index, operation in enumerate(operations):
+        product = products.get(operation['product'])
+        if product is None:
+            errors[index] = {'product': f"Product {operation['product']} does not exist."}
+        elif operation['op'] == REMOVE:
+            continue
+        elif operation['size'] not in product.sizes:
+            errors[index] = {'size': f"Size '{operation['size']}' is not available for {product.name}."}
+        elif operation['quantity'] > 0 and not (product.available and product.available_in_size(operation['size'])):
+            errors[index] = {'size': f"Size '{operation['size']}' of {product.name} is out of stock."}
+    return errors
+
+
+def apply_cart_operations(user, operations):
+    """
+    Apply ``operations`` (dicts with op, product, size and quantity, in
+    order) to the user's cart in one transaction and return the cart.
+
+    ``add`` increases a line's quantity, ``set`` replaces it (0 removes the
+    line) and ``remove`` deletes it. Lines are keyed by (product, size):
+    operations on the same line are folded together, and duplicate lines
+    already in the cart are merged into one. Every product is loaded in a
+    single query and checked (the size exists and, unless the line is
+    being emptied, has stock) before anything is written; on failure
+    InvalidCartOperations is raised and the cart is left untouched. The
+    writes are one bulk_create, one bulk_update and one delete, whatever
+    the number of operations.
+    """
+    product_ids = {operation['product'] for operation in operations}
+    with transaction.atomic():
+        products = Product.objects.only('id', 'name', 'stock', 'sizes').in_bulk(product_ids)
+        errors = _validate(operations, products)
+        if errors:
+            raise InvalidCartOperations(errors)
+
+        # Lock the cart so concurrent batches of the same user apply one after the other
+        cart, created = cart_for(user, lock=True)
+        lines, stored, duplicates = {}, {}, []
+        if not created:
+            for item in CartItem.objects.filter(cart=cart).order_by('id'):
+                key = (item.product_id, item.size)
+                if key in lines:
+                    lines[key].quantity += item.quantity
+                    duplicates.append(item.pk)
+                else:
+                    lines[key], stored[key] = item, item.quantity
+
+        quantities = {key: item.quantity for key, item in lines.items()}
+        for operation in operations:
+            key = (operation['product'], operation['size'])
+            if operation['op'] == ADD:
+                quantities[key] = quantities.get(key, 0) + operation['quantity']
+            elif operation['op'] == SET:
+                quantities[key] = operation['quantity']
+            else:
+                quantities.pop(key, None)
+
+        to_create, to_update, to_delete = [], [], list(duplicates)
+        for key, item in lines.items():
+            quantity = quantities.get(key, 0)
+            if quantity <= 0:
+                to_delete.append(item.pk)
+            elif quantity != stored[key]:
+                item.quantity = quantity
+                to_update.append(item)
+        for (product_id, size), quantity in quantities.items():
+            if (product_id, size) not in lines and quantity > 0:
+                to_create.append(CartItem(cart=cart, product_id=product_id, size=size, quantity=quantity))
+
+        if to_delete:
+            CartItem.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+    return cart
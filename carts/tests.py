@@ -1,3 +1,189 @@
-from django.test import TestCase
+import threading
+from unittest import skipUnless
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from backend.db_router import PIN_COOKIE
+from backend.instrumentation import QueryBudgetTestMixin
+from products.models import Category, Product
+from .models import Cart, CartItem
+from .services import ADD, apply_cart_operations
 
-# Create your tests here.
+User = get_user_model()
+
+
+class CartTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            email='shopper@example.com', first_name='Shop', last_name='Per',
+            phone_number='9830000000', password='secret'
+        )
+        self.category = Category.objects.create(name='Tops', description='Tops')
+        self.client.force_authenticate(self.user)
+
+    def create_product(self, name='Top', sizes=None):
+        sizes = sizes if sizes is not None else {'S': 4, 'M': 4}
+        return Product.objects.create(
+            name=name, category=self.category, description='Linen top', price=900,
+            stock=sum(sizes.values()), sizes=sizes
+        )
+
+    def test_me_returns_cards_and_totals_in_two_queries(self):
+        cart = Cart.objects.create(user=self.user)
+        for i in range(3):
+            CartItem.objects.create(cart=cart, product=self.create_product(name=f'Top {i}'), size='S', quantity=i + 1)
+        sale = self.create_product(name='Sale Top')
+        Product.objects.filter(pk=sale.pk).update(is_sale=True, sale_price=600)
+        CartItem.objects.create(cart=cart, product=sale, size='M', quantity=2)
+
+        # the cart, then its lines joined with their product cards
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('cart-me'))
+
+        lines = response.data['items']
+        self.assertEqual(lines[0]['product']['name'], 'Top 0')
+        self.assertIn('current_price', lines[0]['product'])
+        self.assertEqual([line['line_total'] for line in lines], ['900.00', '1800.00', '2700.00', '1200.00'])
+        self.assertEqual(response.data['subtotal'], '6600.00')
+        self.assertEqual(response.data['item_count'], 8)
+        self.assertNotIn('products', response.data)
+
+    def test_unrequested_lines_are_not_loaded(self):
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.create_product(), size='S')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart-me'), {'fields': 'id,created_at'})
+        self.assertEqual(set(response.data), {'id', 'created_at'})
+
+    def test_add_validates_size_against_the_loaded_product(self):
+        product = self.create_product(sizes={'S': 2})
+        url = reverse('cartitem-list')
+
+        response = self.client.post(url, {'product': product.pk, 'size': 'XL', 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('size', response.data)
+
+        response = self.client.post(url, {'product': product.pk, 'size': 'S', 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['line_total'], '1800.00')
+
+        # only the size is sent; it is checked against the item's product
+        item_url = reverse('cartitem-detail', args=[response.data['id']])
+        self.assertEqual(self.client.patch(item_url, {'size': 'M'}, format='json').status_code, 400)
+        with self.assertNumQueries(2):  # the item joined with its product, then the update
+            response = self.client.patch(item_url, {'quantity': 3}, format='json')
+        self.assertEqual(response.data['line_total'], '2700.00')
+
+    def test_batch_applies_operations_in_bulk_and_merges_lines(self):
+        kept, dropped, resized = (self.create_product(name=f'Top {i}') for i in range(3))
+        added = [self.create_product(name=f'New {i}') for i in range(5)]
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=kept, size='S', quantity=1)
+        CartItem.objects.create(cart=cart, product=kept, size='S', quantity=2)  # duplicate line
+        CartItem.objects.create(cart=cart, product=dropped, size='S', quantity=1)
+        CartItem.objects.create(cart=cart, product=resized, size='M', quantity=1)
+        operations = [
+            {'op': 'add', 'product': kept.pk, 'size': 'S', 'quantity': 1},
+            {'op': 'remove', 'product': dropped.pk, 'size': 'S'},
+            {'op': 'set', 'product': resized.pk, 'size': 'M', 'quantity': 4},
+            *({'op': 'add', 'product': product.pk, 'size': 'M', 'quantity': 1} for product in added),
+            {'op': 'add', 'product': added[0].pk, 'size': 'M', 'quantity': 2},
+            {'op': 'set', 'product': added[1].pk, 'size': 'M', 'quantity': 0},
+        ]
+
+        # products, the locked cart, its lines, one delete, one update, one insert
+        # and the refreshed lines, inside a savepoint
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        lines = {(line['product']['name'], line['size']): line['quantity'] for line in response.data['items']}
+        self.assertEqual(lines, {
+            ('Top 0', 'S'): 4, ('Top 2', 'M'): 4, ('New 0', 'M'): 3, ('New 2', 'M'): 1, ('New 3', 'M'): 1, ('New 4', 'M'): 1,
+        })
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 6)
+
+    def test_batch_with_an_invalid_operation_changes_nothing(self):
+        product = self.create_product(sizes={'S': 2})
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=product, size='S', quantity=1)
+        operations = [
+            {'op': 'set', 'product': product.pk, 'size': 'S', 'quantity': 2},
+            {'op': 'add', 'product': product.pk, 'size': 'XL', 'quantity': 1},
+            {'op': 'add', 'product': product.pk + 100, 'size': 'S', 'quantity': 1},
+        ]
+
+        response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['operations']), {1, 2})
+        self.assertIn('size', response.data['operations'][1])
+        self.assertEqual(list(CartItem.objects.values_list('quantity', flat=True)), [1])
+
+        response = self.client.post(
+            reverse('cart-batch'), {'operations': [{'op': 'add', 'product': product.pk, 'size': 'S'}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_creates_the_cart(self):
+        product = self.create_product()
+        response = self.client.post(
+            reverse('cart-batch'),
+            {'operations': [{'op': 'add', 'product': product.pk, 'size': 'S', 'quantity': 2}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['item_count'], 2)
+        self.assertEqual(Cart.objects.get(user=self.user).items.get().quantity, 2)
+
+    def test_oldest_of_duplicate_carts_is_used(self):
+        product = self.create_product()
+        oldest = Cart.objects.create(user=self.user)
+        Cart.objects.create(user=self.user)
+
+        self.assertEqual(self.client.get(reverse('cart-me')).data['id'], oldest.pk)
+        response = self.client.post(
+            reverse('cart-batch'), {'operations': [{'op': 'add', 'product': product.pk, 'size': 'S', 'quantity': 1}]},
+            format='json',
+        )
+        self.assertEqual(response.data['id'], oldest.pk)
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_reading_an_existing_cart_does_not_pin_to_the_primary(self):
+        response = self.client.get(reverse('cart-me'))
+        self.assertIn(PIN_COOKIE, response.cookies)  # the cart was created
+
+        self.client.cookies.clear()
+        response = self.client.get(reverse('cart-me'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Row locks need PostgreSQL")
+class CartCreationRaceTests(TransactionTestCase):
+    def test_concurrent_first_batches_share_one_cart(self):
+        user = User.objects.create_user(
+            email='racer@example.com', first_name='Ra', last_name='Cer', phone_number='9830000009', password='secret'
+        )
+        product = Product.objects.create(
+            name='Top', category=Category.objects.create(name='Tops', description='Tops'),
+            description='Linen top', price=900, stock=8, sizes={'S': 8}
+        )
+        start = threading.Barrier(4)
+
+        def add_one():
+            start.wait()
+            try:
+                apply_cart_operations(user, [{'op': ADD, 'product': product.pk, 'size': 'S', 'quantity': 1}])
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=add_one) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Cart.objects.filter(user=user).count(), 1)
+        self.assertEqual(CartItem.objects.get().quantity, 4)
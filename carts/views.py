@@ -1,20 +1,67 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db.models import Prefetch, prefetch_related_objects
+from backend.instrumentation import InstrumentedViewMixin
+from backend.sparse import field_requested
+from products.cards import attach_selected_cards, prefetch_product_cards, select_product_cards
 from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
+from .serializers import CartBatchSerializer, CartSerializer, CartItemSerializer
+from .services import InvalidCartOperations, apply_cart_operations, cart_for
 
-class CartViewSet(viewsets.ModelViewSet):
+# Cart fields computed from the lines
+LINE_FIELDS = ('items', 'item_count', 'subtotal')
+
+
+def prefetch_cart_lines(carts):
+    """Load the lines of ``carts`` with their product cards in one query"""
+    prefetch_related_objects(
+        carts, Prefetch('items', queryset=select_product_cards(CartItem.objects.order_by('id')))
+    )
+    for cart in carts:
+        attach_selected_cards(cart.items.all())
+
+
+class CartViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    # me: 2 queries once the cart exists, 6 on the visit that creates it
+    query_budgets = {'list': 4, 'retrieve': 4, 'me': 6, 'batch': 12}
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        queryset = Cart.objects.filter(user=self.request.user)
+        if self.action in ['list', 'retrieve'] and any(field_requested(self.request, name) for name in LINE_FIELDS):
+            queryset = queryset.prefetch_related(
+                Prefetch('items', queryset=CartItem.objects.order_by('id')), prefetch_product_cards('items__product')
+            )
+        return queryset
 
     @action(detail=False, methods=['get'])
     def me(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        """The caller's cart: lines with product cards, line totals and the subtotal"""
+        cart, created = cart_for(request.user)
+        if created:
+            cart._prefetched_objects_cache = {'items': CartItem.objects.none()}
+        elif any(field_requested(request, name) for name in LINE_FIELDS):
+            prefetch_cart_lines([cart])
+        serializer = self.get_serializer(cart)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['post'], url_path='me/batch')
+    def batch(self, request):
+        """
+        Apply a list of add / set / remove operations to the caller's cart
+        in one transaction, e.g. to sync a cart kept offline, and return the
+        updated cart. Nothing is applied if any operation is invalid.
+        """
+        batch = CartBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        try:
+            cart = apply_cart_operations(request.user, batch.validated_data['operations'])
+        except InvalidCartOperations as e:
+            return Response({'operations': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        prefetch_cart_lines([cart])
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
 
@@ -24,12 +71,12 @@ class CartItemViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart__user=self.request.user)
+        # The product is needed for line totals and size validation
+        return CartItem.objects.filter(cart__user=self.request.user).select_related('product')
 
     def perform_create(self, serializer):
         """
         Automatically set the cart based on the authenticated user or create a new one if it doesn't exist.
         """
-        user = self.request.user
-        cart, created = Cart.objects.get_or_create(user=user)
-        serializer.save(cart=cart)
\ No newline at end of file
+        cart, created = cart_for(self.request.user)
+        serializer.save(cart=cart)
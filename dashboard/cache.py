@@ -0,0 +1,97 @@
+"""
+Cache for the admin dashboard, on top of Django's cache API.
+
+Entries are kept past their freshness window (for ``STALE_TTL`` seconds)
+so that, once one expires, a single request recomputes it under a lock
+while concurrent requests keep getting the stale value instead of all
+recomputing at once.
+"""
+import time
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+CACHE_ALIAS = 'dashboard'
+CACHE_PREFIX = 'dashboard'
+DEFAULT_TTL = 15 * 60
+STALE_TTL = 60 * 60
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def process_local_caches():
+    """
+    Aliases of the caches the precompute worker fills that other processes
+    cannot read, so the web workers would never see what it stores
+    """
+    return [
+        alias for alias in (DEFAULT_CACHE_ALIAS, CACHE_ALIAS)
+        if isinstance(caches[alias], (LocMemCache, DummyCache))
+    ]
+
+
+def ttl_for(name):
+    """Freshness window for a dashboard key, from settings.DASHBOARD_CACHE_TTLS"""
+    return getattr(settings, 'DASHBOARD_CACHE_TTLS', {}).get(name, DEFAULT_TTL)
+
+
+def cache_key(name, *parts):
+    return ':'.join([CACHE_PREFIX, name, *map(str, parts)])
+
+
+def _store(key, value, ttl):
+    _cache().set(key, {'value': value, 'fresh_until': time.time() + ttl}, ttl + STALE_TTL)
+    return value
+
+
+def _wait_for_entry(key):
+    """Wait for the lock holder to store a value; None if it never does"""
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = _cache().get(key)
+        if entry is not None:
+            return entry
+        if _cache().get(f'{key}:lock') is None:
+            break
+    return None
+
+
+def get_or_compute(key, compute, ttl):
+    """
+    Return the cached value under ``key``, calling ``compute()`` to
+    (re)build it at most once at a time across processes sharing the cache.
+
+    A fresh entry is returned as is. Once it goes stale, the request that
+    takes the lock recomputes it and every other request gets the stale
+    value meanwhile; with no entry at all they wait for the lock holder.
+    """
+    cache = _cache()
+    entry = cache.get(key)
+    if entry is not None and entry['fresh_until'] > time.time():
+        return entry['value']
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, True, LOCK_TIMEOUT):
+        try:
+            return _store(key, compute(), ttl)
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        return entry['value']
+    entry = _wait_for_entry(key)
+    if entry is not None:
+        return entry['value']
+    # The lock holder failed or timed out; compute rather than error out
+    return _store(key, compute(), ttl)
+
+
+def refresh(key, compute, ttl):
+    """Recompute and store ``key`` unconditionally (used by the precompute worker)"""
+    return _store(key, compute(), ttl)
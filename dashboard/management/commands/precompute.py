@@ -0,0 +1,75 @@
+import time
+import traceback
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+from dashboard.cache import process_local_caches
+from dashboard.stats import precompute
+from products.featured import refresh_product_of_the_day
+from products.related import refresh_related_products
+from recommendations.refresh import rebuild_neighbours, refresh_neighbours
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute the dashboard stats and also-bought neighbours every "
+        "--interval minutes; the product of the day, related-products index "
+        "and a full neighbour rebuild at midnight"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=10, help="Minutes between refreshes")
+        parser.add_argument('--once', action='store_true', help="Run a single pass and exit")
+        parser.add_argument(
+            '--allow-local-cache', action='store_true',
+            help="Run even though a cache is process-local (only useful inside the serving process)"
+        )
+
+    def handle(self, *args, **options):
+        local = process_local_caches()
+        if local and not options['allow_local_cache']:
+            raise CommandError(
+                f"The {', '.join(local)} cache is process-local, so the web workers would never see what this "
+                "command stores; point CACHE_URL and DASHBOARD_CACHE_URL at a shared backend such as Redis"
+            )
+        interval = options['interval'] * 60
+        self.picked_for = self.rebuilt_for = None
+        while True:
+            if options['once']:
+                self.run_pass()
+                return
+            try:
+                self.run_pass()
+            except Exception:
+                # A failed pass (database or cache outage...) must not stop
+                # the worker; whatever did not finish is retried next pass
+                self.stderr.write(f"Precompute pass failed:\n{traceback.format_exc()}")
+
+            # Wake up at midnight for the next pick even inside an interval
+            now = timezone.localtime()
+            midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            time.sleep(max(0.0, min(interval, (midnight - now).total_seconds())))
+            close_old_connections()
+
+    def run_pass(self):
+        today = timezone.localdate()
+        if today != self.picked_for:
+            product_id = refresh_product_of_the_day(today)
+            self.picked_for = today
+            self.stdout.write(f"Product of the day for {today}: {product_id}")
+        if today != self.rebuilt_for:
+            count = refresh_related_products()
+            self.stdout.write(f"Rebuilt related products for {count} products")
+            count = rebuild_neighbours()
+            self.rebuilt_for = today
+            self.stdout.write(f"Rebuilt also-bought neighbours for {count} products")
+        else:
+            count = refresh_neighbours()
+            self.stdout.write(f"Refreshed also-bought neighbours of {count} products")
+
+        started = time.monotonic()
+        precompute()
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed dashboard stats in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from dashboard.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily dashboard rollups from orders, order items and users"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuild_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS("Rebuilt dashboard rollups"))
@@ -2,18 +2,55 @@ from django.db import models
 from django.utils import timezone
 from django.db.models import Sum, Count
 from orders.models import Order
-from products.models import Product
+from products.models import Category, Product
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-class DashboardCache(models.Model):
-    """Cache for dashboard statistics to avoid heavy computations"""
-    key = models.CharField(max_length=100, unique=True)
-    value = models.JSONField()
-    last_updated = models.DateTimeField(auto_now=True)
+class DailySales(models.Model):
+    """Orders and revenue per day, maintained incrementally by dashboard.rollups"""
+    date = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class DailyPaymentMethodSales(models.Model):
+    date = models.DateField()
+    payment_method = models.CharField(max_length=20)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['date', 'payment_method']
+
+
+class DailyProductSales(models.Model):
+    """
+    Units and line revenue per product per day (category as of the sale).
+    Rows of a deleted product stay, without the product, so its sales still
+    count in the category totals.
+    """
+    date = models.DateField()
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.SET_NULL, null=True)
+    category = models.ForeignKey(Category, related_name='daily_product_sales', on_delete=models.SET_NULL, null=True)
+    order_lines = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
     class Meta:
-        indexes = [
-            models.Index(fields=['key']),
-        ]
\ No newline at end of file
+        unique_together = ['date', 'product']
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, related_name='daily_sales', on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['date', 'category']
+
+
+class DailyCustomerSignups(models.Model):
+    date = models.DateField(unique=True)
+    new_customers = models.IntegerField(default=0)
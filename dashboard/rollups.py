@@ -0,0 +1,217 @@
+"""
+Daily rollups behind the dashboard.
+
+Order, OrderItem and User writes call the record_* helpers (through
+dashboard.signals, or directly after bulk inserts) to apply deltas to the
+day's rows; rebuild_rollups() recomputes everything from scratch.
+"""
+from decimal import Decimal
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, DecimalField, F, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from account.models import User
+from orders.models import Order, OrderItem
+from .models import (
+    DailyCategorySales,
+    DailyCustomerSignups,
+    DailyPaymentMethodSales,
+    DailyProductSales,
+    DailySales,
+)
+
+
+def _day(moment):
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def _add(model, key_fields, counters, rows):
+    """
+    Add the ``counters`` in ``rows`` to their rollup rows in one statement,
+    inserting rows that do not exist yet (INSERT ... ON CONFLICT DO UPDATE,
+    supported by both PostgreSQL and SQLite). Each row is a dict of field
+    values; all rows must share the same fields.
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    meta = model._meta
+    fields = [meta.get_field(name) for name in rows[0]]
+    table = qn(meta.db_table)
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    sql = 'INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT ({keys}) DO UPDATE SET {updates}'.format(
+        table=table,
+        columns=', '.join(qn(field.column) for field in fields),
+        values=', '.join([placeholders] * len(rows)),
+        keys=', '.join(qn(meta.get_field(name).column) for name in key_fields),
+        updates=', '.join(
+            f'{qn(field.column)} = {table}.{qn(field.column)} + EXCLUDED.{qn(field.column)}'
+            for field in fields if field.name in counters
+        ),
+    )
+    params = [
+        field.get_db_prep_save(row[name], connection)
+        for row in rows
+        for name, field in zip(rows[0], fields)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _subtract(model, keys, **amounts):
+    """Take ``amounts`` off an existing rollup row; missing rows are left alone"""
+    model.objects.filter(**keys).update(
+        **{field: F(field) - amount for field, amount in amounts.items()}
+    )
+
+
+def record_order(created_at, payment_method, total_amount, sign=1):
+    """Count (sign=1) or uncount (sign=-1) one order in the sales rollups"""
+    day = _day(created_at)
+    total_amount = Decimal(total_amount or 0)
+    if sign > 0:
+        _add(DailySales, ['date'], ['order_count', 'revenue'], [
+            {'date': day, 'order_count': 1, 'revenue': total_amount}
+        ])
+        _add(DailyPaymentMethodSales, ['date', 'payment_method'], ['order_count', 'revenue'], [
+            {'date': day, 'payment_method': payment_method, 'order_count': 1, 'revenue': total_amount}
+        ])
+    else:
+        _subtract(DailySales, {'date': day}, order_count=1, revenue=total_amount)
+        _subtract(
+            DailyPaymentMethodSales, {'date': day, 'payment_method': payment_method},
+            order_count=1, revenue=total_amount
+        )
+
+
+def record_order_lines(created_at, lines, sign=1):
+    """
+    Count or uncount order lines, given as (product, quantity, unit_price),
+    in the product and category rollups. Additions take one statement per
+    table however many lines there are.
+    """
+    day = _day(created_at)
+    by_product = {}
+    by_category = {}
+    for product, quantity, unit_price in lines:
+        if product is None:  # the product was deleted; its sales stay in the rollups as recorded
+            continue
+        revenue = quantity * Decimal(unit_price or 0)
+        row = by_product.setdefault(product.pk, {
+            'date': day, 'product_id': product.pk, 'category_id': product.category_id,
+            'order_lines': 0, 'quantity': 0, 'revenue': Decimal(0),
+        })
+        row['order_lines'] += 1
+        row['quantity'] += quantity
+        row['revenue'] += revenue
+        row = by_category.setdefault(product.category_id, {
+            'date': day, 'category_id': product.category_id, 'quantity': 0, 'revenue': Decimal(0),
+        })
+        row['quantity'] += quantity
+        row['revenue'] += revenue
+
+    if sign > 0:
+        _add(DailyProductSales, ['date', 'product'], ['order_lines', 'quantity', 'revenue'], list(by_product.values()))
+        _add(DailyCategorySales, ['date', 'category'], ['quantity', 'revenue'], list(by_category.values()))
+        return
+    for row in by_product.values():
+        _subtract(
+            DailyProductSales, {'date': day, 'product_id': row['product_id']},
+            order_lines=row['order_lines'], quantity=row['quantity'], revenue=row['revenue']
+        )
+    for row in by_category.values():
+        _subtract(
+            DailyCategorySales, {'date': day, 'category_id': row['category_id']},
+            quantity=row['quantity'], revenue=row['revenue']
+        )
+
+
+def record_order_items(order, items):
+    """Record freshly created lines of ``order`` (e.g. after bulk_create, which sends no signals)"""
+    record_order_lines(order.created_at, [(item.product, item.quantity, item.price) for item in items])
+
+
+def record_signup(date_joined, sign=1):
+    day = _day(date_joined)
+    if sign > 0:
+        _add(DailyCustomerSignups, ['date'], ['new_customers'], [{'date': day, 'new_customers': 1}])
+    else:
+        _subtract(DailyCustomerSignups, {'date': day}, new_customers=1)
+
+
+def _line_price():
+    """Stored unit price, or the product's current price for lines that predate it"""
+    return Case(
+        When(unit_price__isnull=False, then=F('unit_price')),
+        When(product__is_sale=True, product__sale_price__isnull=False, then=F('product__sale_price')),
+        default=F('product__price'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+@transaction.atomic
+def rebuild_rollups(batch_size=1000):
+    """
+    Recompute every rollup table from orders, order items and users.
+
+    Lines of deleted products no longer say which category they were sold
+    in, so the product rows those sales left behind are kept and counted
+    in the category rollups again instead of being recomputed.
+    """
+    deleted_product_sales = list(DailyProductSales.objects.filter(product__isnull=True).values(
+        'date', 'category_id', 'order_lines', 'quantity', 'revenue'
+    ))
+    for model in (DailySales, DailyPaymentMethodSales, DailyProductSales, DailyCategorySales, DailyCustomerSignups):
+        model.objects.all().delete()
+
+    orders = Order.objects.annotate(day=TruncDate('created_at'))
+    DailySales.objects.bulk_create([
+        DailySales(date=row['day'], order_count=row['count'], revenue=row['revenue'] or 0)
+        for row in orders.values('day').annotate(count=Count('id'), revenue=Sum('total_amount')).order_by()
+    ], batch_size=batch_size)
+    DailyPaymentMethodSales.objects.bulk_create([
+        DailyPaymentMethodSales(
+            date=row['day'], payment_method=row['payment_method'],
+            order_count=row['count'], revenue=row['revenue'] or 0
+        )
+        for row in orders.values('day', 'payment_method').annotate(
+            count=Count('id'), revenue=Sum('total_amount')
+        ).order_by()
+    ], batch_size=batch_size)
+
+    lines = OrderItem.objects.filter(product__isnull=False).annotate(
+        day=TruncDate('order__created_at'),
+        line_revenue=F('quantity') * _line_price(),
+    )
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(
+            date=row['day'], product_id=row['product_id'], category_id=row['product__category_id'],
+            order_lines=row['lines'], quantity=row['quantity'], revenue=row['revenue'] or 0
+        )
+        for row in lines.values('day', 'product_id', 'product__category_id').annotate(
+            lines=Count('id'), quantity=Sum('quantity'), revenue=Sum('line_revenue')
+        ).order_by()
+    ] + [DailyProductSales(**row) for row in deleted_product_sales], batch_size=batch_size)
+
+    by_category = {}
+    for row in lines.values('day', 'product__category_id').annotate(
+        quantity=Sum('quantity'), revenue=Sum('line_revenue')
+    ).order_by():
+        by_category[row['day'], row['product__category_id']] = [row['quantity'], row['revenue'] or 0]
+    for row in deleted_product_sales:
+        if row['category_id'] is not None:
+            totals = by_category.setdefault((row['date'], row['category_id']), [0, 0])
+            totals[0] += row['quantity']
+            totals[1] += row['revenue']
+    DailyCategorySales.objects.bulk_create([
+        DailyCategorySales(date=day, category_id=category_id, quantity=quantity, revenue=revenue)
+        for (day, category_id), (quantity, revenue) in by_category.items()
+    ], batch_size=batch_size)
+
+    DailyCustomerSignups.objects.bulk_create([
+        DailyCustomerSignups(date=row['day'], new_customers=row['count'])
+        for row in User.objects.filter(is_staff=False).annotate(
+            day=TruncDate('date_joined')
+        ).values('day').annotate(count=Count('id')).order_by()
+    ], batch_size=batch_size)
@@ -0,0 +1,101 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from account.models import User
+from orders.models import Order, OrderItem
+from products.models import Product
+from .rollups import record_order, record_order_lines, record_signup
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_order(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if not raw and instance.pk is not None:
+        instance._rollup_previous = Order.objects.filter(pk=instance.pk).values(
+            'created_at', 'payment_method', 'total_amount'
+        ).first()
+
+
+@receiver(post_save, sender=Order)
+def rollup_order_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = {
+        'created_at': instance.created_at,
+        'payment_method': instance.payment_method,
+        'total_amount': instance.total_amount,
+    }
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous == current:
+        return
+    if previous:
+        record_order(sign=-1, **previous)
+    record_order(**current)
+
+
+@receiver(post_delete, sender=Order)
+def rollup_order_delete(sender, instance, **kwargs):
+    record_order(instance.created_at, instance.payment_method, instance.total_amount, sign=-1)
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_previous_order_item(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if not raw and instance.pk is not None:
+        instance._rollup_previous = OrderItem.objects.filter(pk=instance.pk).select_related(
+            'order', 'product'
+        ).first()
+
+
+@receiver(post_save, sender=OrderItem)
+def rollup_order_item_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        if (previous.product_id, previous.quantity, previous.price) == (
+            instance.product_id, instance.quantity, instance.price
+        ):
+            return
+        record_order_lines(
+            previous.order.created_at, [(previous.product, previous.quantity, previous.price)], sign=-1
+        )
+    record_order_lines(instance.order.created_at, [(instance.product, instance.quantity, instance.price)])
+
+
+@receiver(post_delete, sender=OrderItem)
+def rollup_order_item_delete(sender, instance, **kwargs):
+    order = Order.objects.filter(pk=instance.order_id).only('created_at').first()
+    product = Product.objects.filter(pk=instance.product_id).only('category_id', 'price', 'sale_price', 'is_sale').first()
+    if order is None or product is None:
+        return
+    unit_price = instance.unit_price if instance.unit_price is not None else product.current_price
+    record_order_lines(order.created_at, [(product, instance.quantity, unit_price)], sign=-1)
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_staff(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._rollup_previous_staff = None
+    # Saves of other fields, like last_login on every login, cannot toggle is_staff
+    if raw or instance.pk is None or (update_fields is not None and 'is_staff' not in update_fields):
+        return
+    instance._rollup_previous_staff = User.objects.filter(pk=instance.pk).values_list('is_staff', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def rollup_signup(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        if not instance.is_staff:
+            record_signup(instance.date_joined)
+        return
+    # Staff accounts are not customers: promoting one removes its signup, demoting adds it
+    previous = getattr(instance, '_rollup_previous_staff', None)
+    if previous is not None and previous != instance.is_staff:
+        record_signup(instance.date_joined, sign=-1 if instance.is_staff else 1)
+
+
+@receiver(post_delete, sender=User)
+def rollup_signup_delete(sender, instance, **kwargs):
+    if not instance.is_staff:
+        record_signup(instance.date_joined, sign=-1)
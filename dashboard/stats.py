@@ -0,0 +1,168 @@
+"""
+Dashboard statistics, computed from the daily rollups and served through
+dashboard.cache.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+from orders.models import Order
+from products.models import Product
+from .cache import cache_key, get_or_compute, refresh, ttl_for
+from .models import (
+    DailyCategorySales,
+    DailyCustomerSignups,
+    DailyPaymentMethodSales,
+    DailyProductSales,
+    DailySales,
+)
+from .serializers import RecentOrderSerializer
+
+
+def serialize_value(obj):
+    """Helper method to serialize date and decimal objects in querysets"""
+    if isinstance(obj, dict):
+        return {
+            key: serialize_value(value)
+            for key, value in obj.items()
+        }
+    if hasattr(obj, 'isoformat'):  # For datetime/date objects
+        return obj.isoformat()
+    if isinstance(obj, Decimal):    # For Decimal objects
+        return float(obj)
+    return obj
+
+
+def compute_stats():
+    # Calculate current statistics
+    end_date = timezone.now()
+    start_date = end_date - timedelta(days=30)
+
+    # Basic stats, summed from the daily rollups
+    totals = DailySales.objects.aggregate(
+        orders=Sum('order_count'),
+        revenue=Sum('revenue')
+    )
+    total_orders = totals['orders'] or 0
+    total_products = Product.objects.count()
+    total_customers = DailyCustomerSignups.objects.aggregate(
+        total=Sum('new_customers')
+    )['total'] or 0
+    total_revenue = totals['revenue'] or 0
+
+    # Recent orders
+    recent_orders = Order.objects.select_related('user').order_by(
+        '-created_at'
+    )[:10]
+    recent_orders_data = RecentOrderSerializer(recent_orders, many=True).data
+
+    # Sales over time
+    sales_over_time = DailySales.objects.filter(
+        date__gte=start_date.date()
+    ).annotate(
+        total=F('revenue'),
+        count=F('order_count')
+    ).values('date', 'total', 'count').order_by('date')
+
+    # Serialize dates and decimals in sales over time
+    sales_over_time_data = [serialize_value(item) for item in sales_over_time]
+
+    # Top products
+    top_products = [
+        {'name': row['product__name'], 'order_count': row['order_count']}
+        for row in DailyProductSales.objects.filter(product__isnull=False).values(
+            'product_id', 'product__name'
+        ).annotate(
+            order_count=Sum('order_lines')
+        ).order_by('-order_count')[:5]
+    ]
+
+    # Customer growth
+    customer_growth = DailyCustomerSignups.objects.filter(
+        date__gte=start_date.date()
+    ).annotate(
+        count=F('new_customers')
+    ).values('date', 'count').order_by('date')
+
+    # Serialize dates in customer growth
+    customer_growth_data = [serialize_value(item) for item in customer_growth]
+
+    stats = {
+        'total_orders': total_orders,
+        'total_products': total_products,
+        'total_customers': total_customers,
+        'total_revenue': float(total_revenue),
+        'recent_orders': recent_orders_data,
+        'sales_over_time': sales_over_time_data,
+        'top_products': top_products,
+        'customer_growth': customer_growth_data
+    }
+
+    return stats
+
+
+def compute_sales_analytics(period):
+    end_date = timezone.now()
+    start_date = end_date - timedelta(days=period)
+
+    # Sales by category: line revenue, so multi-item orders count once per line
+    sales_by_category = DailyCategorySales.objects.filter(
+        date__gte=start_date.date()
+    ).values(
+        'category_id', 'category__name'
+    ).annotate(
+        total=Sum('revenue')
+    ).order_by('-total')
+
+    # Serialize decimal values, keeping the response keys clients already use
+    sales_by_category_data = [
+        serialize_value({
+            'items__product__category__name': item['category__name'],
+            'total': item['total']
+        })
+        for item in sales_by_category
+    ]
+
+    # Sales by payment method
+    sales_by_payment = DailyPaymentMethodSales.objects.filter(
+        date__gte=start_date.date()
+    ).values(
+        'payment_method'
+    ).annotate(
+        total=Sum('revenue'),
+        count=Sum('order_count')
+    ).order_by('payment_method')
+
+    # Serialize decimal values
+    sales_by_payment_data = [serialize_value(item) for item in sales_by_payment]
+
+    analytics = {
+        'sales_by_category': sales_by_category_data,
+        'sales_by_payment': sales_by_payment_data,
+    }
+
+    return analytics
+
+
+def get_stats():
+    return get_or_compute(cache_key('stats'), compute_stats, ttl_for('stats'))
+
+
+def get_sales_analytics(period):
+    return get_or_compute(
+        cache_key('sales_analytics', period),
+        lambda: compute_sales_analytics(period),
+        ttl_for('sales_analytics')
+    )
+
+
+def precompute(periods=None):
+    """Recompute the cached stats and the sales analytics of the common periods"""
+    refresh(cache_key('stats'), compute_stats, ttl_for('stats'))
+    for period in periods or settings.DASHBOARD_PRECOMPUTE_PERIODS:
+        refresh(
+            cache_key('sales_analytics', period),
+            lambda: compute_sales_analytics(period),
+            ttl_for('sales_analytics')
+        )
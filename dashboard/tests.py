@@ -1,3 +1,210 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from backend.instrumentation import QueryBudgetTestMixin
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from .models import DailyCategorySales, DailyCustomerSignups, DailyProductSales, DailySales
+from .cache import CACHE_ALIAS, get_or_compute
+from .rollups import rebuild_rollups
 
-# Create your tests here.
+User = get_user_model()
+
+
+class RollupTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        caches[CACHE_ALIAS].clear()
+        self.customer = User.objects.create_user(
+            email='buyer@example.com', first_name='Buyer', last_name='One',
+            phone_number='9820000000', password='secret'
+        )
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', first_name='Admin', last_name='User',
+            phone_number='9820000001', password='secret'
+        )
+        dresses = Category.objects.create(name='Dresses', description='Dresses')
+        shawls = Category.objects.create(name='Shawls', description='Shawls')
+        self.dress = Product.objects.create(name='Dress', category=dresses, description='d', price=2000)
+        self.shawl = Product.objects.create(name='Shawl', category=shawls, description='s', price=500)
+
+    def place_order(self, lines):
+        order = Order.objects.create(
+            user=self.customer, total_amount=sum(p.price * q for p, q in lines)
+        )
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=product.price)
+        return order
+
+    def snapshot(self):
+        return {
+            'sales': list(DailySales.objects.values_list('date', 'order_count', 'revenue')),
+            'products': list(DailyProductSales.objects.order_by('product_id', 'category_id').values_list(
+                'product_id', 'category_id', 'order_lines', 'quantity', 'revenue'
+            )),
+            'categories': sorted(DailyCategorySales.objects.values_list('category_id', 'quantity', 'revenue')),
+            'signups': list(DailyCustomerSignups.objects.values_list('date', 'new_customers')),
+        }
+
+    def test_incremental_rollups_match_rebuild(self):
+        self.place_order([(self.dress, 1), (self.shawl, 2)])
+        doomed = self.place_order([(self.shawl, 1)])
+        edited = self.place_order([(self.dress, 2)])
+        doomed.delete()
+        item = edited.items.get()
+        item.quantity = 3
+        item.save()
+
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(incremental['sales'][0][1], 2)
+        self.assertEqual(incremental['signups'][0][1], 1)
+
+    def test_deleted_product_sales_survive_a_rebuild(self):
+        self.place_order([(self.dress, 1), (self.shawl, 2)])
+        self.place_order([(self.shawl, 1)])
+        shawls = self.shawl.category_id
+        self.shawl.delete()
+
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertIn((shawls, 3, Decimal('1500.00')), incremental['categories'])
+        self.assertIn((None, shawls, 2, 3, Decimal('1500.00')), incremental['products'])
+
+    def test_signups_follow_staff_toggles(self):
+        self.customer.is_staff = True
+        self.customer.save()
+        self.assertEqual(self.snapshot()['signups'][0][1], 0)
+
+        self.customer.is_staff = False
+        self.customer.save(update_fields=['is_staff'])
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(incremental['signups'][0][1], 1)
+
+    def test_sales_by_category_does_not_double_count_multi_item_orders(self):
+        self.place_order([(self.dress, 1), (self.shawl, 2)])
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(reverse('dashboard-sales-analytics'))
+
+        totals = {row['items__product__category__name']: row['total'] for row in response.data['sales_by_category']}
+        self.assertEqual(totals, {'Dresses': 2000.0, 'Shawls': 1000.0})
+        self.assertEqual(response.data['sales_by_payment'][0]['total'], 3000.0)
+
+    def test_stats_read_rollups(self):
+        self.place_order([(self.dress, 1)])
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(reverse('dashboard-stats'))
+
+        self.assertEqual(response.data['total_orders'], 1)
+        self.assertEqual(response.data['total_revenue'], float(Decimal('2000')))
+        self.assertEqual(response.data['total_customers'], 1)
+        self.assertEqual(response.data['top_products'], [{'name': 'Dress', 'order_count': 1}])
+
+    def test_sales_analytics_is_cached_per_period(self):
+        self.place_order([(self.dress, 1)])
+        self.client.force_authenticate(self.admin)
+        url = reverse('dashboard-sales-analytics')
+        self.client.get(url, {'period': 30})
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, {'period': 30})
+        self.assertEqual(cached.data['sales_by_payment'][0]['total'], 2000.0)
+
+        with self.assertNumQueries(2):
+            self.client.get(url, {'period': 7})
+
+    def test_sales_analytics_period_is_validated_and_clamped(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse('dashboard-sales-analytics')
+        self.assertEqual(self.client.get(url, {'period': 'week'}).status_code, 400)
+
+        self.client.get(url, {'period': 365})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {'period': 100000}).status_code, 200)
+
+    def test_precompute_warms_the_dashboard_cache(self):
+        self.place_order([(self.dress, 1)])
+        call_command('precompute', once=True, allow_local_cache=True, stdout=StringIO())
+        self.client.force_authenticate(self.admin)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('dashboard-sales-analytics'), {'period': 30})
+            self.client.get(reverse('dashboard-stats'))
+        self.assertEqual(response.data['sales_by_payment'][0]['total'], 2000.0)
+
+    def test_precompute_loop_survives_a_failed_pass(self):
+        command = 'dashboard.management.commands.precompute'
+        stderr = StringIO()
+        with mock.patch(f'{command}.precompute', side_effect=[RuntimeError('cache down'), None]) as job, \
+                mock.patch(f'{command}.time.sleep', side_effect=[None, KeyboardInterrupt]), \
+                mock.patch(f'{command}.close_old_connections'):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('precompute', allow_local_cache=True, stdout=StringIO(), stderr=stderr)
+        self.assertEqual(job.call_count, 2)
+        self.assertIn('cache down', stderr.getvalue())
+
+        with mock.patch(f'{command}.precompute', side_effect=RuntimeError('cache down')):
+            with self.assertRaisesMessage(RuntimeError, 'cache down'):
+                call_command('precompute', once=True, allow_local_cache=True, stdout=StringIO())
+
+    def test_precompute_refuses_process_local_caches(self):
+        with self.assertRaisesMessage(CommandError, 'default, dashboard'):
+            call_command('precompute', once=True, stdout=StringIO())
+
+
+class DashboardCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+
+    def test_value_is_reused_while_fresh(self):
+        compute = mock.Mock(return_value={'total': 1})
+        self.assertEqual(get_or_compute('dashboard:test', compute, 60), {'total': 1})
+        self.assertEqual(get_or_compute('dashboard:test', compute, 60), {'total': 1})
+        self.assertEqual(compute.call_count, 1)
+
+    def test_stale_value_is_served_while_another_request_recomputes(self):
+        get_or_compute('dashboard:test', lambda: 'old', 0)
+        caches[CACHE_ALIAS].add('dashboard:test:lock', True)
+
+        self.assertEqual(get_or_compute('dashboard:test', lambda: 'new', 60), 'old')
+
+        caches[CACHE_ALIAS].delete('dashboard:test:lock')
+        self.assertEqual(get_or_compute('dashboard:test', lambda: 'new', 60), 'new')
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_or_compute('dashboard:test', compute, 60)))
+                   for _ in range(8)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ['value'] * 8)
@@ -6,7 +6,7 @@ from products.models import Product
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 1
-    fields = ['product', 'quantity']
+    fields = ['product', 'quantity', 'size']
     raw_id_fields = ('product',)
 
     def get_formset(self, request, obj=None, **kwargs):
@@ -43,15 +43,19 @@ class OrderAdmin(admin.ModelAdmin):
         # Delete objects marked for deletion
         for obj in formset.deleted_objects:
             obj.delete()
-        # Save new and modified instances
+        # Save new and modified instances, capturing the price and product when first added
         for instance in instances:
+            if instance.unit_price is None and instance.product is not None:
+                instance.unit_price = instance.product.current_price
+            if not instance.product_name and instance.product is not None:
+                instance.snapshot_product(instance.product)
             instance.save()
         formset.save_m2m()
         # Recalculate total_amount after saving inline items
         obj = form.instance
         obj.total_amount = sum(
-            item.quantity * (item.product.sale_price if item.product.sale_price else item.product.price)
-            for item in obj.items.all()
+            item.quantity * (item.price or 0)
+            for item in obj.items.select_related('product')
         )
         obj.save()
 
@@ -63,7 +67,7 @@ class OrderItemAdmin(admin.ModelAdmin):
     readonly_fields = ['get_price']
 
     def get_price(self, obj):
-        return obj.product.sale_price if obj.product.sale_price else obj.product.price
+        return obj.price
     get_price.short_description = 'Price'
 
     def get_queryset(self, request):
@@ -0,0 +1,67 @@
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from products.cache import invalidate_product
+from products.models import Product
+
+
+class InsufficientStock(Exception):
+    """Raised when an order cannot be covered by the current stock"""
+
+    def __init__(self, product, size=None):
+        self.product = product
+        self.size = size
+        if size:
+            message = f'Not enough stock for {product.name} in size {size}'
+        else:
+            message = f'Not enough stock for {product.name}'
+        super().__init__(message)
+
+
+def _requirements(items):
+    """Sum quantities per product, and per size where the line has one"""
+    needed = defaultdict(lambda: {'total': 0, 'sizes': defaultdict(int)})
+    for item in items:
+        need = needed[item.product_id]
+        need['total'] += item.quantity
+        if item.size:
+            need['sizes'][item.size] += item.quantity
+    return needed
+
+
+def deduct_order_stock(order):
+    """
+    Decrement total and per-size stock for every line of ``order``.
+
+    Product rows are locked with SELECT ... FOR UPDATE in primary key order,
+    so concurrent confirmations serialize per product and cannot deadlock.
+    All lines are checked before anything is written; on failure
+    InsufficientStock is raised and no stock changes.
+    """
+    needed = _requirements(order.items.all())
+    if not needed:
+        return []
+
+    with transaction.atomic():
+        products = list(
+            Product.objects.select_for_update().filter(pk__in=needed.keys()).order_by('pk')
+        )
+        now = timezone.now()
+        for product in products:
+            need = needed[product.pk]
+            if product.stock < need['total']:
+                raise InsufficientStock(product)
+            for size, quantity in need['sizes'].items():
+                if product.sizes.get(size, 0) < quantity:
+                    raise InsufficientStock(product, size)
+
+            for size, quantity in need['sizes'].items():
+                product.sizes[size] -= quantity
+            product.stock -= need['total']
+            product.updated_at = now
+
+        Product.objects.bulk_update(products, ['stock', 'sizes', 'updated_at'])
+        # bulk_update skips post_save, so drop cached catalogue responses here
+        for product in products:
+            invalidate_product(product.pk, product.category_id)
+    return products
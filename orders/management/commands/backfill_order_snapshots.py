@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from orders.snapshots import backfill_line_snapshots
+
+
+class Command(BaseCommand):
+    help = "Copy product name, slug, image and price onto order lines placed before line snapshots existed"
+
+    def handle(self, *args, **options):
+        count = backfill_line_snapshots()
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted {count} order lines"))
@@ -26,13 +26,54 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=50, choices=[('Pending', 'Pending'), ('Shipped', 'Shipped'), ('Delivered', 'Delivered')], default='Pending')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.email}"
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Lines outlive the product; the snapshot below is what order history shows
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     quantity = models.PositiveIntegerField()
+    size = models.CharField(max_length=3, blank=True, null=True)  # Deducted from Product.sizes when set.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # Price paid, captured at order time.
+    # Product as it was at order time (see snapshot_product)
+    product_name = models.CharField(max_length=100, blank=True, default='')
+    product_slug = models.SlugField(blank=True, default='')
+    thumbnail = models.CharField(max_length=255, blank=True, default='')  # Storage name of the first product image.
+
+    @property
+    def price(self):
+        """Unit price paid; falls back to the live product price for older rows"""
+        if self.unit_price is not None or self.product_id is None:
+            return self.unit_price
+        return self.product.current_price
+
+    @property
+    def line_total(self):
+        """Amount paid for the line; None until backfill_line_snapshots() stores an older line's price"""
+        if self.unit_price is None:
+            return None
+        return self.unit_price * self.quantity
+
+    def snapshot_product(self, product):
+        """
+        Copy what order history shows from ``product``: its name, slug and
+        first image, which products.cards.product_cards() has annotated
+        (otherwise it is looked up).
+        """
+        self.product_name = product.name
+        self.product_slug = product.slug
+        if hasattr(product, 'thumbnail_image'):
+            thumbnail = product.thumbnail_image
+        else:
+            thumbnail = product.images.order_by('id').values_list('image', flat=True).first()
+        self.thumbnail = thumbnail or ''
 
     def __str__(self):
-        return f"{self.product.name} x {self.quantity}"
\ No newline at end of file
+        return f"{self.product_name or self.product_id} x {self.quantity}"
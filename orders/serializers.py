@@ -1,21 +1,33 @@
 # orders/serializers.py
 
 from rest_framework import serializers
+from backend.sparse import SparseFieldsMixin
 from .models import Order, OrderItem
 from products.models import Product
-from products.serializers import ProductSerializer
+from products.cards import thumbnail_url
+from products.serializers import ProductCardSerializer
 from users.serializers import AddressSerializer
 from account.serializers import UserSerializer
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    # Use the nested ProductSerializer to display product details
-    product = ProductSerializer()
+class OrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Order line as it was bought, from the snapshot stored on the line;
+    ``?expand=items.product`` swaps the product id for its live card.
+    """
+    name = serializers.CharField(source='product_name', read_only=True)
+    slug = serializers.CharField(source='product_slug', read_only=True)
+    thumbnail = serializers.SerializerMethodField()
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ['product', 'quantity', 'order']
+        fields = ['id', 'product', 'name', 'slug', 'thumbnail', 'quantity', 'size', 'unit_price', 'line_total', 'order']
+        expandable_fields = {'product': (ProductCardSerializer, {})}
 
-class OrderSerializer(serializers.ModelSerializer):
+    def get_thumbnail(self, obj):
+        return thumbnail_url(obj.thumbnail, self.context.get('request'))
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     address = AddressSerializer( read_only=True)
     user = UserSerializer()
@@ -24,8 +36,17 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['id', 'user', 'address', 'total_amount', 'payment_method', 'payment_status', 'status', 'created_at', 'items']
 
+class OrderLineSerializer(serializers.Serializer):
+    """
+    A requested line. Whether the product exists and has the size is
+    checked by the view, against one load of all the order's products.
+    """
+    product = serializers.IntegerField(min_value=1)
+    stock = serializers.IntegerField(min_value=1)  # the quantity ordered
+    size = serializers.CharField(max_length=3, required=False, allow_blank=True, allow_null=True)
+
 class OrderCreateSerializer(serializers.ModelSerializer):
-    products = serializers.ListField(child=serializers.DictField(), write_only=True)
+    products = OrderLineSerializer(many=True, write_only=True)
     payment_method = serializers.ChoiceField(choices=Order.PAYMENT_METHOD_CHOICES, required=True)
 
     class Meta:
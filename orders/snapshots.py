@@ -0,0 +1,34 @@
+"""
+Product snapshots on order lines.
+
+New lines copy the product's name, slug and first image when the order is
+placed (OrderItem.snapshot_product), so order history reads neither the
+product nor its images, and keeps working once a product is edited or
+deleted. backfill_line_snapshots() fills in lines that predate the
+snapshot columns.
+"""
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from products.models import Product, ProductImage
+from .models import OrderItem
+
+
+def backfill_line_snapshots():
+    """
+    Snapshot the live product into every line that has none yet, and store
+    its current price as the unit price where that is missing. One UPDATE;
+    returns the number of lines filled in.
+    """
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    first_image = ProductImage.objects.filter(product=OuterRef('product_id')).order_by('id').values('image')[:1]
+    current_price = product.annotate(current=Case(
+        When(is_sale=True, sale_price__isnull=False, then=F('sale_price')),
+        default=F('price'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )).values('current')[:1]
+    return OrderItem.objects.filter(product_name='', product__isnull=False).update(
+        product_name=Subquery(product.values('name')[:1]),
+        product_slug=Subquery(product.values('slug')[:1]),
+        thumbnail=Coalesce(Subquery(first_image), Value('')),
+        unit_price=Coalesce(F('unit_price'), Subquery(current_price)),
+    )
@@ -1,3 +1,269 @@
-from django.test import TestCase
+import threading
+from unittest import skipUnless
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from backend.explain import QueryPlanTestMixin
+from backend.instrumentation import QueryBudgetTestMixin
+from products.models import Category, Product, ProductImage
+from users.models import Address
+from .inventory import InsufficientStock, deduct_order_stock
+from .models import Order, OrderItem
+from .snapshots import backfill_line_snapshots
 
-# Create your tests here.
+User = get_user_model()
+
+
+class OrderFixtureMixin:
+    def create_customer(self, index=0):
+        return User.objects.create_user(
+            email=f'customer{index}@example.com', first_name='Customer', last_name=str(index),
+            phone_number=f'98100000{index:02d}', password='secret'
+        )
+
+    def create_product(self, name='Kurta', sizes=None, **kwargs):
+        category, _ = Category.objects.get_or_create(slug='kurtas', defaults={'name': 'Kurtas', 'description': 'Kurtas'})
+        sizes = sizes if sizes is not None else {'S': 3, 'M': 2}
+        return Product.objects.create(
+            name=name, category=category, description='Cotton kurta', price=1500,
+            stock=sum(sizes.values()), sizes=sizes, **kwargs
+        )
+
+    def create_order(self, user, lines):
+        order = Order.objects.create(user=user, total_amount=0)
+        for product, quantity, size in lines:
+            item = OrderItem(order=order, product=product, quantity=quantity, size=size, unit_price=product.current_price)
+            item.snapshot_product(product)
+            item.save()
+        return order
+
+
+class StockDeductionTests(OrderFixtureMixin, TestCase):
+    def test_deducts_total_and_size_stock(self):
+        product = self.create_product()
+        order = self.create_order(self.create_customer(), [(product, 2, 'S'), (product, 1, 'M')])
+
+        deduct_order_stock(order)
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 2)
+        self.assertEqual(product.sizes, {'S': 1, 'M': 1})
+
+    def test_failure_leaves_every_line_untouched(self):
+        plenty = self.create_product(name='Plenty', sizes={'S': 10})
+        scarce = self.create_product(name='Scarce', sizes={'S': 1, 'M': 5})
+        order = self.create_order(self.create_customer(), [(plenty, 3, 'S'), (scarce, 2, 'S')])
+
+        with self.assertRaisesMessage(InsufficientStock, 'Scarce in size S'):
+            deduct_order_stock(order)
+
+        plenty.refresh_from_db()
+        scarce.refresh_from_db()
+        self.assertEqual((plenty.stock, plenty.sizes), (10, {'S': 10}))
+        self.assertEqual((scarce.stock, scarce.sizes), (6, {'S': 1, 'M': 5}))
+
+
+class OrderCreationTests(QueryBudgetTestMixin, OrderFixtureMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_customer()
+        self.address = Address.objects.create(
+            user=self.user, address_name='Home', street_name='Durbar Marg',
+            phone_number='9810000000', city='Kathmandu'
+        )
+        self.client.force_authenticate(self.user)
+
+    def place_order(self, products):
+        return self.client.post(reverse('order-list'), {
+            'address': self.address.pk,
+            'payment_method': 'COD',
+            'products': [{'product': p.pk, 'stock': 2, 'size': 'S'} for p in products],
+        }, format='json')
+
+    def test_query_count_is_independent_of_line_count(self):
+        one = [self.create_product(name='Single')]
+        many = [self.create_product(name=f'Line {i}') for i in range(6)]
+        self.place_order(one)  # warm up per-connection setup queries
+
+        # 6 for the order itself plus one upsert per dashboard rollup table
+        with self.assertNumQueries(10) as single:
+            self.place_order(one)
+        with self.assertNumQueries(len(single.captured_queries)):
+            response = self.place_order(many)
+        self.assertEqual(response.status_code, 201)
+
+    def test_lines_store_unit_price_snapshot(self):
+        product = self.create_product(is_sale=True, sale_price=1200)
+        ProductImage.objects.create(product=product, image='product_images/kurta.jpg')
+        self.place_order([product])
+
+        item = OrderItem.objects.get()
+        self.assertEqual(item.unit_price, 1200)
+        self.assertEqual(item.order.total_amount, 1200 * 2 + 100)
+        self.assertEqual(
+            (item.product_name, item.product_slug, item.thumbnail), ('Kurta', product.slug, 'product_images/kurta.jpg')
+        )
+
+    def test_unknown_product_is_rejected(self):
+        response = self.client.post(reverse('order-list'), {
+            'address': self.address.pk,
+            'payment_method': 'COD',
+            'products': [{'product': 999, 'stock': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_bad_sizes_and_quantities_are_rejected(self):
+        product = self.create_product()
+        for line in [
+            {'product': product.pk, 'stock': 1, 'size': 'XXL'},
+            {'product': product.pk, 'stock': 1, 'size': 'XXXXL'},
+            {'product': product.pk, 'stock': 0, 'size': 'S'},
+            {'product': product.pk, 'stock': 'two', 'size': 'S'},
+        ]:
+            response = self.client.post(reverse('order-list'), {
+                'address': self.address.pk, 'payment_method': 'COD', 'products': [line],
+            }, format='json')
+            self.assertEqual(response.status_code, 400, line)
+        self.assertFalse(Order.objects.exists())
+
+    def test_lines_without_a_size_are_accepted(self):
+        product = self.create_product()
+        for line in ({'product': product.pk, 'stock': 1}, {'product': product.pk, 'stock': 1, 'size': ''}):
+            response = self.client.post(reverse('order-list'), {
+                'address': self.address.pk, 'payment_method': 'COD', 'products': [line],
+            }, format='json')
+            self.assertEqual(response.status_code, 201, line)
+        self.assertEqual(list(OrderItem.objects.values_list('size', flat=True)), [None, None])
+
+
+@skipUnless(connection.features.has_select_for_update, "Row locks are needed for concurrent confirmations")
+class ConcurrentPaymentTests(OrderFixtureMixin, TransactionTestCase):
+    THREADS = 12
+
+    def test_parallel_confirmations_never_oversell(self):
+        product = self.create_product(sizes={'S': 5})
+        orders = [
+            self.create_order(self.create_customer(i), [(product, 1, 'S')])
+            for i in range(self.THREADS)
+        ]
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+
+        def confirm(order):
+            try:
+                barrier.wait()
+                deduct_order_stock(order)
+                results.append('paid')
+            except InsufficientStock:
+                results.append('rejected')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=confirm, args=(order,)) for order in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count('paid'), 5)
+        self.assertEqual(results.count('rejected'), self.THREADS - 5)
+        self.assertEqual((product.stock, product.sizes), (0, {'S': 0}))
+
+
+class OrderListingTests(QueryBudgetTestMixin, OrderFixtureMixin, APITestCase):
+    def test_user_orders_are_served_from_line_snapshots_in_two_queries(self):
+        user = self.create_customer()
+        products = [self.create_product(name=f'Kurta {i}') for i in range(3)]
+        for _ in range(30):
+            self.create_order(user, [(product, 1, 'S') for product in products])
+        self.create_order(self.create_customer(index=1), [(products[0], 1, 'S')])
+        Product.objects.filter(pk=products[0].pk).update(name='Renamed', price=9999)
+        products[1].delete()
+        self.client.force_authenticate(user)
+
+        # a page of orders with user and address, then their lines
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('order-user-orders'), {'page_size': 20})
+
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+        lines = response.data['results'][0]['items']
+        self.assertEqual([line['name'] for line in lines], ['Kurta 0', 'Kurta 1', 'Kurta 2'])
+        self.assertEqual(lines[0]['line_total'], '1500.00')
+        self.assertIsNone(lines[1]['product'])
+
+        with self.assertNumQueries(2):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNone(response.data['next'])
+
+    def test_list_only_shows_the_callers_orders(self):
+        user, other = self.create_customer(), self.create_customer(index=1)
+        mine = self.create_order(user, [(self.create_product(), 1, 'S')])
+        theirs = self.create_order(other, [(self.create_product(name='Other'), 1, 'S')])
+        self.client.force_authenticate(user)
+
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual([order['id'] for order in response.data['results']], [mine.pk])
+        self.assertEqual(self.client.get(reverse('order-detail', args=[theirs.pk])).status_code, 404)
+
+    def test_expanded_products_are_live_cards(self):
+        user = self.create_customer()
+        self.create_order(user, [(self.create_product(), 1, 'S')])
+        self.client.force_authenticate(user)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('order-user-orders'), {'expand': 'items.product'})
+
+        card = response.data['results'][0]['items'][0]['product']
+        self.assertEqual(card['name'], 'Kurta')
+        self.assertIn('current_price', card)
+
+    def test_unrequested_items_are_not_loaded(self):
+        user = self.create_customer()
+        self.create_order(user, [(self.create_product(), 1, 'S')])
+        self.client.force_authenticate(user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('order-user-orders'), {'fields': 'id,status,total_amount'})
+
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status', 'total_amount'})
+
+    def test_backfill_snapshots_older_lines(self):
+        user = self.create_customer()
+        product = self.create_product(is_sale=True, sale_price=1100)
+        ProductImage.objects.create(product=product, image='product_images/kurta.jpg')
+        order = Order.objects.create(user=user, total_amount=0)
+        OrderItem.objects.create(order=order, product=product, quantity=2, size='S')
+
+        self.assertEqual(backfill_line_snapshots(), 1)
+
+        item = OrderItem.objects.get()
+        self.assertEqual((item.product_name, item.thumbnail), ('Kurta', 'product_images/kurta.jpg'))
+        self.assertEqual(item.line_total, 2200)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are checked on PostgreSQL")
+class OrderQueryPlanTests(QueryPlanTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([
+            User(email=f'customer{i}@example.com', first_name='Customer', last_name=str(i), phone_number=f'98100000{i:02d}')
+            for i in range(20)
+        ])
+        Order.objects.bulk_create([
+            Order(user=cls.users[i % 20], total_amount=1000) for i in range(2000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_user_orders(self):
+        queryset = Order.objects.filter(user=self.users[0]).order_by('-created_at')
+        self.assertUsesIndex(queryset, 'order_user_created_idx')
+
+    def test_recent_orders(self):
+        self.assertUsesIndex(Order.objects.order_by('-created_at')[:10], 'order_created_idx')
@@ -1,16 +1,42 @@
 from rest_framework import viewsets, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.db import transaction
+from django.db.models import Prefetch
+from backend.instrumentation import InstrumentedViewMixin
+from backend.pagination import KeysetPagination
+from backend.sparse import expand_requested, field_requested
+from dashboard.rollups import record_order_items
+from .inventory import InsufficientStock, deduct_order_stock
 from .models import Order, OrderItem
 from .serializers import OrderSerializer, OrderCreateSerializer
-from products.models import Product
-from users.models import Address
+from products.cards import prefetch_product_cards, product_cards
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    query_budgets = {'create': 11, 'list': 4, 'retrieve': 4, 'user_orders': 4}
+
+    def get_queryset(self):
+        """
+        Customers only see their own orders. History is read from the line
+        snapshots, so pages take two queries (orders, then their lines);
+        live product cards are loaded only for ``?expand=items.product``.
+        """
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        if self.action in ['list', 'retrieve', 'user_orders']:
+            queryset = queryset.select_related('user', 'address')
+            if field_requested(self.request, 'items'):
+                queryset = queryset.prefetch_related(Prefetch('items', queryset=OrderItem.objects.order_by('id')))
+                expanded = expand_requested(self.request, 'items', 'product')
+                if expanded and field_requested(self.request, 'items', 'product'):
+                    queryset = queryset.prefetch_related(prefetch_product_cards('items__product'))
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -24,28 +50,41 @@ class OrderViewSet(viewsets.ModelViewSet):
         delivery_charge = 100
 
         payment_method = data.get('payment_method', 'COD')
-        products = data.get('products', [])
+        # Lines already checked for shape by OrderLineSerializer
+        products = serializer.validated_data['products']
 
-        try:
-            address = Address.objects.get(id=data['address'], user=user)
-        except Address.DoesNotExist:
-            return Response({'error': 'Invalid address'}, status=status.HTTP_400_BAD_REQUEST)
+        # Already loaded by the serializer's primary key field
+        address = serializer.validated_data.get('address')
+        if address is None or address.user_id != user.id:
+            raise ValidationError({'error': 'Invalid address'})
+
+        # Price, check and snapshot every line from one read of the referenced product cards
+        catalogue = product_cards().in_bulk({item['product'] for item in products})
 
         total_amount = 0
+        order_items = []
         for item in products:
             product_id = item['product']
             quantity = item['stock']
+            size = item.get('size') or None
 
-            try:
-                product = Product.objects.get(id=product_id)
-            except Product.DoesNotExist:
-                return Response(
-                    {'error': f'Product with ID {product_id} not found'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            product = catalogue.get(product_id)
+            if product is None:
+                raise ValidationError({'error': f'Product with ID {product_id} not found'})
+            # Lines without a size are accepted, as they always were; a given size must exist
+            if size is not None and size not in product.sizes:
+                raise ValidationError({'error': f"Size '{size}' is not available for {product.name}"})
 
-            item_price = product.sale_price if product.is_sale and product.sale_price else product.price
+            item_price = product.current_price
             total_amount += item_price * quantity + delivery_charge
+            order_item = OrderItem(
+                product=product,
+                quantity=quantity,
+                size=size,
+                unit_price=item_price
+            )
+            order_item.snapshot_product(product)
+            order_items.append(order_item)
 
         with transaction.atomic():
             # Explicitly set payment_status and initial order status
@@ -57,13 +96,11 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status='Pending'  # Ensure this is set
             )
 
-            for item in products:
-                product = Product.objects.get(id=item['product'])
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=item['stock']
-                )
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
+            # bulk_create sends no post_save, so feed the dashboard rollups here
+            record_order_items(order, order_items)
 
         return Response(
             {'message': 'Order created successfully', 'order_id': order.id},
@@ -73,32 +110,33 @@ class OrderViewSet(viewsets.ModelViewSet):
     def partial_update(self, request, *args, **kwargs):
         """Handle partial updates with proper status handling."""
         instance = self.get_object()
-        
-        # Get the current values
-        previous_payment_status = instance.payment_status
-        previous_status = instance.status
-        
-        # Get the new values from request
-        new_payment_status = request.data.get('payment_status', previous_payment_status)
-        new_status = request.data.get('status', previous_status)
 
         with transaction.atomic():
+            # Lock the order so two confirmations cannot both see it unpaid
+            instance = Order.objects.select_for_update().get(pk=instance.pk)
+
+            # Get the current values
+            previous_payment_status = instance.payment_status
+            previous_status = instance.status
+
+            # Get the new values from request
+            new_payment_status = request.data.get('payment_status', previous_payment_status)
+            new_status = request.data.get('status', previous_status)
+
             # First update the order instance with new values
             instance.payment_status = new_payment_status
             instance.status = new_status
 
             # If payment status is changing to 'Paid', handle stock deduction
             if previous_payment_status != 'Paid' and new_payment_status == 'Paid':
-                for item in instance.items.all():
-                    product = item.product
-                    if product.stock < item.quantity:
-                        transaction.set_rollback(True)
-                        return Response(
-                            {'error': f'Not enough stock for {product.name}'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    product.stock -= item.quantity
-                    product.save()
+                try:
+                    deduct_order_stock(instance)
+                except InsufficientStock as e:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {'error': str(e)},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
 
             # Save the instance with all updates
             instance.save()
@@ -109,7 +147,8 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def user_orders(self, request):
-        """List orders for the authenticated user."""
-        user_orders = self.queryset.filter(user=request.user).order_by('-created_at')
-        serializer = self.get_serializer(user_orders, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        """The authenticated user's order history, newest first, one page at a time."""
+        user_orders = self.get_queryset().filter(user=request.user)
+        page = self.paginate_queryset(user_orders)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import async_views
+
+# Async (ASGI) versions of the catalogue reads, mounted under public/api/async/
+urlpatterns = [
+    path('products/', async_views.product_list, name='async-product-list'),
+    path('products/product_of_the_day/', async_views.product_of_the_day, name='async-product-of-the-day'),
+    path('products/<slug:slug>/', async_views.product_detail, name='async-product-detail'),
+    path('categories/', async_views.category_list, name='async-category-list'),
+    path('reviews/product_reviews/', async_views.product_reviews, name='async-product-reviews'),
+]
@@ -0,0 +1,123 @@
+"""
+Async versions of the read-heavy catalogue endpoints, for ASGI workers.
+
+They return the same representations as the matching ProductViewSet,
+CategoryViewSet and ReviewViewSet reads. Rows come from the async ORM and
+cached responses from the async cache API, so a single worker can overlap
+the database and cache waits of many requests. The serializers are
+synchronous, so each view loads everything they read before serializing.
+
+These are anonymous reads: credentials are not looked at, and responses
+are cached for every caller.
+"""
+from functools import wraps
+from django.views.decorators.http import require_safe
+from rest_framework import filters, status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from backend.pagination import KeysetPagination, ProductPagination
+from .cache import CATALOGUE, CATEGORIES, acached_response, product_dependencies
+from .cards import category_cards, related_cards
+from .featured import aproduct_of_the_day_id, arefresh_product_of_the_day
+from .models import Category, Product, Review
+from .serializers import CategorySerializer, ProductDetailSerializer, ProductSerializer, ReviewSerializer
+from .views import CategoryViewSet, ProductViewSet, catalogue_queryset, filter_catalogue, product_detail_queryset
+
+
+def async_api_view(view):
+    """
+    Run ``view`` with a DRF Request and render the Response it returns as
+    JSON, the way the DRF views render for API clients. API exceptions,
+    such as a ValidationError for a malformed filter, become their error
+    responses.
+    """
+    @require_safe
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            response = await view(Request(request), *args, **kwargs)
+        except APIException as e:
+            response = Response(e.detail, status=e.status_code)
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = response.accepted_renderer.media_type
+        response.renderer_context = {}
+        return response
+    return wrapper
+
+
+def not_found(model):
+    return Response(
+        {'detail': f'No {model._meta.object_name} matches the given query.'}, status=status.HTTP_404_NOT_FOUND
+    )
+
+
+async def serialize_detail(request, product):
+    """ProductDetailSerializer data, with the related product cards loaded beforehand"""
+    product.related_cards = [card async for card in related_cards(product)]
+    if not product.related_cards:
+        product.related_cards = [card async for card in category_cards(product)]
+    return ProductDetailSerializer(product, context={'request': request}).data
+
+
+async def paginated(paginator, queryset, serializer_class, request):
+    page = await paginator.apaginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, context={'request': request})
+    return Response(paginator.get_paginated_data(serializer.data))
+
+
+@async_api_view
+@acached_response('async-product-list', [CATALOGUE])
+async def product_list(request):
+    queryset = filters.SearchFilter().filter_queryset(request, catalogue_queryset(request), ProductViewSet)
+    queryset = filter_catalogue(queryset, request.query_params)
+    return await paginated(ProductPagination(), queryset, ProductSerializer, request)
+
+
+@async_api_view
+@acached_response('async-product-detail', product_dependencies)
+async def product_detail(request, slug):
+    product = await product_detail_queryset(request).filter(slug=slug).afirst()
+    if product is None:
+        return not_found(Product)
+    response = Response(await serialize_detail(request, product))
+    response.instance = product
+    return response
+
+
+@async_api_view
+async def product_of_the_day(request):
+    product = None
+    product_id = await aproduct_of_the_day_id()
+    if product_id is not None:
+        product = await product_detail_queryset(request).filter(id=product_id).afirst()
+        if product is None:
+            # Today's pick was deleted since; choose again
+            product_id = await arefresh_product_of_the_day()
+            product = await product_detail_queryset(request).filter(id=product_id).afirst()
+
+    if product is None:
+        return Response({"error": "No products available"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(await serialize_detail(request, product))
+
+
+@async_api_view
+@acached_response('async-category-list', [CATEGORIES])
+async def category_list(request):
+    queryset = filters.SearchFilter().filter_queryset(request, Category.objects.all(), CategoryViewSet)
+    categories = [category async for category in queryset]
+    return Response(CategorySerializer(categories, many=True, context={'request': request}).data)
+
+
+@async_api_view
+async def product_reviews(request):
+    product_slug = request.query_params.get('product_slug')
+    if not product_slug:
+        return Response({"error": "Product slug is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    product = await Product.objects.filter(slug=product_slug).only('id').afirst()
+    if product is None:
+        return not_found(Product)
+    reviews = Review.objects.filter(product=product).select_related('user', 'product')
+    return await paginated(KeysetPagination(), reviews, ReviewSerializer, request)
@@ -0,0 +1,237 @@
+"""
+Versioned response cache for the public catalogue endpoints.
+
+Every cached entry records the generation numbers of the catalogue parts it
+was built from (the whole catalogue, a product, a category...). Writes bump
+those generations through the signal handlers in products.signals, so an
+entry is served only while all of its generations are unchanged.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+from django.core.cache import cache
+from django.db import transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+CACHE_PREFIX = 'catalogue'
+RESPONSE_TTL = 60 * 60
+STATS_KEYS = {'hits': f'{CACHE_PREFIX}:stats:hits', 'misses': f'{CACHE_PREFIX}:stats:misses'}
+
+# Generation names
+CATALOGUE = 'catalogue'      # anything that can appear in a product list
+CATEGORIES = 'categories'    # the category list (names and product counts)
+
+
+def product_generation(product_id):
+    return f'product:{product_id}'
+
+
+def category_generation(category_id):
+    return f'category:{category_id}'
+
+
+def product_dependencies(product):
+    """
+    Generations of a product detail response: the product, its category and
+    the products of the related cards it embedded (``product.related_cards``,
+    set while serializing)
+    """
+    names = [product_generation(product.pk), category_generation(product.category_id)]
+    names += [product_generation(card.pk) for card in getattr(product, 'related_cards', None) or ()]
+    return names
+
+
+def _generation_key(name):
+    return f'{CACHE_PREFIX}:gen:{name}'
+
+
+def get_generations(names):
+    """Current value of each generation, initialising missing ones"""
+    keys = {name: _generation_key(name) for name in names}
+    values = cache.get_many(keys.values())
+    generations = {}
+    for name, key in keys.items():
+        if key not in values:
+            # A fresh start value that cannot collide with one an evicted
+            # generation had, so old entries never look current again.
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+        generations[name] = values[key]
+    return generations
+
+
+async def aget_generations(names):
+    """get_generations() through the async cache API"""
+    keys = {name: _generation_key(name) for name in names}
+    values = await cache.aget_many(keys.values())
+    generations = {}
+    for name, key in keys.items():
+        if key not in values:
+            await cache.aadd(key, time.time_ns(), None)
+            values[key] = await cache.aget(key)
+        generations[name] = values[key]
+    return generations
+
+
+def bump(*names):
+    for name in names:
+        key = _generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def invalidate_product(product_id, *category_ids):
+    """Drop every cached response a product write can affect, once the write commits"""
+    names = [CATALOGUE, CATEGORIES, product_generation(product_id)]
+    names += [category_generation(category_id) for category_id in category_ids if category_id]
+    transaction.on_commit(lambda: bump(*names))
+
+
+def invalidate_category(category_id):
+    names = [CATALOGUE, CATEGORIES, category_generation(category_id)]
+    transaction.on_commit(lambda: bump(*names))
+
+
+def _increment_stat(name):
+    key = STATS_KEYS[name]
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+async def _aincrement_stat(name):
+    key = STATS_KEYS[name]
+    if not await cache.aadd(key, 1, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, None)
+
+
+def cache_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def _response_key(endpoint, request, kwargs):
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    # The host is part of the key because paginated responses embed absolute links
+    raw = json.dumps([endpoint, request.get_host(), sorted(kwargs.items()), params])
+    return f'{CACHE_PREFIX}:resp:{endpoint}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def _not_modified(request, entry):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return entry['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(entry['last_modified']) <= if_modified_since
+
+
+def _respond(request, entry):
+    if _not_modified(request, entry):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(entry['data'])
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    return response
+
+
+def _entry(data, generations):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return {
+        'data': data,
+        'generations': generations,
+        'etag': quote_etag(hashlib.md5(body.encode()).hexdigest()),
+        'last_modified': time.time(),
+    }
+
+
+def cached_response(endpoint, dependencies):
+    """
+    Cache an anonymous GET action's data under ``endpoint`` and the
+    normalized query string.
+
+    ``dependencies`` lists the generation names the response is built
+    from, or is a callable returning them from the object the view served,
+    which the view sets as ``response.instance``; the entry is dropped as
+    soon as one of them is bumped. Responses carry ETag/Last-Modified and
+    honour conditional requests.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view_method(self, request, *args, **kwargs)
+
+            key = _response_key(endpoint, request, kwargs)
+            entry = cache.get(key)
+            if entry is not None and get_generations(entry['generations']) == entry['generations']:
+                _increment_stat('hits')
+                return _respond(request, entry)
+
+            _increment_stat('misses')
+            # Snapshot static dependencies before building, so a write that
+            # lands mid-request invalidates what we are about to store.
+            generations = None if callable(dependencies) else get_generations(dependencies)
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            if generations is None:
+                generations = get_generations(dependencies(response.instance))
+
+            entry = _entry(response.data, generations)
+            cache.set(key, entry, RESPONSE_TTL)
+            return _respond(request, entry)
+        return wrapper
+    return decorator
+
+
+def acached_response(endpoint, dependencies):
+    """
+    cached_response() for async views, which take a DRF Request and return
+    a Response. The entries are read and written with the async cache API.
+    Async views serve the same data to every caller, so authenticated
+    requests are cached too.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await view(request, *args, **kwargs)
+
+            key = _response_key(endpoint, request, kwargs)
+            entry = await cache.aget(key)
+            if entry is not None and await aget_generations(entry['generations']) == entry['generations']:
+                await _aincrement_stat('hits')
+                return _respond(request, entry)
+
+            await _aincrement_stat('misses')
+            generations = None if callable(dependencies) else await aget_generations(dependencies)
+            response = await view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            if generations is None:
+                generations = await aget_generations(dependencies(response.instance))
+
+            entry = _entry(response.data, generations)
+            await cache.aset(key, entry, RESPONSE_TTL)
+            return _respond(request, entry)
+        return wrapper
+    return decorator
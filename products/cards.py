@@ -0,0 +1,75 @@
+"""
+Product cards: the compact product representation used wherever a product
+is embedded in another resource (order lines, wishlists, related products).
+
+product_cards() loads everything a card needs in a single query: the
+columns it reads, the first image and the stored rating summary.
+select_product_cards() instead joins the cards into a query over rows that
+point at a product (cart lines), so rows and cards take one query.
+"""
+from django.db.models import F, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from .models import Product, ProductImage
+
+CARD_FIELDS = ['id', 'slug', 'name', 'price', 'is_sale', 'sale_price', 'stock', 'sizes', 'category_id']
+
+
+def thumbnail_url(name, request=None):
+    """URL of the product image stored as ``name``, absolute when there is a request"""
+    if not name:
+        return None
+    url = ProductImage._meta.get_field('image').storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def product_cards(queryset=None):
+    """Annotate ``queryset`` (default: all products) for ProductCardSerializer"""
+    if queryset is None:
+        queryset = Product.objects.all()
+    first_image = ProductImage.objects.filter(product=OuterRef('pk')).order_by('id').values('image')[:1]
+    return queryset.only(*CARD_FIELDS).annotate(
+        thumbnail_image=Subquery(first_image),
+        card_rating=Coalesce(F('rating_summary__average_rating'), 0.0),
+        card_review_count=Coalesce(F('rating_summary__review_count'), 0),
+    )
+
+
+def prefetch_product_cards(lookup):
+    """Prefetch for ``lookup`` (e.g. 'items__product') loading product cards"""
+    return Prefetch(lookup, queryset=product_cards())
+
+
+def select_product_cards(queryset, lookup='product'):
+    """
+    ``queryset`` with each row's ``lookup`` product joined in and annotated
+    for ProductCardSerializer. Run the evaluated rows through
+    attach_selected_cards() before serializing them.
+    """
+    first_image = ProductImage.objects.filter(product=OuterRef(f'{lookup}_id')).order_by('id').values('image')[:1]
+    return queryset.select_related(lookup).defer(f'{lookup}__description', f'{lookup}__search_vector').annotate(
+        selected_thumbnail=Subquery(first_image),
+        selected_rating=Coalesce(F(f'{lookup}__rating_summary__average_rating'), 0.0),
+        selected_review_count=Coalesce(F(f'{lookup}__rating_summary__review_count'), 0),
+    )
+
+
+def attach_selected_cards(rows, lookup='product'):
+    """Move the card annotations of select_product_cards() rows onto their products"""
+    for row in rows:
+        product = getattr(row, lookup)
+        product.thumbnail_image = row.selected_thumbnail
+        product.card_rating = row.selected_rating
+        product.card_review_count = row.selected_review_count
+    return rows
+
+
+def related_cards(product, limit=4):
+    """Cards of the product's precomputed related products (products.related), best first"""
+    return product_cards(Product.objects.filter(related_from__product=product)).order_by('related_from__rank')[:limit]
+
+
+def category_cards(product, limit=4):
+    """Cards of the newest other products in the category, for before the related index is built"""
+    return product_cards(
+        Product.objects.filter(category_id=product.category_id).exclude(id=product.id)
+    ).order_by('-created_at')[:limit]
@@ -0,0 +1,23 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import Category, Product
+
+
+def adjust_product_count(category_id, delta):
+    """Add ``delta`` to a category's stored product count"""
+    if category_id:
+        Category.objects.filter(pk=category_id).update(product_count=F('product_count') + delta)
+
+
+def rebuild_product_counts(category_ids=None):
+    """
+    Recompute stored product counts from the products table, for the given
+    categories or all of them (e.g. after bulk_create, which sends no signals).
+    """
+    counts = Product.objects.filter(
+        category=OuterRef('pk')
+    ).order_by().values('category').annotate(count=Count('id')).values('count')
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+    return categories.update(product_count=Coalesce(Subquery(counts), Value(0)))
@@ -0,0 +1,80 @@
+"""
+Product of the day.
+
+The pick is stored in the cache under the day's date, so it changes at
+midnight; `manage.py precompute` makes it ahead of time so requests only
+read it.
+"""
+from random import randint
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.utils import timezone
+from .models import Product
+
+PICK_TTL = 2 * 24 * 60 * 60
+
+
+def _pick_key(day):
+    return f'product_of_the_day:{day.isoformat()}'
+
+
+def pick_random_product_id():
+    """
+    Pick a product id at random without counting or OFFSET-scanning the
+    table: draw a number between the smallest and largest id and take the
+    first product at or above it (both lookups use the primary key index).
+    Ids that follow a gap in the sequence are slightly more likely.
+    """
+    bounds = Product.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return None
+    pivot = randint(bounds['low'], bounds['high'])
+    return Product.objects.filter(id__gte=pivot).order_by('id').values_list('id', flat=True).first()
+
+
+def refresh_product_of_the_day(day=None):
+    day = day or timezone.localdate()
+    product_id = pick_random_product_id()
+    if product_id is not None:
+        cache.set(_pick_key(day), product_id, PICK_TTL)
+    return product_id
+
+
+def product_of_the_day_id(day=None):
+    """Today's pick, made on the spot if the precompute worker has not run"""
+    day = day or timezone.localdate()
+    product_id = cache.get(_pick_key(day))
+    if product_id is None:
+        # add() so concurrent first requests of the day agree on one pick
+        product_id = pick_random_product_id()
+        if product_id is not None and not cache.add(_pick_key(day), product_id, PICK_TTL):
+            product_id = cache.get(_pick_key(day), product_id)
+    return product_id
+
+
+async def apick_random_product_id():
+    """pick_random_product_id() through the async ORM"""
+    bounds = await Product.objects.aaggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return None
+    pivot = randint(bounds['low'], bounds['high'])
+    return await Product.objects.filter(id__gte=pivot).order_by('id').values_list('id', flat=True).afirst()
+
+
+async def arefresh_product_of_the_day(day=None):
+    day = day or timezone.localdate()
+    product_id = await apick_random_product_id()
+    if product_id is not None:
+        await cache.aset(_pick_key(day), product_id, PICK_TTL)
+    return product_id
+
+
+async def aproduct_of_the_day_id(day=None):
+    """product_of_the_day_id() through the async cache API and ORM"""
+    day = day or timezone.localdate()
+    product_id = await cache.aget(_pick_key(day))
+    if product_id is None:
+        product_id = await apick_random_product_id()
+        if product_id is not None and not await cache.aadd(_pick_key(day), product_id, PICK_TTL):
+            product_id = await cache.aget(_pick_key(day), product_id)
+    return product_id
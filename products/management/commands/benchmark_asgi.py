@@ -0,0 +1,191 @@
+import asyncio
+import json
+import platform
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import override_settings
+from django.utils import timezone
+from backend.benchmarking import git_commit, summarize
+from backend.seeding import is_seeded, seed_categories
+from products.models import Product
+
+SAMPLE_SIZE = 50  # distinct products per parametrised endpoint
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'dashboard': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def endpoints(slugs):
+    """(name, sync urls, async urls): each request takes the next URL of its endpoint"""
+    def both(*paths):
+        return [f'/public/api/{path}' for path in paths], [f'/public/api/async/{path}' for path in paths]
+
+    return [
+        ('products.list', *both('products/')),
+        ('products.retrieve', *both(*(f'products/{slug}/' for slug in slugs))),
+        ('products.product_of_the_day', *both('products/product_of_the_day/')),
+        ('categories.list', *both('categories/')),
+        ('reviews.product_reviews', *both(*(f'reviews/product_reviews/?product_slug={slug}' for slug in slugs))),
+    ]
+
+
+def wsgi_get(handler, url):
+    """GET ``url`` through the WSGI handler, as a threaded WSGI server would"""
+    parts = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': parts.path, 'QUERY_STRING': parts.query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'benchmark', 'SERVER_PORT': '80', 'HTTP_HOST': 'benchmark', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    body = handler(environ, lambda line, headers: status.append(int(line.split()[0])))
+    try:
+        b''.join(body)
+    finally:
+        body.close()  # sends request_finished, as servers do
+    return status[0]
+
+
+async def asgi_get(application, url):
+    """GET ``url`` through the ASGI application, as an ASGI server would"""
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': parts.path, 'raw_path': parts.path.encode(), 'query_string': parts.query.encode(),
+        'root_path': '', 'headers': [(b'host', b'benchmark')], 'client': ('127.0.0.1', 0), 'server': ('benchmark', 80),
+    }
+    received = False
+    status = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; Django cancels this wait once it has responded
+        await asyncio.get_running_loop().create_future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec of the catalogue reads served by sync views under WSGI (a thread per "
+        "concurrent request) and by the async views under ASGI, at high concurrency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Measured requests per endpoint and mode")
+        parser.add_argument('--warmup', type=int, default=20, help="Unmeasured requests per endpoint and mode")
+        parser.add_argument('--concurrency', type=int, default=64, help="Requests in flight at once")
+        parser.add_argument('--endpoint', action='append', help="Only run this endpoint (repeatable)")
+        parser.add_argument(
+            '--no-cache', action='store_true', help="Use a dummy cache, so every request reaches the database"
+        )
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def run_wsgi(self, urls, count, concurrency):
+        handler = WSGIHandler()
+
+        def timed(i):
+            started = time.perf_counter()
+            status = wsgi_get(handler, urls[i % len(urls)])
+            return (time.perf_counter() - started) * 1000, status
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(timed, range(count)))
+
+    def run_asgi(self, urls, count, concurrency):
+        application = ASGIHandler()
+
+        async def run():
+            slots = asyncio.Semaphore(concurrency)
+
+            async def timed(i):
+                async with slots:
+                    started = time.perf_counter()
+                    status = await asgi_get(application, urls[i % len(urls)])
+                    return (time.perf_counter() - started) * 1000, status
+
+            return await asyncio.gather(*(timed(i) for i in range(count)))
+
+        return asyncio.run(run())
+
+    def measure(self, run, urls, options):
+        run(urls, options['warmup'], options['concurrency'])
+        started = time.perf_counter()
+        samples = run(urls, options['requests'], options['concurrency'])
+        wall = time.perf_counter() - started
+        return {
+            **summarize([elapsed for elapsed, _ in samples]),
+            'throughput_rps': round(len(samples) / wall, 2),
+            'statuses': dict(Counter(str(status) for _, status in samples)),
+        }
+
+    def handle(self, *args, **options):
+        if not is_seeded():
+            raise CommandError("No seeded data; run `manage.py seed_benchmark_data` first")
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1")
+
+        slugs = list(Product.objects.filter(category__in=seed_categories()).order_by('id').values_list('slug', flat=True))
+        slugs = slugs[::max(1, len(slugs) // SAMPLE_SIZE)][:SAMPLE_SIZE]
+        selected = [
+            endpoint for endpoint in endpoints(slugs)
+            if not options['endpoint'] or endpoint[0] in options['endpoint']
+        ]
+        if not selected:
+            raise CommandError("No endpoint matches --endpoint")
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'started_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'cache': not options['no_cache'],
+            },
+            'endpoints': {},
+        }
+        # Connections of this thread must not be shared with the handlers' threads
+        connections.close_all()
+        with override_settings(**({'CACHES': NO_CACHE} if options['no_cache'] else {})):
+            for name, sync_urls, async_urls in selected:
+                wsgi = self.measure(self.run_wsgi, sync_urls, options)
+                asgi = self.measure(self.run_asgi, async_urls, options)
+                report['endpoints'][name] = {
+                    'wsgi': wsgi,
+                    'asgi': asgi,
+                    'asgi_speedup': round(asgi['throughput_rps'] / wsgi['throughput_rps'], 2),
+                }
+                if not options['json']:
+                    self.stdout.write(
+                        f"{name:<28} WSGI {wsgi['throughput_rps']:8.1f} req/s (p99 {wsgi['p99_ms']:8.2f} ms)  "
+                        f"ASGI {asgi['throughput_rps']:8.1f} req/s (p99 {asgi['p99_ms']:8.2f} ms)  "
+                        f"x{report['endpoints'][name]['asgi_speedup']}"
+                    )
+
+        body = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(body + '\n')
+        if options['json']:
+            self.stdout.write(body)
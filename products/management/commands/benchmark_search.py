@@ -0,0 +1,102 @@
+import json
+import random
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from backend.benchmarking import summarize, time_call
+from backend.seeding import ADJECTIVES, COLOURS, GARMENTS
+from products.counters import rebuild_product_counts
+from products.models import Category, Product
+from products.search import refresh_search_vectors, search_enabled, search_products
+
+# Mix of exact terms, multi-word phrases and typos
+QUERIES = [
+    'dress', 'silk saree', 'emerald velvet', 'embroidered kurta', 'navy jacket',
+    'linen', 'vintage blouse', 'dres', 'sareee', 'embroiderd', 'velvett lehenga', 'blush top',
+]
+
+
+class Command(BaseCommand):
+    help = "Compare p50/p99 latency of the ranked full-text search against the legacy icontains filter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000, help="Fixture size to ensure")
+        parser.add_argument('--runs', type=int, default=20, help="Runs per query term and path")
+        parser.add_argument('--page-size', type=int, default=24)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+        parser.add_argument(
+            '--keep-fixture', action='store_true',
+            help="Keep the benchmark category and its products for the next run instead of deleting them"
+        )
+
+    def ensure_fixture(self, size, seed):
+        category, _ = Category.objects.get_or_create(
+            slug='search-benchmark', defaults={'name': 'Search Benchmark', 'description': 'Benchmark fixture'}
+        )
+        existing = Product.objects.filter(category=category).count()
+        if existing >= size:
+            return category
+
+        rng = random.Random(seed + existing)
+        batch = []
+        for i in range(existing, size):
+            name = f"{rng.choice(COLOURS)} {rng.choice(ADJECTIVES)} {rng.choice(GARMENTS)}"
+            batch.append(Product(
+                name=name.title(),
+                slug=f'search-benchmark-{i}',
+                category=category,
+                description=' '.join(rng.choice(ADJECTIVES + GARMENTS + COLOURS) for _ in range(30)),
+                price=Decimal(rng.randint(500, 20000)),
+                stock=10,
+                sizes={'S': 5, 'M': 5},
+            ))
+        Product.objects.bulk_create(batch, batch_size=5000)
+        rebuild_product_counts([category.pk])
+        refresh_search_vectors(Product.objects.filter(category=category), category.name)
+        self.stdout.write(f"Created {len(batch)} benchmark products")
+        return category
+
+    def legacy_page(self, term, page_size):
+        return list(Product.objects.filter(
+            Q(name__icontains=term) |
+            Q(description__icontains=term) |
+            Q(category__name__icontains=term)
+        ).order_by('-created_at', '-id').values_list('id', flat=True)[:page_size])
+
+    def ranked_page(self, term, page_size):
+        return list(search_products(Product.objects.all(), term).order_by(
+            '-relevance', '-id'
+        ).values_list('id', flat=True)[:page_size])
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            self.stdout.write(self.style.WARNING("Ranked search runs on PostgreSQL only; both paths will use icontains"))
+        category = self.ensure_fixture(options['products'], options['seed'])
+        try:
+            self.run(options)
+        finally:
+            if not options['keep_fixture']:
+                # Deleting the category deletes its products
+                category.delete()
+
+    def run(self, options):
+        report = {'products': Product.objects.count(), 'paths': {}}
+        for label, page in (('icontains', self.legacy_page), ('ranked', self.ranked_page)):
+            samples = []
+            for term in QUERIES:
+                page(term, options['page_size'])  # warm up
+                for _ in range(options['runs']):
+                    elapsed, _ = time_call(page, term, options['page_size'])
+                    samples.append(elapsed)
+            report['paths'][label] = summarize(samples)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"Catalogue size: {report['products']}")
+        for label, stats in report['paths'].items():
+            self.stdout.write(
+                f"{label:>10}: p50 {stats['p50_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms  "
+                f"mean {stats['mean_ms']:.2f} ms over {stats['runs']} runs"
+            )
@@ -0,0 +1,94 @@
+import json
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from backend.benchmarking import summarize, time_call
+from products.cards import product_cards
+from products.counters import rebuild_product_counts
+from products.models import Category, Product
+from products.serializers import ProductCardSerializer, ProductSerializer
+from products.views import catalogue_queryset
+
+
+class Command(BaseCommand):
+    help = "Compare serialization time and payload size of full products against product cards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help="Number of products to serialize")
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+        parser.add_argument(
+            '--keep-fixture', action='store_true',
+            help="Keep the benchmark category and its products for the next run instead of deleting them"
+        )
+
+    def ensure_fixture(self, size):
+        category, _ = Category.objects.get_or_create(
+            slug='serializer-benchmark', defaults={'name': 'Serializer Benchmark', 'description': 'Benchmark fixture'}
+        )
+        existing = Product.objects.filter(category=category).count()
+        Product.objects.bulk_create([
+            Product(
+                name=f'Benchmark Product {i}',
+                slug=f'serializer-benchmark-{i}',
+                category=category,
+                description='Benchmark product ' * 20,
+                price=Decimal(1000 + i),
+                stock=10,
+                sizes={'S': 5, 'M': 5},
+            )
+            for i in range(existing, size)
+        ], batch_size=1000)
+        rebuild_product_counts([category.pk])
+        return category
+
+    def serialize(self, serializer_class, queryset, context):
+        data = serializer_class(queryset, many=True, context=context).data
+        return json.dumps(data, cls=DjangoJSONEncoder)
+
+    def measure(self, serializer_class, queryset, context, runs):
+        with CaptureQueriesContext(connection) as queries:
+            body = self.serialize(serializer_class, queryset.all(), context)
+        samples = [
+            time_call(self.serialize, serializer_class, queryset.all(), context)[0]
+            for _ in range(runs)
+        ]
+        return {'queries': len(queries.captured_queries), 'bytes': len(body.encode()), **summarize(samples)}
+
+    def handle(self, *args, **options):
+        category = self.ensure_fixture(options['products'])
+        try:
+            self.run(category, options)
+        finally:
+            if not options['keep_fixture']:
+                # Deleting the category deletes its products
+                category.delete()
+
+    def run(self, category, options):
+        ids = Product.objects.filter(category=category).order_by('id').values_list('id', flat=True)[:options['products']]
+        context = {'request': Request(APIRequestFactory().get('/'))}
+
+        report = {
+            'products': len(ids),
+            'full': self.measure(
+                ProductSerializer, catalogue_queryset().filter(id__in=list(ids)), context, options['runs']
+            ),
+            'card': self.measure(
+                ProductCardSerializer, product_cards().filter(id__in=list(ids)), context, options['runs']
+            ),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"Serialized {report['products']} products")
+        for label in ('full', 'card'):
+            stats = report[label]
+            self.stdout.write(
+                f"{label:>5}: p50 {stats['p50_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms  "
+                f"{stats['bytes']} bytes  {stats['queries']} queries"
+            )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.counters import rebuild_product_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored product count of every category"
+
+    def handle(self, *args, **options):
+        updated = rebuild_product_counts()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt product counts for {updated} categories"))
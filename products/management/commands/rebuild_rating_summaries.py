@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild every product's denormalized rating summary from the reviews table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_rating_summaries(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {count} products"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.related import refresh_related_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the related-products index from categories, prices and co-purchases"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = refresh_related_products(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt related products for {count} products"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.search import rebuild_search_vectors, search_enabled
+
+
+class Command(BaseCommand):
+    help = "Recompute the full-text search vector of every product"
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            self.stdout.write(self.style.WARNING("Full-text search needs PostgreSQL; nothing to do"))
+            return
+        count = rebuild_search_vectors()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search vectors for {count} products"))
@@ -0,0 +1,163 @@
+import json
+import platform
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+from backend.benchmarking import git_commit, percentile, summarize, time_call
+from backend.seeding import ADMIN_EMAIL, is_seeded, seed_categories, seed_users
+from orders.models import Order
+from products.models import Product, Review
+
+SEARCH_TERMS = ['dress', 'silk saree', 'emerald velvet', 'embroidered kurta', 'navy jacket', 'dres']
+SAMPLE_SIZE = 50  # distinct URLs per parametrised endpoint
+
+
+def endpoints(products, categories):
+    """(name, who, urls): each request takes the next URL of its endpoint"""
+    return [
+        ('products.list', 'anonymous', ['/public/api/products/']),
+        ('products.list_by_price', 'anonymous', ['/public/api/products/?ordering=price']),
+        ('products.retrieve', 'anonymous', [f'/public/api/products/{slug}/' for _, slug in products]),
+        ('products.search', 'anonymous', [f'/public/api/products/search/?q={term}' for term in SEARCH_TERMS]),
+        ('products.new_products', 'anonymous', ['/public/api/products/new_products/']),
+        ('products.on_sale', 'anonymous', ['/public/api/products/on_sale/']),
+        ('products.by_category', 'anonymous', [
+            f'/public/api/products/by_category/?category_slug={slug}' for slug in categories
+        ]),
+        ('products.product_of_the_day', 'anonymous', ['/public/api/products/product_of_the_day/']),
+        ('categories.list', 'anonymous', ['/public/api/categories/']),
+        ('also_bought.retrieve', 'anonymous', [f'/public/api/also-bought/{pk}/' for pk, _ in products]),
+        ('orders.user_orders', 'customer', ['/public/api/orders/user_orders/']),
+        ('carts.me', 'customer', ['/public/api/carts/me/', '/public/api/carts/me/?expand=items.product']),
+        ('wishlists.my_wishlist', 'customer', ['/public/api/wishlists/my_wishlist/']),
+        ('dashboard.stats', 'admin', ['/public/api/dashboard/stats/']),
+        ('dashboard.sales_analytics', 'admin', [
+            f'/public/api/dashboard/sales_analytics/?period={days}' for days in (7, 30, 90)
+        ]),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the main API endpoints against the seeded dataset and report latency percentiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per endpoint")
+        parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests per endpoint")
+        parser.add_argument('--concurrency', type=int, default=1, help="Client threads per endpoint")
+        parser.add_argument('--endpoint', action='append', help="Only run this endpoint (repeatable)")
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def customer(self):
+        customers = seed_users().filter(is_staff=False)
+        return (
+            customers.filter(orders__isnull=False, carts__isnull=False, wishlists__isnull=False).order_by('id').first()
+            or customers.order_by('id').first()
+        )
+
+    def client_for(self, user):
+        if user is None:
+            return Client()
+        return Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def requests(self, client, urls, start, count):
+        samples = []
+        for i in range(start, start + count):
+            elapsed, response = time_call(client.get, urls[i % len(urls)])
+            samples.append((elapsed, response.status_code, int(response.get('X-Query-Count', 0)), len(response.content)))
+        return samples
+
+    def worker(self, user, urls, start, count, warmup):
+        try:
+            client = self.client_for(user)
+            self.requests(client, urls, start, warmup)
+            return self.requests(client, urls, start + warmup, count)
+        finally:
+            connections.close_all()
+
+    def measure(self, user, urls, options):
+        threads = max(1, options['concurrency'])
+        share = [options['requests'] // threads + (i < options['requests'] % threads) for i in range(threads)]
+        started = time.perf_counter()
+        if threads == 1:
+            client = self.client_for(user)
+            self.requests(client, urls, 0, options['warmup'])
+            samples = self.requests(client, urls, options['warmup'], options['requests'])
+        else:
+            with ThreadPoolExecutor(threads) as pool:
+                futures = [
+                    pool.submit(self.worker, user, urls, i * len(urls) // threads, count, options['warmup'])
+                    for i, count in enumerate(share)
+                ]
+                samples = [sample for future in futures for sample in future.result()]
+        wall = time.perf_counter() - started
+
+        latencies = [elapsed for elapsed, _, _, _ in samples]
+        return {
+            **summarize(latencies),
+            # Warm-up requests are part of the wall time; count them as served
+            'throughput_rps': round((len(samples) + options['warmup'] * threads) / wall, 2),
+            'statuses': dict(Counter(str(status) for _, status, _, _ in samples)),
+            'queries_p50': percentile([queries for _, _, queries, _ in samples], 50),
+            'queries_max': max(queries for _, _, queries, _ in samples),
+            'bytes_p50': percentile([size for _, _, _, size in samples], 50),
+        }
+
+    def handle(self, *args, **options):
+        if not is_seeded():
+            raise CommandError("No seeded data; run `manage.py seed_benchmark_data` first")
+        if options['requests'] < 1:
+            raise CommandError("--requests must be at least 1")
+
+        # The same spread of products on every run, for comparable results
+        products = list(Product.objects.filter(category__in=seed_categories()).order_by('id').values_list('id', 'slug'))
+        products = products[::max(1, len(products) // SAMPLE_SIZE)][:SAMPLE_SIZE]
+        categories = list(seed_categories().order_by('id').values_list('slug', flat=True))
+        users = {'anonymous': None, 'customer': self.customer(), 'admin': seed_users().get(email=ADMIN_EMAIL)}
+        selected = [
+            endpoint for endpoint in endpoints(products, categories)
+            if not options['endpoint'] or endpoint[0] in options['endpoint']
+        ]
+        if not selected:
+            raise CommandError("No endpoint matches --endpoint")
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'started_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'concurrency': options['concurrency'],
+                'dataset': {
+                    'users': seed_users().count(),
+                    'products': Product.objects.count(),
+                    'reviews': Review.objects.count(),
+                    'orders': Order.objects.count(),
+                },
+            },
+            'endpoints': {},
+        }
+        # X-Query-Count comes from backend.instrumentation
+        with override_settings(QUERY_METRICS_HEADERS=True):
+            for name, who, urls in selected:
+                report['endpoints'][name] = self.measure(users[who], urls, options)
+                if not options['json']:
+                    stats = report['endpoints'][name]
+                    self.stdout.write(
+                        f"{name:<28} p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+                        f"{stats['throughput_rps']:8.1f} req/s  {stats['queries_p50']} queries  {stats['statuses']}"
+                    )
+
+        body = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(body + '\n')
+        if options['json']:
+            self.stdout.write(body)
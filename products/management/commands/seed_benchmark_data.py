@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from backend.seeding import SCALES, flush, is_seeded, seed
+
+
+class Command(BaseCommand):
+    help = "Generate a seeded benchmark dataset (users, catalogue, reviews, orders, carts, wishlists)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small', help="Preset dataset size")
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--categories', type=int)
+        parser.add_argument('--products', type=int)
+        parser.add_argument('--reviews', type=int)
+        parser.add_argument('--orders', type=int)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--flush', action='store_true', help="Delete previously seeded data first")
+        parser.add_argument('--flush-only', action='store_true', help="Delete previously seeded data and stop")
+
+    def handle(self, *args, **options):
+        if options['flush'] or options['flush_only']:
+            deleted = flush()
+            self.stdout.write(f"Deleted {deleted} seeded objects")
+            if options['flush_only']:
+                return
+        elif is_seeded():
+            raise CommandError("Seeded data already exists; pass --flush to replace it")
+
+        overrides = {key: options[key] for key in ('users', 'categories', 'products', 'reviews', 'orders')}
+        try:
+            with transaction.atomic():
+                counts = seed(options['scale'], seed=options['seed'], log=self.stdout.write, **overrides)
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded " + ", ".join(f"{value} {key}" for key, value in counts.items())
+        ))
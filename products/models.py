@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Q
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.text import slugify
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -9,6 +12,8 @@ class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
     slug = models.SlugField(unique=True, blank=True)
+    # Denormalized, kept in sync by products.signals (see products.counters)
+    product_count = models.IntegerField(default=0, editable=False)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -18,6 +23,9 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+# Sizes a product's ``sizes`` stock map may hold
+PRODUCT_SIZES = ('S', 'M', 'L')
+
 class Product(models.Model):
     name = models.CharField(max_length=100)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
@@ -30,6 +38,26 @@ class Product(models.Model):
     slug = models.SlugField(unique=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Weighted name/category/description vector, maintained by products.search
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Copy of rating_summary.average_rating, maintained by products.ratings,
+    # so the rating ordering can seek on an index
+    rating = models.FloatField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset orderings (newest/oldest, price, rating) and the new_products window
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['rating', 'id'], name='product_rating_idx'),
+            # on_sale listing; only sale products are indexed
+            models.Index(fields=['created_at', 'id'], condition=Q(is_sale=True), name='product_on_sale_idx'),
+            # Category listings and related products
+            models.Index(fields=['category', 'created_at'], name='product_category_created_idx'),
+            GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+            # Typo-tolerant fallback; needs the pg_trgm extension (see products.search)
+            GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:  # Only set slug if not already set.
@@ -86,11 +114,13 @@ class ProductImage(models.Model):
     def __str__(self):
         return f"Image of {self.product.name}"
 
+RATING_CHOICES = [(1, '1 Star'), (2, '2 Stars'), (3, '3 Stars'), (4, '4 Stars'), (5, '5 Stars')]
+
 class Review(models.Model):
     product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='reviews', on_delete=models.CASCADE)
-    quality_rating = models.PositiveIntegerField(choices=[(1, '1 Star'), (2, '2 Stars'), (3, '3 Stars'), (4, '4 Stars'), (5, '5 Stars')])
-    value_rating = models.PositiveIntegerField(choices=[(1, '1 Star'), (2, '2 Stars'), (3, '3 Stars'), (4, '4 Stars'), (5, '5 Stars')])
+    quality_rating = models.PositiveIntegerField(choices=RATING_CHOICES)
+    value_rating = models.PositiveIntegerField(choices=RATING_CHOICES)
     size = models.CharField(max_length=3)  # No static choices here.
     comment = models.TextField(blank=True)
     image = models.ImageField(upload_to='review_images/', null=True, blank=True)
@@ -98,6 +128,54 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ['product', 'user']  # Each user can review a product only once.
+        indexes = [
+            # Covers the per-product rating aggregates (index-only scans)
+            models.Index(fields=['product', 'quality_rating', 'value_rating'], name='review_product_ratings_idx'),
+        ]
+
+    def __str__(self):
+        return f"Review of {self.product.name} by {self.user.email}"
+
+class ProductRatingSummary(models.Model):
+    """
+    Denormalized review statistics for a product.
+    Kept in sync by the Review signal handlers in products.signals and
+    rebuilt in bulk by the rebuild_rating_summaries management command.
+    """
+    product = models.OneToOneField(Product, related_name='rating_summary', on_delete=models.CASCADE, primary_key=True)
+    review_count = models.IntegerField(default=0)
+    quality_sum = models.IntegerField(default=0)
+    value_sum = models.IntegerField(default=0)
+    quality_1 = models.IntegerField(default=0)
+    quality_2 = models.IntegerField(default=0)
+    quality_3 = models.IntegerField(default=0)
+    quality_4 = models.IntegerField(default=0)
+    quality_5 = models.IntegerField(default=0)
+    value_1 = models.IntegerField(default=0)
+    value_2 = models.IntegerField(default=0)
+    value_3 = models.IntegerField(default=0)
+    value_4 = models.IntegerField(default=0)
+    value_5 = models.IntegerField(default=0)
+    average_rating = models.FloatField(default=0)  # (avg quality + avg value) / 2, for sorting and filtering
+
+    def __str__(self):
+        return f"Ratings of {self.product_id}"
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed "related products" of a product, best first. Scored by
+    category, price proximity and co-purchases in products.related.
+    """
+    product = models.ForeignKey(Product, related_name='related_entries', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='related_from', on_delete=models.CASCADE)
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', 'rank']),
+        ]
 
     def __str__(self):
-        return f"Review of {self.product.name} by {self.user.email}"
\ No newline at end of file
+        return f"{self.related_id} related to {self.product_id}"
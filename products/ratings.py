@@ -0,0 +1,220 @@
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Cast, Coalesce
+from .models import Product, ProductRatingSummary, Review
+
+RATING_STARS = range(1, 6)
+
+
+def rating_aggregates():
+    """Aggregate expressions for review count, sums, averages and 1-5 star histograms"""
+    # Counting a rating column (never null) instead of the id keeps every
+    # referenced column in review_product_ratings_idx, for index-only scans.
+    aggregates = {
+        'review_count': Count('quality_rating'),
+        'quality_sum': Sum('quality_rating'),
+        'value_sum': Sum('value_rating'),
+        'avg_quality': Avg('quality_rating'),
+        'avg_value': Avg('value_rating'),
+    }
+    for star in RATING_STARS:
+        aggregates[f'quality_{star}'] = Count('quality_rating', filter=Q(quality_rating=star))
+        aggregates[f'value_{star}'] = Count('value_rating', filter=Q(value_rating=star))
+    return aggregates
+
+
+def empty_summary():
+    return {
+        'review_count': 0,
+        'avg_quality': 0,
+        'avg_value': 0,
+        'quality': {star: 0 for star in RATING_STARS},
+        'value': {star: 0 for star in RATING_STARS},
+    }
+
+
+def _summary_from_row(row):
+    return {
+        'review_count': row['review_count'],
+        'avg_quality': row['avg_quality'] or 0,
+        'avg_value': row['avg_value'] or 0,
+        'quality': {star: row[f'quality_{star}'] for star in RATING_STARS},
+        'value': {star: row[f'value_{star}'] for star in RATING_STARS},
+    }
+
+
+def summary_from_model(rating_summary):
+    """Build a rating summary from a stored ProductRatingSummary row"""
+    count = rating_summary.review_count
+    if count <= 0:
+        return empty_summary()
+    return {
+        'review_count': count,
+        'avg_quality': rating_summary.quality_sum / count,
+        'avg_value': rating_summary.value_sum / count,
+        'quality': {star: getattr(rating_summary, f'quality_{star}') for star in RATING_STARS},
+        'value': {star: getattr(rating_summary, f'value_{star}') for star in RATING_STARS},
+    }
+
+
+def summarize_reviews(reviews):
+    """Build a rating summary from already loaded Review instances"""
+    summary = empty_summary()
+    reviews = list(reviews)
+    if not reviews:
+        return summary
+
+    for review in reviews:
+        summary['quality'][review.quality_rating] += 1
+        summary['value'][review.value_rating] += 1
+
+    count = len(reviews)
+    summary['review_count'] = count
+    summary['avg_quality'] = sum(r.quality_rating for r in reviews) / count
+    summary['avg_value'] = sum(r.value_rating for r in reviews) / count
+    return summary
+
+
+def ratings_for_products(product_ids):
+    """
+    Return {product_id: summary} for all given products from the raw
+    reviews using a single grouped query. Products without reviews get an
+    empty summary.
+    """
+    product_ids = list(product_ids)
+    summaries = {product_id: empty_summary() for product_id in product_ids}
+    if not product_ids:
+        return summaries
+
+    rows = Review.objects.filter(
+        product_id__in=product_ids
+    ).values('product_id').annotate(**rating_aggregates()).order_by()
+
+    for row in rows:
+        summaries[row['product_id']] = _summary_from_row(row)
+    return summaries
+
+
+def stored_ratings_for_products(product_ids):
+    """Return {product_id: summary} read from the denormalized summary table"""
+    product_ids = list(product_ids)
+    summaries = {product_id: empty_summary() for product_id in product_ids}
+    if not product_ids:
+        return summaries
+
+    for rating_summary in ProductRatingSummary.objects.filter(product_id__in=product_ids):
+        summaries[rating_summary.product_id] = summary_from_model(rating_summary)
+    return summaries
+
+
+def _has_prefetched_reviews(product):
+    return 'reviews' in getattr(product, '_prefetched_objects_cache', {})
+
+
+def attach_ratings(products):
+    """
+    Attach a rating summary to every product in ``products``.
+
+    A select_related ``rating_summary`` or prefetched reviews are used as
+    is, everything else is resolved with one query on the summary table
+    for the whole batch.
+    """
+    missing = []
+    for product in products:
+        if hasattr(product, '_rating_summary'):
+            continue
+        if 'rating_summary' in product._state.fields_cache:
+            # Loaded through select_related; None when the row is missing
+            rating_summary = product._state.fields_cache['rating_summary']
+            product._rating_summary = summary_from_model(rating_summary) if rating_summary else empty_summary()
+        elif _has_prefetched_reviews(product):
+            product._rating_summary = summarize_reviews(product.reviews.all())
+        else:
+            missing.append(product)
+
+    if missing:
+        summaries = stored_ratings_for_products(product.pk for product in missing)
+        for product in missing:
+            product._rating_summary = summaries[product.pk]
+    return products
+
+
+def get_ratings(product):
+    """Return the rating summary for a single product, computing it if needed"""
+    if not hasattr(product, '_rating_summary'):
+        attach_ratings([product])
+    return product._rating_summary
+
+
+def _average_rating_expression():
+    return Case(
+        When(review_count__lte=0, then=0.0),
+        default=Cast(F('quality_sum') + F('value_sum'), FloatField()) / (2.0 * F('review_count')),
+        output_field=FloatField(),
+    )
+
+
+def apply_review_change(product_id, old=None, new=None, create=True):
+    """
+    Incrementally update a product's stored summary.
+
+    ``old`` and ``new`` are (quality_rating, value_rating) pairs for the
+    review before and after the write; either may be None for creates and
+    deletes. Runs inside the caller's transaction when there is one.
+    """
+    deltas = {}
+
+    def add(field, amount):
+        deltas[field] = deltas.get(field, 0) + amount
+
+    for ratings, sign in ((old, -1), (new, 1)):
+        if ratings is None:
+            continue
+        quality, value = ratings
+        add('review_count', sign)
+        add('quality_sum', sign * quality)
+        add('value_sum', sign * value)
+        add(f'quality_{quality}', sign)
+        add(f'value_{value}', sign)
+
+    deltas = {field: amount for field, amount in deltas.items() if amount}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        if create:
+            ProductRatingSummary.objects.get_or_create(product_id=product_id)
+        summaries = ProductRatingSummary.objects.filter(product_id=product_id)
+        summaries.update(**{field: F(field) + amount for field, amount in deltas.items()})
+        summaries.update(average_rating=_average_rating_expression())
+        Product.objects.filter(pk=product_id).update(
+            rating=Coalesce(Subquery(summaries.values('average_rating')[:1]), 0.0)
+        )
+
+
+def rebuild_rating_summaries(batch_size=1000):
+    """Recompute every product's stored summary from the reviews table"""
+    rows = Review.objects.values('product_id').annotate(**rating_aggregates()).order_by()
+    by_product = {row['product_id']: row for row in rows}
+
+    summaries = []
+    for product_id in Product.objects.values_list('id', flat=True).iterator():
+        row = by_product.get(product_id)
+        rating_summary = ProductRatingSummary(product_id=product_id)
+        if row:
+            rating_summary.review_count = row['review_count']
+            rating_summary.quality_sum = row['quality_sum']
+            rating_summary.value_sum = row['value_sum']
+            for star in RATING_STARS:
+                setattr(rating_summary, f'quality_{star}', row[f'quality_{star}'])
+                setattr(rating_summary, f'value_{star}', row[f'value_{star}'])
+            rating_summary.average_rating = (row['avg_quality'] + row['avg_value']) / 2
+        summaries.append(rating_summary)
+
+    with transaction.atomic():
+        ProductRatingSummary.objects.all().delete()
+        ProductRatingSummary.objects.bulk_create(summaries, batch_size=batch_size)
+        Product.objects.update(rating=Coalesce(Subquery(
+            ProductRatingSummary.objects.filter(product=OuterRef('pk')).values('average_rating')[:1]
+        ), 0.0))
+    return len(summaries)
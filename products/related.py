@@ -0,0 +1,116 @@
+"""
+Related-products index.
+
+Each product's related products are scored from three signals:
+
+* being in the same category,
+* price proximity (1 when equal, falling towards 0 as prices diverge),
+* co-purchases: orders containing both products, relative to the
+  product's most co-purchased partner.
+
+Candidates are the products nearest in price within the category plus
+every co-purchased product, so a rebuild stays O(n log n) per category.
+The best RELATED_LIMIT are stored in RelatedProduct; detail pages read
+them back as product cards in a single query.
+"""
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import Q
+from orders.models import OrderItem
+from .models import Product, RelatedProduct
+
+RELATED_LIMIT = 8
+PRICE_WINDOW = 2 * RELATED_LIMIT
+WEIGHTS = {'category': 1.0, 'price': 0.5, 'co_purchase': 2.0}
+
+
+def _price_proximity(price, other_price):
+    high = max(price, other_price)
+    if high <= 0:
+        return 1.0
+    return 1.0 - float(abs(price - other_price) / high)
+
+
+def co_purchases(product_ids=None):
+    """{product_id: Counter({other_id: orders containing both})}"""
+    items = OrderItem.objects.filter(product__isnull=False)
+    if product_ids is not None:
+        items = items.filter(order_id__in=OrderItem.objects.filter(product_id__in=product_ids).values('order_id'))
+
+    by_order = defaultdict(set)
+    for order_id, product_id in items.values_list('order_id', 'product_id').iterator():
+        by_order[order_id].add(product_id)
+
+    counts = defaultdict(Counter)
+    for products in by_order.values():
+        for product_id in products:
+            if product_ids is not None and product_id not in product_ids:
+                continue
+            counts[product_id].update(other for other in products if other != product_id)
+    return counts
+
+
+def compute_related(product_ids=None):
+    """{product_id: [(score, related_id), ...]} best first, for the given products or all"""
+    targets = set(product_ids) if product_ids is not None else None
+    counts = co_purchases(targets)
+
+    rows = Product.objects.values_list('id', 'category_id', 'price')
+    if targets is not None:
+        partners = {other for partner_counts in counts.values() for other in partner_counts}
+        rows = rows.filter(
+            Q(category_id__in=Product.objects.filter(id__in=targets).values('category_id')) | Q(id__in=partners)
+        )
+    catalogue = {product_id: (category_id, price) for product_id, category_id, price in rows.iterator()}
+
+    by_category = defaultdict(list)
+    for product_id, (category_id, price) in catalogue.items():
+        by_category[category_id].append((price, product_id))
+    position = {}
+    for entries in by_category.values():
+        entries.sort()
+        for index, (_, product_id) in enumerate(entries):
+            position[product_id] = index
+
+    related = {}
+    for product_id in (targets if targets is not None else catalogue):
+        if product_id not in catalogue:
+            continue
+        category_id, price = catalogue[product_id]
+        index = position[product_id]
+        neighbours = by_category[category_id][max(0, index - PRICE_WINDOW):index + PRICE_WINDOW + 1]
+        partner_counts = counts.get(product_id, Counter())
+        candidates = {other for _, other in neighbours}
+        candidates.update(other for other in partner_counts if other in catalogue)
+        candidates.discard(product_id)
+
+        top_count = max(partner_counts.values(), default=0)
+        scored = []
+        for other in candidates:
+            other_category_id, other_price = catalogue[other]
+            score = WEIGHTS['price'] * _price_proximity(price, other_price)
+            if other_category_id == category_id:
+                score += WEIGHTS['category']
+            if top_count:
+                score += WEIGHTS['co_purchase'] * partner_counts[other] / top_count
+            scored.append((score, other))
+        scored.sort(key=lambda entry: (-entry[0], entry[1]))
+        related[product_id] = scored[:RELATED_LIMIT]
+    return related
+
+
+def refresh_related_products(product_ids=None, batch_size=1000):
+    """Recompute and store the index for the given products, or rebuild all of it"""
+    related = compute_related(product_ids)
+    entries = [
+        RelatedProduct(product_id=product_id, related_id=other, score=score, rank=rank)
+        for product_id, scored in related.items()
+        for rank, (score, other) in enumerate(scored)
+    ]
+    with transaction.atomic():
+        stale = RelatedProduct.objects.all()
+        if product_ids is not None:
+            stale = stale.filter(product_id__in=list(related))
+        stale.delete()
+        RelatedProduct.objects.bulk_create(entries, batch_size=batch_size)
+    return len(related)
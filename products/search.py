@@ -0,0 +1,73 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Cast
+from .models import Category, Product
+
+SEARCH_CONFIG = 'english'
+
+
+def search_enabled(using='default'):
+    """Full-text and trigram search need PostgreSQL; other backends use icontains"""
+    return connections[using].vendor == 'postgresql'
+
+
+def product_search_vector(category_name):
+    """Name weighs most, then the category name, then the description"""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(category_name or ''), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(products, category_name):
+    """
+    Recompute the stored vector for ``products``, which must all belong to
+    the category called ``category_name``. Returns the number of rows updated.
+    """
+    if not search_enabled(products.db):
+        return 0
+    return products.update(search_vector=product_search_vector(category_name))
+
+
+def rebuild_search_vectors():
+    """Recompute the vector of every product, one UPDATE per category"""
+    updated = 0
+    for category_id, name in Category.objects.values_list('id', 'name'):
+        updated += refresh_search_vectors(Product.objects.filter(category_id=category_id), name)
+    return updated
+
+
+def search_products(queryset, term):
+    """
+    Filter ``queryset`` down to products matching ``term`` and annotate a
+    ``relevance`` score to order by.
+
+    On PostgreSQL this matches the GIN-indexed search vector (websearch
+    syntax) or, for typos, a trigram match on the name. Other databases fall
+    back to the plain icontains filter with a constant relevance.
+    """
+    if not search_enabled(queryset.db):
+        return queryset.filter(
+            Q(name__icontains=term) |
+            Q(description__icontains=term) |
+            Q(category__name__icontains=term)
+        ).annotate(relevance=Value(0.0, output_field=FloatField()))
+
+    query = SearchQuery(term, search_type='websearch', config=SEARCH_CONFIG)
+    return queryset.filter(
+        Q(search_vector=query) | Q(name__trigram_similar=term)
+    ).annotate(
+        # Both scores are float4; as float8 the value read back matches the
+        # column exactly, which the keyset seek on relevance relies on
+        relevance=Cast(SearchRank(F('search_vector'), query) + TrigramSimilarity('name', term), FloatField())
+    )
+
+
+def create_search_extensions(using='default', **kwargs):
+    """pre_migrate hook: the trigram index and lookups need pg_trgm"""
+    if not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
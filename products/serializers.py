@@ -1,19 +1,18 @@
 from rest_framework import serializers
-from django.db.models import Avg
+from backend.sparse import SparseFieldsMixin
+from django.db.models import Manager
+from django.db.models.query import QuerySet
 from django.core.exceptions import ObjectDoesNotExist
-from .models import Category, Product, ProductImage, Review
-
-class CategorySerializer(serializers.ModelSerializer):
-    product_count = serializers.SerializerMethodField()
+from .cards import category_cards, related_cards, thumbnail_url
+from .models import PRODUCT_SIZES, Category, Product, ProductImage, Review
+from .ratings import RATING_STARS, attach_ratings, get_ratings
 
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'slug', 'description', 'product_count']
 
-    def get_product_count(self, obj):
-        return obj.products.count()
-
-class ProductImageSerializer(serializers.ModelSerializer):
+class ProductImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
 
     class Meta:
@@ -25,7 +24,7 @@ class ProductImageSerializer(serializers.ModelSerializer):
             return self.context['request'].build_absolute_uri(obj.image.url)
         return None
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     product_name = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
@@ -93,7 +92,53 @@ class ReviewSerializer(serializers.ModelSerializer):
         except Exception as e:
             raise serializers.ValidationError(f"Error validating size: {str(e)}")
 
-class ProductBaseSerializer(serializers.ModelSerializer):
+class ProductListSerializer(serializers.ListSerializer):
+    """Resolves rating summaries for the whole page before serializing rows"""
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        if isinstance(data, QuerySet):
+            data = list(data)
+        attach_ratings(data)
+        return super().to_representation(data)
+
+class ProductCardSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Compact product for embedding in other resources. Reads the
+    annotations of products.cards.product_cards() when present and falls
+    back to the related rows otherwise.
+    """
+    current_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    thumbnail = serializers.SerializerMethodField()
+    in_stock = serializers.SerializerMethodField()
+    rating = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'slug', 'name', 'price', 'current_price', 'thumbnail', 'in_stock', 'rating']
+
+    def get_thumbnail(self, obj):
+        if hasattr(obj, 'thumbnail_image'):
+            name = obj.thumbnail_image
+        else:
+            image = next(iter(obj.images.all()), None)
+            name = image.image.name if image else None
+        return thumbnail_url(name, self.context.get('request'))
+
+    def get_in_stock(self, obj):
+        return any(stock > 0 for stock in obj.sizes.values())
+
+    def get_rating(self, obj):
+        if hasattr(obj, 'card_rating'):
+            return {'average': round(obj.card_rating, 1), 'total_reviews': obj.card_review_count}
+        ratings = get_ratings(obj)
+        return {
+            'average': round((ratings['avg_quality'] + ratings['avg_value']) / 2, 1),
+            'total_reviews': ratings['review_count'],
+        }
+
+class ProductBaseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Base serializer for shared product functionality"""
     average_rating = serializers.SerializerMethodField()
     review_count = serializers.SerializerMethodField()
@@ -102,9 +147,20 @@ class ProductBaseSerializer(serializers.ModelSerializer):
     availability_status = serializers.SerializerMethodField()
     ratings_breakdown = serializers.SerializerMethodField()
 
+    class Meta:
+        list_serializer_class = ProductListSerializer
+        # Response keys built in to_representation from other fields
+        derived_fields = {
+            'ratings': ['average_rating', 'ratings_breakdown', 'review_count'],
+            'availability': ['availability_status', 'available_sizes'],
+            'thumbnail': ['images'],
+            'discount_percentage': ['price', 'sale_price'],
+        }
+
     def get_average_rating(self, obj):
-        avg_quality = obj.reviews.aggregate(Avg('quality_rating'))['quality_rating__avg'] or 0
-        avg_value = obj.reviews.aggregate(Avg('value_rating'))['value_rating__avg'] or 0
+        ratings = get_ratings(obj)
+        avg_quality = ratings['avg_quality']
+        avg_value = ratings['avg_value']
         return {
             'overall': round((avg_quality + avg_value) / 2, 1),
             'quality': round(avg_quality, 1),
@@ -112,16 +168,15 @@ class ProductBaseSerializer(serializers.ModelSerializer):
         }
 
     def get_ratings_breakdown(self, obj):
-        total_reviews = obj.reviews.count()
+        ratings = get_ratings(obj)
+        total_reviews = ratings['review_count']
         if not total_reviews:
             return None
 
         # Calculate rating distribution (1-5 stars)
         distribution = {}
-        for i in range(1, 6):
-            quality_count = obj.reviews.filter(quality_rating=i).count()
-            value_count = obj.reviews.filter(value_rating=i).count()
-            avg_count = (quality_count + value_count) / 2
+        for i in RATING_STARS:
+            avg_count = (ratings['quality'][i] + ratings['value'][i]) / 2
             distribution[str(i)] = {
                 'count': avg_count,
                 'percentage': round((avg_count / total_reviews) * 100, 1)
@@ -133,7 +188,7 @@ class ProductBaseSerializer(serializers.ModelSerializer):
         }
 
     def get_review_count(self, obj):
-        return obj.reviews.count()
+        return get_ratings(obj)['review_count']
 
     def get_available_sizes(self, obj):
         return [
@@ -163,7 +218,7 @@ class ProductBaseSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         
         # Add discount percentage if sale_price exists
-        if representation.get('sale_price'):
+        if representation.get('sale_price') and 'price' in representation:
             original_price = float(representation['price'])
             sale_price = float(representation['sale_price'])
             discount_percentage = round((1 - sale_price / original_price) * 100)
@@ -174,28 +229,23 @@ class ProductBaseSerializer(serializers.ModelSerializer):
             representation['thumbnail'] = representation['images'][0]['image_url']
 
         # Add availability details
-        status = representation['availability_status']
-        representation['availability'] = {
-            'status': status,
-            'message': self.get_availability_message(status),
-            'available_sizes': representation['available_sizes']
-        }
+        if 'availability_status' in representation:
+            status = representation['availability_status']
+            representation['availability'] = {
+                'status': status,
+                'message': self.get_availability_message(status),
+                'available_sizes': representation.get('available_sizes')
+            }
 
-        # Restructure ratings information
-        ratings = representation['average_rating']
-        ratings_breakdown = representation['ratings_breakdown']
-        representation['ratings'] = {
-            'average': ratings,
-            'breakdown': ratings_breakdown,
-            'total_reviews': representation['review_count']
-        }
-        
-        # Remove redundant fields
-        del representation['average_rating']
-        del representation['ratings_breakdown']
-        del representation['review_count']
+        # Restructure ratings information, removing the redundant fields
+        if 'average_rating' in representation:
+            representation['ratings'] = {
+                'average': representation.pop('average_rating'),
+                'breakdown': representation.pop('ratings_breakdown', None),
+                'total_reviews': representation.pop('review_count', None)
+            }
 
-        return representation
+        return self.sparse_representation(representation)
 
     def get_availability_message(self, status):
         messages = {
@@ -214,7 +264,7 @@ class ProductSerializer(ProductBaseSerializer):
         queryset=Category.objects.all(), source='category', write_only=True
     )
 
-    class Meta:
+    class Meta(ProductBaseSerializer.Meta):
         model = Product
         fields = [
             'id', 'name', 'slug', 'description', 'price',
@@ -268,11 +318,10 @@ class ProductSerializer(ProductBaseSerializer):
                 "sizes": "Sizes must be provided as a dictionary"
             })
         
-        valid_sizes = {'S', 'M', 'L'}  # Add more sizes if needed
         for size, quantity in sizes.items():
-            if size not in valid_sizes:
+            if size not in PRODUCT_SIZES:
                 raise serializers.ValidationError({
-                    "sizes": f"Invalid size: {size}. Valid sizes are: {', '.join(valid_sizes)}"
+                    "sizes": f"Invalid size: {size}. Valid sizes are: {', '.join(PRODUCT_SIZES)}"
                 })
             if not isinstance(quantity, int) or quantity < 0:
                 raise serializers.ValidationError({
@@ -287,7 +336,7 @@ class ProductDetailSerializer(ProductBaseSerializer):
     reviews = ReviewSerializer(many=True, read_only=True)
     related_products = serializers.SerializerMethodField()
 
-    class Meta:
+    class Meta(ProductBaseSerializer.Meta):
         model = Product
         fields = [
             'id', 'name', 'slug', 'description', 'price',
@@ -299,11 +348,10 @@ class ProductDetailSerializer(ProductBaseSerializer):
         ]
 
     def get_related_products(self, obj):
-        related = Product.objects.filter(
-            category=obj.category
-        ).exclude(
-            id=obj.id
-        ).order_by(
-            '-created_at'
-        )[:4]
-        return ProductSerializer(related, many=True, context=self.context).data
\ No newline at end of file
+        # Loaded ahead of serialization by the async views
+        related = getattr(obj, 'related_cards', None)
+        if related is None:
+            related = list(related_cards(obj)) or list(category_cards(obj))
+            # The cached detail depends on these (see cache.product_dependencies)
+            obj.related_cards = related
+        return ProductCardSerializer(related, many=True, context=self.context).data
\ No newline at end of file
@@ -0,0 +1,147 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .cache import invalidate_category, invalidate_product
+from .counters import adjust_product_count
+from .models import Category, Product, ProductImage, ProductRatingSummary, Review
+from .ratings import apply_review_change
+from .related import refresh_related_products
+from .search import refresh_search_vectors
+
+
+@receiver(post_save, sender=Product)
+def create_rating_summary(sender, instance, created, raw=False, **kwargs):
+    """Every product gets an (empty) summary row so reads can select_related it"""
+    if created and not raw:
+        ProductRatingSummary.objects.get_or_create(product=instance)
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_vectors(Product.objects.filter(pk=instance.pk), instance.category.name)
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_vectors(sender, instance, created, raw=False, **kwargs):
+    """The category name is part of every product's vector"""
+    if not raw and not created:
+        refresh_search_vectors(Product.objects.filter(category=instance), instance.name)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    """Keep the stored ratings of an edited review so the summary delta can be applied"""
+    instance._previous_rating = None
+    if raw or instance.pk is None:
+        return
+    previous = Review.objects.filter(pk=instance.pk).values(
+        'product_id', 'quality_rating', 'value_rating'
+    ).first()
+    if previous:
+        instance._previous_rating = previous
+
+
+@receiver(post_save, sender=Review)
+def update_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = (instance.quality_rating, instance.value_rating)
+    previous = getattr(instance, '_previous_rating', None)
+
+    if not previous:
+        apply_review_change(instance.product_id, new=new)
+    elif previous['product_id'] != instance.product_id:
+        apply_review_change(
+            previous['product_id'],
+            old=(previous['quality_rating'], previous['value_rating']),
+            create=False
+        )
+        apply_review_change(instance.product_id, new=new)
+    else:
+        apply_review_change(
+            instance.product_id,
+            old=(previous['quality_rating'], previous['value_rating']),
+            new=new
+        )
+
+
+@receiver(post_delete, sender=Review)
+def update_summary_on_delete(sender, instance, **kwargs):
+    # Never recreate the row here: the product itself may be mid-deletion.
+    apply_review_change(
+        instance.product_id,
+        old=(instance.quality_rating, instance.value_rating),
+        create=False
+    )
+
+
+# Category product counts
+
+@receiver(post_save, sender=Product)
+def count_product_in_category(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_product_count(instance.category_id, 1)
+        return
+    previous = getattr(instance, '_previous_category_id', None)
+    if previous and previous != instance.category_id:
+        adjust_product_count(previous, -1)
+        adjust_product_count(instance.category_id, 1)
+
+
+@receiver(post_delete, sender=Product)
+def uncount_product_in_category(sender, instance, **kwargs):
+    adjust_product_count(instance.category_id, -1)
+
+
+# Related-products index
+
+@receiver(post_save, sender=Product)
+def refresh_product_related(sender, instance, created, raw=False, **kwargs):
+    """
+    Index new and recategorized products right away; other changes (prices,
+    co-purchases, neighbours gaining new products) wait for the next rebuild.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_previous_category_id', None)
+    if created or (previous and previous != instance.category_id):
+        transaction.on_commit(lambda: refresh_related_products([instance.pk]))
+
+
+# Response cache invalidation
+
+def _category_of(product_id):
+    return Product.objects.filter(pk=product_id).values_list('category_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_category(sender, instance, raw=False, **kwargs):
+    """Also used to move the product between category counts"""
+    instance._previous_category_id = None
+    if not raw and instance.pk is not None:
+        instance._previous_category_id = _category_of(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_cached_product(sender, instance, **kwargs):
+    invalidate_product(
+        instance.pk, instance.category_id, getattr(instance, '_previous_category_id', None)
+    )
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_cached_product_children(sender, instance, **kwargs):
+    invalidate_product(instance.product_id, _category_of(instance.product_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_cached_category(sender, instance, **kwargs):
+    invalidate_category(instance.pk)
@@ -1,3 +1,715 @@
-from django.test import TestCase
+import json
+from asgiref.sync import async_to_sync
+from io import StringIO
+from unittest import mock, skipUnless
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from datetime import timedelta
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APITestCase, APITransactionTestCase
+from backend.db_router import PIN_COOKIE, primary_pin_scope, replica_reads
+from backend.explain import QueryPlanTestMixin, vacuum_analyze
+from backend.instrumentation import QueryBudgetExceeded, QueryBudgetTestMixin, registry
+from .cards import product_cards
+from .featured import pick_random_product_id
+from orders.models import Order, OrderItem
+from .models import Category, Product, ProductRatingSummary, RelatedProduct, Review
+from .ratings import attach_ratings, rating_aggregates, ratings_for_products, summary_from_model
+from .related import refresh_related_products
+from .serializers import ProductCardSerializer, ProductSerializer
+from .views import ProductViewSet
 
-# Create your tests here.
+User = get_user_model()
+
+
+class CatalogueFixtureMixin(QueryBudgetTestMixin):
+    """Small catalogue with reviews shared by the product API tests"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def create_catalogue(self, product_count, reviews_per_product=3):
+        self.category = Category.objects.create(name='Dresses', description='All dresses')
+        users = [
+            User.objects.create_user(
+                email=f'reviewer{i}@example.com', first_name='Review', last_name=str(i),
+                phone_number=f'98000000{i:02d}', password='secret'
+            )
+            for i in range(reviews_per_product)
+        ]
+        products = []
+        for i in range(product_count):
+            product = Product.objects.create(
+                name=f'Dress {i}', category=self.category, description='Cotton dress',
+                price=1000 + i, stock=10, sizes={'S': 5, 'M': 5}
+            )
+            for j, user in enumerate(users):
+                Review.objects.create(
+                    product=product, user=user, size='S',
+                    quality_rating=(i + j) % 5 + 1, value_rating=(i + 2 * j) % 5 + 1
+                )
+            products.append(product)
+        return products
+
+
+class RatingSummaryTests(CatalogueFixtureMixin, APITestCase):
+    def test_grouped_summary_matches_reviews(self):
+        products = self.create_catalogue(3)
+        summaries = ratings_for_products(p.pk for p in products)
+
+        for product in products:
+            reviews = list(product.reviews.all())
+            summary = summaries[product.pk]
+            self.assertEqual(summary['review_count'], len(reviews))
+            self.assertAlmostEqual(
+                summary['avg_quality'], sum(r.quality_rating for r in reviews) / len(reviews)
+            )
+            for star in range(1, 6):
+                self.assertEqual(
+                    summary['value'][star], sum(1 for r in reviews if r.value_rating == star)
+                )
+
+    def test_stored_summary_tracks_review_writes(self):
+        product = self.create_catalogue(1)[0]
+        review = product.reviews.first()
+
+        review.quality_rating = 5 if review.quality_rating != 5 else 1
+        review.save()
+        Review.objects.filter(pk=product.reviews.last().pk).delete()
+
+        stored = summary_from_model(ProductRatingSummary.objects.get(product=product))
+        self.assertEqual(stored, ratings_for_products([product.pk])[product.pk])
+        self.assertEqual(stored['review_count'], 2)
+
+    def test_rebuild_command_matches_incremental_summary(self):
+        products = self.create_catalogue(3)
+        incremental = {
+            s.product_id: (summary_from_model(s), s.average_rating)
+            for s in ProductRatingSummary.objects.all()
+        }
+        ProductRatingSummary.objects.all().delete()
+
+        call_command('rebuild_rating_summaries', stdout=StringIO())
+
+        self.assertEqual(ProductRatingSummary.objects.count(), len(products))
+        for rating_summary in ProductRatingSummary.objects.all():
+            stored, average = incremental[rating_summary.product_id]
+            self.assertEqual(summary_from_model(rating_summary), stored)
+            self.assertAlmostEqual(rating_summary.average_rating, average)
+
+    def test_prefetched_reviews_need_no_extra_query(self):
+        self.create_catalogue(2)
+        products = list(Product.objects.prefetch_related('reviews'))
+        with self.assertNumQueries(0):
+            attach_ratings(products)
+        self.assertEqual(products[0]._rating_summary['review_count'], 3)
+
+
+class ProductListQueryCountTests(CatalogueFixtureMixin, APITestCase):
+    def test_rating_queries_do_not_scale_with_page_size(self):
+        self.create_catalogue(3)
+        url = reverse('product-list')
+
+        # products with their category and rating summary, plus the images prefetch
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['results'][0]['ratings']['total_reviews'], 3)
+        self.assertEqual(response.data['results'][0]['category']['product_count'], 3)
+
+    def test_category_list_is_one_query(self):
+        self.create_catalogue(2, reviews_per_product=0)
+        Category.objects.create(name='Shawls', description='Shawls')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category-list'))
+        self.assertEqual({c['name']: c['product_count'] for c in response.data}, {'Dresses': 2, 'Shawls': 0})
+
+
+class CategoryProductCountTests(CatalogueFixtureMixin, APITestCase):
+    def test_count_follows_create_move_and_delete(self):
+        products = self.create_catalogue(3, reviews_per_product=0)
+        other = Category.objects.create(name='Shawls', description='Shawls')
+
+        products[0].category = other
+        products[0].save()
+        products[1].delete()
+
+        self.category.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.category.product_count, other.product_count), (1, 1))
+
+    def test_rebuild_matches_products(self):
+        self.create_catalogue(2, reviews_per_product=0)
+        Category.objects.update(product_count=0)
+
+        call_command('rebuild_product_counts', stdout=StringIO())
+
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.product_count, 2)
+
+
+class SparseFieldsTests(CatalogueFixtureMixin, APITestCase):
+    def test_fields_prune_response_and_queries(self):
+        self.create_catalogue(3)
+        url = reverse('product-list')
+
+        with mock.patch.object(ProductSerializer, 'get_availability_status') as availability:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, {'fields': 'id,name,ratings'})
+
+        availability.assert_not_called()
+        item = response.data['results'][0]
+        self.assertEqual(set(item), {'id', 'name', 'ratings'})
+        self.assertEqual(item['ratings']['total_reviews'], 3)
+
+    def test_nested_fields(self):
+        self.create_catalogue(1, reviews_per_product=1)
+        response = self.client.get(reverse('product-list'), {'fields': 'name,category.name,thumbnail'})
+        self.assertEqual(response.data['results'][0], {'name': 'Dress 0', 'category': {'name': 'Dresses'}})
+
+
+class ProductPaginationTests(CatalogueFixtureMixin, APITestCase):
+    def collect_pages(self, url, params):
+        names, next_url = [], None
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            names.extend(item['name'] for item in response.data['results'])
+            next_url = response.data['next']
+            if not next_url:
+                return names
+            response = self.client.get(next_url)
+
+    def test_cursor_pages_cover_catalogue_once(self):
+        self.create_catalogue(5, reviews_per_product=1)
+        names = self.collect_pages(reverse('product-list'), {'page_size': 2})
+        self.assertEqual(names, [f'Dress {i}' for i in reversed(range(5))])
+
+    def test_price_ordering(self):
+        self.create_catalogue(4, reviews_per_product=1)
+        names = self.collect_pages(reverse('product-list'), {'page_size': 3, 'ordering': '-price'})
+        self.assertEqual(names, ['Dress 3', 'Dress 2', 'Dress 1', 'Dress 0'])
+
+    def test_tied_ratings_are_paged_by_compound_keyset(self):
+        self.create_catalogue(5, reviews_per_product=0)
+        url = reverse('product-list')
+        with CaptureQueriesContext(connection) as queries:
+            names = self.collect_pages(url, {'page_size': 2, 'ordering': 'rating'})
+        self.assertEqual(names, [f'Dress {i}' for i in reversed(range(5))])
+        self.assertFalse([q for q in queries.captured_queries if 'OFFSET' in q['sql']])
+
+        last_page = self.client.get(url, {'page_size': 2, 'ordering': 'rating'})
+        last_page = self.client.get(self.client.get(last_page.data['next']).data['next'])
+        previous = self.client.get(last_page.data['previous'])
+        self.assertEqual([item['name'] for item in previous.data['results']], ['Dress 2', 'Dress 1'])
+        self.assertIsNotNone(previous.data['previous'])
+
+    def test_rating_ordering_follows_new_reviews(self):
+        products = self.create_catalogue(3, reviews_per_product=0)
+        user = User.objects.create_user(
+            email='late@example.com', first_name='Late', last_name='Reviewer',
+            phone_number='9800000099', password='secret'
+        )
+        Review.objects.create(product=products[0], user=user, size='S', quality_rating=5, value_rating=4)
+        products[0].refresh_from_db()
+        self.assertEqual(products[0].rating, 4.5)
+        names = self.collect_pages(reverse('product-list'), {'page_size': 2, 'ordering': 'rating'})
+        self.assertEqual(names, ['Dress 0', 'Dress 2', 'Dress 1'])
+
+    def test_cursor_of_another_ordering_is_rejected(self):
+        self.create_catalogue(3, reviews_per_product=0)
+        next_url = self.client.get(reverse('product-list'), {'page_size': 2}).data['next']
+        self.assertEqual(self.client.get(f'{next_url}&ordering=-price').status_code, 404)
+
+    def test_category_products_are_paginated(self):
+        self.create_catalogue(3, reviews_per_product=1)
+        url = reverse('category-products', args=[self.category.pk])
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+
+class CatalogueResponseCacheTests(CatalogueFixtureMixin, APITestCase):
+    def test_anonymous_list_is_served_from_cache_until_a_write(self):
+        product = self.create_catalogue(2, reviews_per_product=1)[0]
+        url = reverse('product-list')
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Renamed Dress'
+            product.save()
+
+        fresh = self.client.get(url)
+        self.assertIn('Renamed Dress', [item['name'] for item in fresh.data['results']])
+        self.assertNotEqual(fresh['ETag'], cached['ETag'])
+
+    def test_detail_revalidates_with_etag(self):
+        product = self.create_catalogue(1, reviews_per_product=1)[0]
+        url = reverse('product-detail', args=[product.slug])
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.filter(product=product).delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ratings']['total_reviews'], 0)
+
+    def test_sparse_detail_is_cached_and_invalidated(self):
+        product = self.create_catalogue(1, reviews_per_product=1)[0]
+        url = reverse('product-detail', args=[product.slug])
+        for fields in ('id,name', 'name,category.name'):
+            self.assertEqual(self.client.get(url, {'fields': fields}).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'fields': 'id,name'})
+        self.assertEqual(response.data, {'id': product.pk, 'name': 'Dress 0'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Gowns'
+            self.category.save()
+        response = self.client.get(url, {'fields': 'name,category.name'})
+        self.assertEqual(response.data['category'], {'name': 'Gowns'})
+
+    def test_detail_is_invalidated_by_related_product_writes(self):
+        dress = self.create_catalogue(1, reviews_per_product=0)[0]
+        shawl = Product.objects.create(
+            name='Shawl', category=Category.objects.create(name='Shawls', description='Shawls'),
+            description='Wool', price=300
+        )
+        RelatedProduct.objects.create(product=dress, related=shawl, score=1, rank=0)
+        url = reverse('product-detail', args=[dress.slug])
+        self.assertEqual(self.client.get(url).data['related_products'][0]['name'], 'Shawl')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            shawl.name = 'Wool Shawl'
+            shawl.save()
+        self.assertEqual(self.client.get(url).data['related_products'][0]['name'], 'Wool Shawl')
+
+
+class ProductCardTests(CatalogueFixtureMixin, APITestCase):
+    def test_cards_load_in_one_query(self):
+        products = self.create_catalogue(3)
+        with self.assertNumQueries(1):
+            data = ProductCardSerializer(product_cards(), many=True).data
+
+        card = next(item for item in data if item['id'] == products[0].pk)
+        self.assertEqual(set(card), {'id', 'slug', 'name', 'price', 'current_price', 'thumbnail', 'in_stock', 'rating'})
+        self.assertTrue(card['in_stock'])
+        self.assertEqual(card['rating']['total_reviews'], 3)
+        fallback = ProductCardSerializer(Product.objects.get(pk=products[0].pk)).data
+        self.assertEqual(card['rating'], fallback['rating'])
+
+    def test_related_products_are_cards(self):
+        products = self.create_catalogue(3, reviews_per_product=1)
+        response = self.client.get(reverse('product-detail', args=[products[0].slug]))
+
+        related = response.data['related_products']
+        self.assertEqual(len(related), 2)
+        self.assertNotIn('category', related[0])
+        self.assertIn('thumbnail', related[0])
+
+
+class RelatedProductTests(CatalogueFixtureMixin, APITestCase):
+    def test_index_scores_co_purchases_then_category_and_price(self):
+        dresses = self.create_catalogue(3, reviews_per_product=0)
+        shawl = Product.objects.create(
+            name='Shawl', category=Category.objects.create(name='Shawls', description='Shawls'),
+            description='Wool', price=300
+        )
+        buyer = User.objects.create_user(
+            email='buyer@example.com', first_name='Buy', last_name='Er', phone_number='9800000099', password='secret'
+        )
+        order = Order.objects.create(user=buyer, total_amount=1300)
+        OrderItem.objects.create(order=order, product=dresses[0], quantity=1)
+        OrderItem.objects.create(order=order, product=shawl, quantity=1)
+
+        refresh_related_products()
+
+        related = list(RelatedProduct.objects.filter(product=dresses[0]).order_by('rank').values_list('related_id', flat=True))
+        self.assertEqual(related, [shawl.pk, dresses[1].pk, dresses[2].pk])
+
+        response = self.client.get(reverse('product-detail', args=[dresses[0].slug]))
+        self.assertEqual([item['id'] for item in response.data['related_products']], related)
+
+    def test_new_products_are_indexed_on_write(self):
+        self.create_catalogue(2, reviews_per_product=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='New Dress', category=self.category, description='d', price=1000)
+
+        self.assertEqual(RelatedProduct.objects.filter(product=product).count(), 2)
+
+
+class ProductOfTheDayTests(CatalogueFixtureMixin, APITestCase):
+    def test_pick_is_stable_and_survives_deletion(self):
+        self.create_catalogue(4, reviews_per_product=1)
+        url = reverse('product-product-of-the-day')
+
+        first = self.client.get(url).data['id']
+        self.assertEqual(self.client.get(url).data['id'], first)
+
+        Product.objects.filter(pk=first).delete()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['id'], first)
+
+    def test_random_pick_does_not_offset_scan(self):
+        products = self.create_catalogue(5, reviews_per_product=0)
+        with self.assertNumQueries(2) as queries:
+            product_id = pick_random_product_id()
+        self.assertIn(product_id, [p.pk for p in products])
+        self.assertFalse(any('OFFSET' in q['sql'] for q in queries.captured_queries))
+
+    def test_empty_catalogue(self):
+        response = self.client.get(reverse('product-product-of-the-day'))
+        self.assertEqual(response.status_code, 404)
+
+
+class InstrumentationTests(CatalogueFixtureMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.addCleanup(registry.clear)
+
+    @override_settings(QUERY_METRICS_HEADERS=True)
+    def test_debug_headers_report_queries_and_timings(self):
+        self.create_catalogue(3)
+        response = self.client.get(reverse('product-list'))
+
+        self.assertEqual(response['X-Query-Count'], '2')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+, serializer;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_registry_counts_per_view_and_action(self):
+        self.create_catalogue(3)
+        self.client.get(reverse('product-list'))
+        response = self.client.get(reverse('product-list'))
+
+        counters = registry.snapshot()['ProductViewSet.list']
+        self.assertEqual(counters['requests'], 2)
+        self.assertEqual(counters['queries'], 2)  # the second response comes from the catalogue cache
+        self.assertEqual(counters['response_bytes'], 2 * len(response.content))
+        self.assertGreater(counters['serializer_seconds'], 0)
+
+    def test_budget_overrun_fails_when_strict(self):
+        self.create_catalogue(2)
+        with mock.patch.object(ProductViewSet, 'query_budgets', {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('product-list'))
+            cache.clear()
+            with override_settings(QUERY_BUDGETS_STRICT=False), self.assertLogs('backend.instrumentation', 'WARNING'):
+                self.assertEqual(self.client.get(reverse('product-list')).status_code, 200)
+        self.assertEqual(registry.snapshot()['ProductViewSet.list']['budget_exceeded'], 2)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_endpoint_needs_the_token(self):
+        self.create_catalogue(1)
+        self.client.get(reverse('product-list'))
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('api_db_queries_total{endpoint="ProductViewSet.list"} 2', response.content.decode())
+
+
+class AsyncCatalogueTests(CatalogueFixtureMixin, APITestCase):
+    def aget(self, name, *args, headers=None, **params):
+        return async_to_sync(self.async_client.get)(reverse(name, args=args), params, headers=headers)
+
+    def pages(self, response, get):
+        data = response.json()
+        results = data['results']
+        while data['next']:
+            data = get(data['next']).json()
+            results += data['results']
+        return results
+
+    def test_list_pages_match_the_sync_view(self):
+        self.create_catalogue(5, reviews_per_product=1)
+        params = {'page_size': 2, 'ordering': '-price', 'fields': 'id,name,price,ratings,images'}
+
+        with self.assertNumQueries(2):  # the page, then its images
+            response = self.aget('async-product-list', **params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/public/api/async/products/?cursor=', response.json()['next'])
+        self.assertEqual(
+            self.pages(response, lambda url: async_to_sync(self.async_client.get)(url)),
+            self.pages(self.client.get(reverse('product-list'), params), self.client.get),
+        )
+
+    def test_detail_matches_the_sync_view_and_is_cached(self):
+        products = self.create_catalogue(3)
+        url_args = [products[0].slug]
+        expected = self.client.get(reverse('product-detail', args=url_args)).json()
+
+        response = self.aget('async-product-detail', *url_args)
+        self.assertEqual(response.json(), expected)
+        etag = {'If-None-Match': response['ETag']}
+        with self.assertNumQueries(0):
+            self.assertEqual(self.aget('async-product-detail', *url_args, headers=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.filter(product=products[0]).delete()
+        response = self.aget('async-product-detail', *url_args, headers=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ratings']['total_reviews'], 0)
+        self.assertEqual(self.aget('async-product-detail', 'missing').status_code, 404)
+
+        response = self.aget('async-product-detail', *url_args, fields='id,name')
+        self.assertEqual(response.json(), {'id': products[0].pk, 'name': 'Dress 0'})
+        with self.captureOnCommitCallbacks(execute=True):
+            products[0].name = 'Renamed Dress'
+            products[0].save()
+        self.assertEqual(self.aget('async-product-detail', *url_args, fields='name').json(), {'name': 'Renamed Dress'})
+
+    def test_malformed_filter_is_a_bad_request(self):
+        response = self.aget('async-product-list', min_rating='abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('min_rating', response.json())
+
+    def test_categories_reviews_and_product_of_the_day(self):
+        product = self.create_catalogue(2)[0]
+        self.assertEqual(self.aget('async-category-list').json(), self.client.get(reverse('category-list')).json())
+
+        params = {'product_slug': product.slug, 'page_size': 2}
+        self.assertEqual(
+            self.aget('async-product-reviews', **params).json()['results'],
+            self.client.get(reverse('reviews-product-reviews'), params).json()['results'],
+        )
+        self.assertEqual(self.aget('async-product-reviews').status_code, 400)
+
+        pick = self.aget('async-product-of-the-day').json()
+        self.assertEqual(pick, self.client.get(reverse('product-product-of-the-day')).json())
+
+    @override_settings(QUERY_METRICS_HEADERS=True)
+    def test_queries_are_counted_under_asgi(self):
+        self.create_catalogue(2)
+        response = self.aget('async-product-list')
+        self.assertEqual(response['X-Query-Count'], '2')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(CatalogueFixtureMixin, APITransactionTestCase):
+    # A second alias on the test database stands in for the replica; the
+    # rows are committed, so its own connection sees them. '__all__' takes
+    # in the alias, which only exists once setUpClass adds it
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        connections.settings['replica'] = {**connections['default'].settings_dict}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        super().setUp()
+        with primary_pin_scope():
+            self.products = self.create_catalogue(2)
+            self.user = User.objects.create_user(
+                email='router@example.com', first_name='Rou', last_name='Ter',
+                phone_number='9811111111', password='secret'
+            )
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_catalogue_reads_go_to_the_replica_and_orders_to_the_primary(self):
+        primary, replica = self.get(reverse('product-list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        self.client.force_authenticate(self.user)
+        primary, replica = self.get(reverse('order-list'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_writing_client_reads_from_the_primary_for_a_while(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.post(reverse('reviews-list'), {
+                'product': self.products[0].pk, 'quality_rating': 5, 'value_rating': 4, 'size': 'S',
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(replica), 0)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.DATABASE_PRIMARY_PIN_SECONDS)
+
+        url = reverse('reviews-product-reviews')
+        primary, replica = self.get(url, product_slug=self.products[0].slug)
+        self.assertEqual(replica, 0)
+        del self.client.cookies[PIN_COOKIE]
+        primary, replica = self.get(url, product_slug=self.products[0].slug)
+        self.assertEqual(primary, 0)
+
+    def test_reads_after_a_write_or_in_a_transaction_use_the_primary(self):
+        with primary_pin_scope():
+            self.assertEqual(Product.objects.all().db, 'replica')
+            self.assertEqual(Order.objects.all().db, 'default')
+            with replica_reads():
+                self.assertEqual(Order.objects.all().db, 'replica')
+            with transaction.atomic():
+                self.assertEqual(Product.objects.all().db, 'default')
+            Category.objects.create(name='Skirts', description='Skirts')
+            self.assertEqual(Product.objects.all().db, 'default')
+
+
+class BenchmarkSuiteTests(TestCase):
+    def seed(self, *extra):
+        call_command(
+            'seed_benchmark_data', '--users=20', '--categories=3', '--products=40', '--reviews=200', '--orders=60',
+            *extra, stdout=StringIO()
+        )
+
+    def test_seed_is_reproducible_and_consistent(self):
+        self.seed()
+        first = list(Review.objects.order_by('id').values_list('quality_rating', 'value_rating'))
+        self.assertEqual((Product.objects.count(), len(first), Order.objects.count()), (40, 200, 60))
+        self.assertEqual(ProductRatingSummary.objects.filter(review_count=5).count(), 40)
+        self.assertEqual(sum(Category.objects.values_list('product_count', flat=True)), 40)
+        self.assertFalse(OrderItem.objects.filter(unit_price__isnull=True).exists())
+
+        self.seed('--flush')
+        self.assertEqual(list(Review.objects.order_by('id').values_list('quality_rating', 'value_rating')), first)
+
+    def test_runner_reports_json(self):
+        self.seed()
+        out = StringIO()
+        call_command(
+            'run_benchmarks', '--requests=3', '--warmup=1', '--endpoint=products.list', '--endpoint=carts.me',
+            '--json', stdout=out
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['meta']['dataset']['products'], 40)
+        self.assertEqual(set(report['endpoints']), {'products.list', 'carts.me'})
+        for stats in report['endpoints'].values():
+            self.assertEqual(stats['statuses'], {'200': 3})
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+
+    def test_micro_benchmarks_delete_their_fixtures(self):
+        out = StringIO()
+        call_command('benchmark_serializers', '--products=5', '--runs=1', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['products'], 5)
+        call_command('benchmark_search', '--products=5', '--runs=1', stdout=StringIO())
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+        call_command('benchmark_serializers', '--products=5', '--runs=1', '--keep-fixture', stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 5)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Ranked search needs PostgreSQL")
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Sarees', description='Draped garments')
+        self.exact = Product.objects.create(
+            name='Silk Saree', category=category, description='Handwoven silk', price=5000
+        )
+        self.described = Product.objects.create(
+            name='Wedding Drape', category=category, description='A silk blend for weddings', price=3000
+        )
+        Product.objects.create(name='Denim Jacket', category=Category.objects.create(
+            name='Jackets', description='Outerwear'
+        ), description='Blue denim', price=2500)
+
+    def search(self, **params):
+        response = self.client.get(reverse('product-search'), params)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['results']]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search(q='silk'), ['Silk Saree', 'Wedding Drape'])
+
+    def test_category_name_is_searchable(self):
+        self.assertEqual(set(self.search(q='sarees')), {'Silk Saree', 'Wedding Drape'})
+
+    def test_price_filters_combine_with_search(self):
+        self.assertEqual(self.search(q='silk', max_price=4000), ['Wedding Drape'])
+
+    def test_malformed_numeric_filters_are_rejected(self):
+        for url, params in [
+            (reverse('product-list'), {'min_rating': 'abc'}),
+            (reverse('product-list'), {'category_id': '1x'}),
+            (reverse('product-search'), {'q': 'silk', 'min_price': 'nan'}),
+            (reverse('product-search'), {'q': 'silk', 'max_price': 'cheap'}),
+        ]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(list(params)[-1], response.data)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are checked on PostgreSQL")
+class ProductQueryPlanTests(QueryPlanTestMixin, TransactionTestCase):
+    # Committed and vacuumed data, so plans do not depend on what earlier
+    # tests left behind and index-only scans are costed realistically
+    def setUp(self):
+        categories = Category.objects.bulk_create([
+            Category(name=f'Category {i}', slug=f'category-{i}', description='Seeded') for i in range(10)
+        ])
+        self.products = Product.objects.bulk_create([
+            Product(
+                name=f'Seeded {i}', slug=f'seeded-{i}', category=categories[i % 10], description='Seeded',
+                price=500 + i % 700, is_sale=i % 5 == 0, sale_price=400 if i % 5 == 0 else None
+            )
+            for i in range(2000)
+        ])
+        users = User.objects.bulk_create([
+            User(email=f'planner{i}@example.com', first_name='Plan', last_name=str(i), phone_number=f'97700000{i:02d}')
+            for i in range(5)
+        ])
+        Review.objects.bulk_create([
+            Review(product=product, user=user, size='S', quality_rating=(j + i) % 5 + 1, value_rating=i + 1)
+            for j, product in enumerate(self.products) for i, user in enumerate(users)
+        ])
+        vacuum_analyze(Category, Product, Review, User)
+        self.category = categories[0]
+
+    def test_catalogue_orderings(self):
+        products = Product.objects.all()
+        self.assertUsesIndex(products.order_by('-created_at', '-id')[:24], 'product_created_idx')
+        self.assertUsesIndex(products.order_by('price', 'id')[:24], 'product_price_idx')
+        self.assertNoSeqScan(products.filter(created_at__gte=timezone.now() - timedelta(days=21)))
+
+    def test_on_sale_uses_partial_index(self):
+        queryset = Product.objects.filter(is_sale=True).order_by('-created_at', '-id')[:24]
+        self.assertUsesIndex(queryset, 'product_on_sale_idx')
+
+    def test_category_and_related_products(self):
+        queryset = Product.objects.filter(category=self.category).exclude(id=self.products[0].pk).order_by('-created_at')[:4]
+        self.assertUsesIndex(queryset, 'product_category_created_idx')
+
+    def test_rating_aggregates_are_covered(self):
+        queryset = Review.objects.filter(
+            product_id__in=[product.pk for product in self.products[:3]]
+        ).values('product_id').annotate(**rating_aggregates()).order_by()
+        self.assertUsesIndex(queryset, 'review_product_ratings_idx')
+
+    def test_harness_reports_seq_scans(self):
+        with self.assertRaises(AssertionError):
+            self.assertNoSeqScan(Product.objects.filter(description='Seeded'))
@@ -1,13 +1,19 @@
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Prefetch, Q
-from random import randint
-from django.core.cache import cache
+import math
+from django.db.models import Prefetch
+from backend.instrumentation import InstrumentedViewMixin
+from backend.sparse import field_requested
+from backend.pagination import KeysetPagination, ProductPagination, SearchPagination
+from .cache import CATALOGUE, CATEGORIES, cache_stats, cached_response, product_dependencies
+from .featured import product_of_the_day_id, refresh_product_of_the_day
 from .models import Category, Product, ProductImage, Review
+from .search import search_products
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
@@ -16,6 +22,67 @@ from .serializers import (
     ProductDetailSerializer
 )
 
+def catalogue_queryset(request=None):
+    """
+    Products with everything the list serializers read, ready for keyset
+    pagination. Relations left out of the request's ``fields=`` are not loaded.
+    """
+    queryset = Product.objects.select_related('rating_summary')
+    if field_requested(request, 'category'):
+        queryset = queryset.select_related('category')
+    if field_requested(request, 'images') or field_requested(request, 'thumbnail'):
+        queryset = queryset.prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.all())
+        )
+    return queryset
+
+def product_detail_queryset(request=None):
+    """catalogue_queryset() plus what only the detail representation reads"""
+    queryset = catalogue_queryset(request)
+    # Only the detail representation renders individual reviews; ratings
+    # come from the denormalized rating_summary row.
+    if field_requested(request, 'reviews'):
+        queryset = queryset.prefetch_related(
+            Prefetch('reviews', queryset=Review.objects.select_related('user'))
+        )
+    return queryset
+
+def number_param(params, name, cast=float):
+    """The ``name`` query parameter as a finite number, None if absent; a bad value is a 400"""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        number = cast(value)
+    except ValueError:
+        raise ValidationError({name: 'A valid number is required.'})
+    if not math.isfinite(number):
+        raise ValidationError({name: 'A valid number is required.'})
+    return number
+
+
+def filter_catalogue(queryset, params):
+    """Apply the q, category_slug/category_id and min_rating filters of the product endpoints"""
+    # Search query parameter
+    search_query = params.get('q')
+    if search_query:
+        queryset = search_products(queryset, search_query)
+
+    # Filter by category
+    category_slug = params.get('category_slug')
+    category_id = number_param(params, 'category_id', int)
+
+    if category_slug:
+        queryset = queryset.filter(category__slug=category_slug)
+    elif category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+
+    # Filter by the stored rating summary (ordering=rating sorts by it)
+    min_rating = number_param(params, 'min_rating')
+    if min_rating is not None:
+        queryset = queryset.filter(rating__gte=min_rating)
+    return queryset
+
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -23,80 +90,35 @@ class CategoryViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description']
 
+    @cached_response('category-list', [CATEGORIES])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     @action(detail=True, methods=['GET'])
     def products(self, request, pk=None):
         """
         Get all products for a specific category
         """
         category = self.get_object()
-        products = Product.objects.filter(category=category).select_related(
-            'category'
-        ).prefetch_related(
-            Prefetch('images', queryset=ProductImage.objects.all()),
-            Prefetch('reviews', queryset=Review.objects.select_related('user'))
-        )
-        
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
-
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
-    serializer_class = ProductSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    lookup_field = 'slug'
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'description', 'category__name']
-
-    def get_queryset(self):
-        queryset = Product.objects.select_related('category').prefetch_related(
-            Prefetch('images', queryset=ProductImage.objects.all()),
-            Prefetch('reviews', queryset=Review.objects.select_related('user'))
-        )
-
-        # Search query parameter
-        search_query = self.request.query_params.get('q')
-        if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(category__name__icontains=search_query) 
-            )
-
-        # Filter by category
-        category_slug = self.request.query_params.get('category_slug')
-        category_id = self.request.query_params.get('category_id')
-        
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
-        elif category_id:
-            queryset = queryset.filter(category_id=category_id)
-
-        # Apply other filters
-        if self.action == 'new_products':
-            new_threshold = timezone.now() - timedelta(days=21)
-            queryset = queryset.filter(created_at__gte=new_threshold)
-        elif self.action == 'on_sale':
-            queryset = queryset.filter(is_sale=True)
-            
-        return queryset
-
-    def get_serializer_class(self):
-        if self.action == 'retrieve':
-            return ProductDetailSerializer
-        return super().get_serializer_class()
+        products = catalogue_queryset(request).filter(category=category)
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = get_object_or_404(Product, slug=kwargs['slug'])
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        paginator = ProductPagination()
+        page = paginator.paginate_queryset(products, request, view=self)
+        serializer = ProductSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    query_budgets = {
+        'list': 3, 'retrieve': 6, 'search': 3, 'on_sale': 3, 'new_products': 3,
+        'by_category': 3, 'product_of_the_day': 8,
+    }
     lookup_field = 'slug'
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description', 'category__name']
+    pagination_class = ProductPagination
 
     def get_serializer_context(self):
         """
@@ -107,28 +129,12 @@ class ProductViewSet(viewsets.ModelViewSet):
         return context
 
     def get_queryset(self):
-        queryset = Product.objects.select_related('category').prefetch_related(
-            Prefetch('images', queryset=ProductImage.objects.all()),
-            Prefetch('reviews', queryset=Review.objects.select_related('user'))
-        )
-
-        # Search query parameter
-        search_query = self.request.query_params.get('q')
-        if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(category__name__icontains=search_query)
-            )
+        if self.action in ['retrieve', 'product_of_the_day']:
+            queryset = product_detail_queryset(self.request)
+        else:
+            queryset = catalogue_queryset(self.request)
 
-        # Filter by category
-        category_slug = self.request.query_params.get('category_slug')
-        category_id = self.request.query_params.get('category_id')
-        
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
-        elif category_id:
-            queryset = queryset.filter(category_id=category_id)
+        queryset = filter_catalogue(queryset, self.request.query_params)
 
         # Apply other filters
         if self.action == 'new_products':
@@ -144,39 +150,44 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductDetailSerializer
         return super().get_serializer_class()
 
+    @cached_response('product-list', [CATALOGUE])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response('product-detail', product_dependencies)
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        response = Response(self.get_serializer(instance).data)
+        response.instance = instance
+        return response
+
+    @action(detail=False, methods=['GET'], permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """
+        Hit/miss counters of the public catalogue response cache
+        """
+        return Response(cache_stats())
+
     @action(detail=False, methods=['GET'])
     def product_of_the_day(self, request):
         """
         Returns a randomly selected product of the day.
         The product remains the same throughout the day and changes at midnight.
         """
-        cache_key = 'product_of_the_day'
-        cached_product = cache.get(cache_key)
-
-        if cached_product is None:
-            # Get total number of products
-            product_count = Product.objects.count()
-            if product_count == 0:
-                return Response(
-                    {"error": "No products available"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-
-            # Get a random product
-            random_index = randint(0, product_count - 1)
-            product = Product.objects.select_related('category').prefetch_related(
-                Prefetch('images', queryset=ProductImage.objects.all()),
-                Prefetch('reviews', queryset=Review.objects.select_related('user'))
-            )[random_index]
-
-            # Cache the product ID for 24 hours (86400 seconds)
-            cache.set(cache_key, product.id, 86400)
-        else:
-            # Retrieve the cached product
-            product = Product.objects.select_related('category').prefetch_related(
-                Prefetch('images', queryset=ProductImage.objects.all()),
-                Prefetch('reviews', queryset=Review.objects.select_related('user'))
-            ).get(id=cached_product)
+        product = None
+        product_id = product_of_the_day_id()
+        if product_id is not None:
+            product = self.get_queryset().filter(id=product_id).first()
+            if product is None:
+                # Today's pick was deleted since; choose again
+                product_id = refresh_product_of_the_day()
+                product = self.get_queryset().filter(id=product_id).first()
+
+        if product is None:
+            return Response(
+                {"error": "No products available"},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
         serializer = self.get_serializer(product, context={'request': request})
         return Response(serializer.data)
@@ -187,17 +198,20 @@ class ProductViewSet(viewsets.ModelViewSet):
         Return products created within the last 21 days
         """
         products = self.get_queryset()
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(products)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['GET'])
+    @cached_response('product-on-sale', [CATALOGUE])
     def on_sale(self, request):
         """
         Return products that are currently on sale
         """
         products = self.get_queryset()
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(products)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['GET'])
     def by_category(self, request):
@@ -212,13 +226,15 @@ class ProductViewSet(viewsets.ModelViewSet):
             )
             
         products = self.get_queryset()
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(products)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-    @action(detail=False, methods=['GET'])
+    @action(detail=False, methods=['GET'], pagination_class=SearchPagination)
     def search(self, request):
         """
-        Search products with extended search capabilities
+        Search products with extended search capabilities.
+        Results are ranked by relevance unless another ordering is requested.
         """
         query = request.query_params.get('q')
         if not query:
@@ -230,16 +246,17 @@ class ProductViewSet(viewsets.ModelViewSet):
         products = self.get_queryset()
         
         # Additional filters can be applied together with search
-        min_price = request.query_params.get('min_price')
-        max_price = request.query_params.get('max_price')
-        
-        if min_price:
-            products = products.filter(price__gte=float(min_price))
-        if max_price:
-            products = products.filter(price__lte=float(max_price))
+        min_price = number_param(request.query_params, 'min_price')
+        max_price = number_param(request.query_params, 'max_price')
+
+        if min_price is not None:
+            products = products.filter(price__gte=min_price)
+        if max_price is not None:
+            products = products.filter(price__lte=max_price)
             
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(products)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class ProductImageViewSet(viewsets.ModelViewSet):
     queryset = ProductImage.objects.all()
@@ -252,6 +269,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter]
     search_fields = ['comment', 'user__username']
+    pagination_class = KeysetPagination
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -269,6 +287,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
         product = get_object_or_404(Product, slug=product_slug)
         
         # Filter reviews by the retrieved product
-        reviews = self.queryset.filter(product=product)
-        serializer = self.get_serializer(reviews, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        reviews = self.queryset.filter(product=product).select_related('user', 'product')
+        page = self.paginate_queryset(reviews)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
\ No newline at end of file
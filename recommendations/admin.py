@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import ProductNeighbour, RecommenderState
+
+
+class ProductNeighbourAdmin(admin.ModelAdmin):
+    list_display = ('product', 'rank', 'neighbour', 'score')
+    search_fields = ('product__name',)
+    raw_id_fields = ('product', 'neighbour')
+
+
+admin.site.register(ProductNeighbour, ProductNeighbourAdmin)
+admin.site.register(RecommenderState)
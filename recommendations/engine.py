@@ -0,0 +1,76 @@
+"""
+Item-item similarity on sparse basket x product matrices.
+
+A basket is an order or a wishlist. Each basket row holds one weight per
+product it contains, and two products are similar when the same baskets
+contain them: cosine similarity of their columns, computed as X^T X with
+SciPy sparse products, in column chunks to bound memory.
+"""
+import numpy as np
+from scipy import sparse
+
+CHUNK_SIZE = 2048
+
+
+def interaction_matrix(basket_ids, product_ids, weights):
+    """
+    Build the CSC basket x product matrix from parallel arrays, counting
+    each (basket, product) pair once. Returns (matrix, product ids by column).
+    """
+    basket_ids = np.asarray(basket_ids, dtype=np.int64)
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float32)
+    baskets, rows = np.unique(basket_ids, return_inverse=True)
+    products, columns = np.unique(product_ids, return_inverse=True)
+
+    # Repeated lines of a product in the same basket are one interaction
+    _, first = np.unique(rows.astype(np.int64) * len(products) + columns, return_index=True)
+    matrix = sparse.csc_matrix(
+        (weights[first], (rows[first], columns[first])),
+        shape=(len(baskets), len(products)),
+    )
+    return matrix, products
+
+
+def column_norms(matrix):
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0), dtype=np.float64).ravel())
+
+
+def similarities(matrix, columns, norms=None):
+    """
+    Cosine similarity of the given ``columns`` against every column, as a
+    CSR matrix (len(columns) x products) without self-similarity. ``norms``
+    overrides the column norms, e.g. when ``matrix`` only holds some baskets.
+    """
+    norms = column_norms(matrix) if norms is None else np.asarray(norms, dtype=np.float64)
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    columns = np.asarray(columns)
+
+    scores = (matrix[:, columns].T @ matrix).tocsr()
+    scores = (sparse.diags(inverse[columns]) @ scores @ sparse.diags(inverse)).tocoo()
+    keep = (scores.col != columns[scores.row]) & (scores.data > 0)
+    return sparse.csr_matrix(
+        (scores.data[keep], (scores.row[keep], scores.col[keep])), shape=scores.shape
+    )
+
+
+def top_k(scores, k):
+    """Yield (row, neighbour columns, scores) best first for each row of a CSR matrix"""
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        data = scores.data[start:end]
+        indices = scores.indices[start:end]
+        if len(data) > k:
+            keep = np.argpartition(-data, k - 1)[:k]
+            data, indices = data[keep], indices[keep]
+        order = np.lexsort((indices, -data))
+        yield row, indices[order], data[order]
+
+
+def nearest_neighbours(matrix, k, chunk_size=CHUNK_SIZE):
+    """Yield (column, neighbour columns, scores) for every column of ``matrix``"""
+    norms = column_norms(matrix)
+    for start in range(0, matrix.shape[1], chunk_size):
+        columns = np.arange(start, min(start + chunk_size, matrix.shape[1]))
+        for row, neighbours, scores in top_k(similarities(matrix, columns, norms), k):
+            yield columns[row], neighbours, scores
@@ -0,0 +1,59 @@
+import json
+import time
+import tracemalloc
+import numpy as np
+from django.core.management.base import BaseCommand
+from recommendations.engine import interaction_matrix, nearest_neighbours
+from recommendations.refresh import TOP_K
+
+
+class Command(BaseCommand):
+    help = (
+        "Time and measure the memory of the neighbour build on a synthetic "
+        "dataset (in memory, the database is not touched)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1_000_000, help="Order lines")
+        parser.add_argument('--products', type=int, default=20_000)
+        parser.add_argument('--lines-per-order', type=float, default=4.0, help="Mean basket size")
+        parser.add_argument('--k', type=int, default=TOP_K)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def synthetic_lines(self, options):
+        """Orders of Poisson-distributed size over Zipf-popular products"""
+        rng = np.random.default_rng(options['seed'])
+        sizes = rng.poisson(options['lines_per_order'] - 1, size=options['lines']) + 1
+        sizes = sizes[np.cumsum(sizes) <= options['lines']]
+        baskets = np.repeat(np.arange(len(sizes), dtype=np.int64), sizes)
+        products = (rng.zipf(1.3, size=len(baskets)) - 1) % options['products']
+        return baskets, products, np.ones(len(baskets), dtype=np.float32)
+
+    def handle(self, *args, **options):
+        baskets, products, weights = self.synthetic_lines(options)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        matrix, product_ids = interaction_matrix(baskets, products, weights)
+        matrix_seconds = time.perf_counter() - started
+        neighbours = sum(len(found) for _, found, _ in nearest_neighbours(matrix, options['k']))
+        total_seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        report = {
+            'order_lines': int(len(baskets)),
+            'orders': int(matrix.shape[0]),
+            'products': int(len(product_ids)),
+            'matrix_nnz': int(matrix.nnz),
+            'neighbours': int(neighbours),
+            'matrix_seconds': round(matrix_seconds, 3),
+            'build_seconds': round(total_seconds, 3),
+            'peak_memory_mb': round(peak / 2 ** 20, 1),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for key, value in report.items():
+            self.stdout.write(f"{key:>15}: {value}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from recommendations.refresh import TOP_K, rebuild_neighbours, refresh_neighbours
+
+
+class Command(BaseCommand):
+    help = "Fold new order lines and wishlist items into the also-bought neighbours (--full to rebuild)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Recompute every product's neighbours")
+        parser.add_argument('--k', type=int, default=TOP_K, help="Neighbours kept per product")
+
+    def handle(self, *args, **options):
+        if options['full']:
+            count = rebuild_neighbours(options['k'])
+        else:
+            count = refresh_neighbours(options['k'])
+        self.stdout.write(self.style.SUCCESS(f"Updated neighbours of {count} products"))
@@ -0,0 +1,30 @@
+from django.db import models
+from products.models import Product
+
+
+class ProductNeighbour(models.Model):
+    """Top-K "customers also bought" neighbours of a product, best first"""
+    product = models.ForeignKey(Product, related_name='neighbours', on_delete=models.CASCADE)
+    neighbour = models.ForeignKey(Product, related_name='neighbour_of', on_delete=models.CASCADE)
+    score = models.FloatField()  # cosine similarity of the two products' baskets
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ['product', 'neighbour']
+        indexes = [
+            models.Index(fields=['product', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.neighbour_id} for {self.product_id}"
+
+
+class RecommenderState(models.Model):
+    """Order line and wishlist item high-water marks of the last refresh"""
+    key = models.CharField(max_length=50, unique=True)
+    last_order_item_id = models.BigIntegerField(default=0)
+    last_wishlist_item_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,169 @@
+"""
+Build and refresh the ProductNeighbour table from orders and wishlists.
+
+rebuild_neighbours() recomputes every product's top-K neighbours.
+refresh_neighbours() only processes order lines and wishlist items added
+since the last run: the products they touch get their rows recomputed
+exactly, and the products sharing a basket with them get the new scores
+merged into their stored top-K. Scores that dropped out of a stored top-K
+(or items removed from wishlists) are settled by the next full rebuild.
+"""
+from collections import defaultdict
+from itertools import chain
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max
+from orders.models import OrderItem
+from wishlists.models import WishlistItem
+from .engine import interaction_matrix, nearest_neighbours, similarities, top_k
+from .models import ProductNeighbour, RecommenderState
+
+TOP_K = 12
+ORDER_WEIGHT = 1.0
+WISHLIST_WEIGHT = 0.5  # intent counts for less than a purchase
+STATE_KEY = 'also-bought'
+
+
+def _pairs(queryset, basket_field):
+    """(basket ids, product ids) arrays streamed from ``queryset``"""
+    flat = np.fromiter(
+        chain.from_iterable(
+            # order lines of deleted products keep their row with no product
+            queryset.filter(product__isnull=False).values_list(basket_field, 'product_id').iterator(chunk_size=10000)
+        ),
+        dtype=np.int64,
+    )
+    return flat[0::2], flat[1::2]
+
+
+def load_interactions(order_lines=None, wishlist_items=None):
+    """
+    Parallel (basket, product, weight) arrays for the given order lines and
+    wishlist items (default: all). Orders and wishlists get disjoint basket
+    ids (even and odd).
+    """
+    order_baskets, order_products = _pairs(
+        OrderItem.objects.all() if order_lines is None else order_lines, 'order_id'
+    )
+    wishlist_baskets, wishlist_products = _pairs(
+        WishlistItem.objects.all() if wishlist_items is None else wishlist_items, 'wishlist_id'
+    )
+    return (
+        np.concatenate([order_baskets * 2, wishlist_baskets * 2 + 1]),
+        np.concatenate([order_products, wishlist_products]),
+        np.concatenate([
+            np.full(len(order_products), ORDER_WEIGHT, dtype=np.float32),
+            np.full(len(wishlist_products), WISHLIST_WEIGHT, dtype=np.float32),
+        ]),
+    )
+
+
+def _high_water_marks():
+    return (
+        OrderItem.objects.aggregate(last=Max('id'))['last'] or 0,
+        WishlistItem.objects.aggregate(last=Max('id'))['last'] or 0,
+    )
+
+
+def _entries(product_id, neighbours):
+    return [
+        ProductNeighbour(product_id=product_id, neighbour_id=neighbour_id, score=score, rank=rank)
+        for rank, (neighbour_id, score) in enumerate(neighbours)
+    ]
+
+
+def _replace(rows, marks, replace_all=False):
+    """Store {product_id: [(neighbour_id, score), ...]} and the new high-water marks"""
+    with transaction.atomic():
+        stale = ProductNeighbour.objects.all()
+        if not replace_all:
+            stale = stale.filter(product_id__in=list(rows))
+        stale.delete()
+        ProductNeighbour.objects.bulk_create(
+            chain.from_iterable(_entries(product_id, neighbours) for product_id, neighbours in rows.items()),
+            batch_size=1000,
+        )
+        RecommenderState.objects.update_or_create(
+            key=STATE_KEY,
+            defaults={'last_order_item_id': marks[0], 'last_wishlist_item_id': marks[1]},
+        )
+
+
+def rebuild_neighbours(k=TOP_K):
+    """Recompute the top-``k`` neighbours of every product; returns the product count"""
+    marks = _high_water_marks()
+    matrix, product_ids = interaction_matrix(*load_interactions())
+    rows = {
+        int(product_ids[column]): [
+            (int(product_ids[neighbour]), float(score)) for neighbour, score in zip(neighbours, scores)
+        ]
+        for column, neighbours, scores in nearest_neighbours(matrix, k)
+    }
+    _replace(rows, marks, replace_all=True)
+    return len(rows)
+
+
+def _global_norms(product_ids):
+    """Column norms over all baskets, for matrices built from a subset of them"""
+    squares = defaultdict(float)
+    for queryset, basket_field, weight in (
+        (OrderItem.objects, 'order', ORDER_WEIGHT),
+        (WishlistItem.objects, 'wishlist', WISHLIST_WEIGHT),
+    ):
+        counts = queryset.filter(product_id__in=product_ids).values('product_id').annotate(
+            baskets=Count(basket_field, distinct=True)
+        ).order_by()
+        for row in counts:
+            squares[row['product_id']] += row['baskets'] * weight ** 2
+    return np.sqrt([squares[product_id] for product_id in product_ids])
+
+
+def refresh_neighbours(k=TOP_K):
+    """Fold order lines and wishlist items added since the last run into the table"""
+    state = RecommenderState.objects.filter(key=STATE_KEY).first()
+    if state is None:
+        return rebuild_neighbours(k)
+
+    marks = _high_water_marks()
+    new_lines = OrderItem.objects.filter(id__gt=state.last_order_item_id, id__lte=marks[0], product__isnull=False)
+    new_wishes = WishlistItem.objects.filter(id__gt=state.last_wishlist_item_id, id__lte=marks[1])
+    touched = set(new_lines.values_list('product_id', flat=True)) | set(new_wishes.values_list('product_id', flat=True))
+    if not touched:
+        _replace({}, marks)
+        return 0
+
+    # Every basket holding a touched product, so their co-occurrences are complete
+    matrix, product_ids = interaction_matrix(*load_interactions(
+        OrderItem.objects.filter(order_id__in=OrderItem.objects.filter(product_id__in=touched).values('order_id')),
+        WishlistItem.objects.filter(
+            wishlist_id__in=WishlistItem.objects.filter(product_id__in=touched).values('wishlist_id')
+        ),
+    ))
+    columns = np.flatnonzero(np.isin(product_ids, list(touched)))
+    scores = similarities(matrix, columns, _global_norms(product_ids.tolist()))
+
+    rows = {}
+    for row, neighbours, row_scores in top_k(scores, k):
+        rows[int(product_ids[columns[row]])] = [
+            (int(product_ids[neighbour]), float(score)) for neighbour, score in zip(neighbours, row_scores)
+        ]
+
+    # Similarity is symmetric: merge the touched products' new scores into
+    # the stored neighbours of every product they share a basket with.
+    updates = defaultdict(dict)
+    coo = scores.tocoo()
+    for row, column, score in zip(coo.row, coo.col, coo.data):
+        other = int(product_ids[column])
+        if other not in touched:
+            updates[other][int(product_ids[columns[row]])] = float(score)
+    stored = defaultdict(dict)
+    for product_id, neighbour_id, score in ProductNeighbour.objects.filter(
+        product_id__in=list(updates)
+    ).values_list('product_id', 'neighbour_id', 'score'):
+        stored[product_id][neighbour_id] = score
+    for product_id, new_scores in updates.items():
+        merged = {**stored[product_id], **new_scores}
+        rows[product_id] = sorted(merged.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    _replace(rows, marks)
+    return len(rows)
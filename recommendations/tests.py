@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from wishlists.models import Wishlist, WishlistItem
+from .models import ProductNeighbour
+from .refresh import rebuild_neighbours, refresh_neighbours
+
+User = get_user_model()
+
+
+class NeighbourTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='buyer@example.com', first_name='Buy', last_name='Er',
+            phone_number='9840000000', password='secret'
+        )
+        category = Category.objects.create(name='Tops', description='Tops')
+        self.products = [
+            Product.objects.create(name=f'Top {i}', category=category, description='Top', price=1000 + i)
+            for i in range(5)
+        ]
+
+    def order(self, *indexes):
+        order = Order.objects.create(user=self.user, total_amount=0)
+        for index in indexes:
+            OrderItem.objects.create(order=order, product=self.products[index], quantity=1)
+
+    def neighbours(self):
+        return {
+            (row.product_id, row.neighbour_id): (row.rank, round(row.score, 6))
+            for row in ProductNeighbour.objects.all()
+        }
+
+    def test_co_purchased_products_rank_first(self):
+        self.order(0, 1)
+        self.order(0, 1, 2)
+        self.order(0, 3)
+        rebuild_neighbours()
+
+        ranked = list(ProductNeighbour.objects.filter(
+            product=self.products[0]
+        ).order_by('rank').values_list('neighbour_id', flat=True))
+        self.assertEqual(ranked, [self.products[1].pk, self.products[2].pk, self.products[3].pk])
+
+    def test_incremental_refresh_matches_rebuild(self):
+        self.order(0, 1)
+        self.order(2, 3)
+        rebuild_neighbours()
+
+        self.order(1, 2)
+        self.order(1, 4)
+        wishlist = Wishlist.objects.create(user=self.user)
+        WishlistItem.objects.create(wishlist=wishlist, product=self.products[0])
+        WishlistItem.objects.create(wishlist=wishlist, product=self.products[4])
+        refresh_neighbours()
+        incremental = self.neighbours()
+
+        rebuild_neighbours()
+        self.assertEqual(incremental, self.neighbours())
+
+    def test_also_bought_endpoint_is_one_query(self):
+        self.order(0, 1, 2)
+        rebuild_neighbours()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('also-bought-detail', args=[self.products[0].pk]), {'limit': 1})
+
+        self.assertEqual(len(response.data), 1)
+        self.assertIn(response.data[0]['id'], [self.products[1].pk, self.products[2].pk])
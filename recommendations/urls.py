@@ -0,0 +1,10 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import AlsoBoughtViewSet
+
+router = DefaultRouter()
+router.register(r'also-bought', AlsoBoughtViewSet, basename='also-bought')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
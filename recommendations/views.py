@@ -0,0 +1,25 @@
+from rest_framework import permissions, viewsets
+from rest_framework.response import Response
+from products.cards import product_cards
+from products.models import Product
+from products.serializers import ProductCardSerializer
+from .refresh import TOP_K
+
+DEFAULT_LIMIT = 8
+
+
+class AlsoBoughtViewSet(viewsets.ViewSet):
+    """The "customers also bought" products for a product, read from the precomputed neighbours"""
+    permission_classes = [permissions.AllowAny]
+    lookup_value_regex = '[0-9]+'
+
+    def retrieve(self, request, pk=None):
+        try:
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), TOP_K)
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        products = product_cards(Product.objects.filter(
+            neighbour_of__product_id=pk
+        )).order_by('neighbour_of__rank')[:limit]
+        serializer = ProductCardSerializer(products, many=True, context={'request': request})
+        return Response(serializer.data)
@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from backend.sparse import SparseFieldsMixin
 from .models import Address
 
-class AddressSerializer(serializers.ModelSerializer):
+class AddressSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Address
         fields = '__all__'
@@ -1,16 +1,18 @@
 from rest_framework import serializers
+from backend.sparse import SparseFieldsMixin
 from .models import Wishlist, WishlistItem
+from .services import MAX_ITEMS
 from products.models import Product
-from products.serializers import ProductSerializer  # Import your existing Product serializer
+from products.serializers import ProductCardSerializer
 
-class WishlistItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer()  # Nested serializer to display product details
+class WishlistItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    product = ProductCardSerializer()
 
     class Meta:
         model = WishlistItem
         fields = ['id', 'product', 'size']  # Include size in the fields
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     wishlist_items = WishlistItemSerializer(many=True, read_only=True)
 
     class Meta:
@@ -47,3 +49,18 @@ class WishlistCreateItemSerializer(serializers.ModelSerializer):
         )
 
         return wishlist_item
+
+class WishlistBatchItemSerializer(serializers.Serializer):
+    # validated against one prefetch of all the batch's products, not per item
+    product = serializers.IntegerField(min_value=1)
+    size = serializers.CharField(max_length=10, required=False, allow_blank=True, allow_null=True)
+
+class WishlistBatchAddSerializer(serializers.Serializer):
+    items = WishlistBatchItemSerializer(many=True, allow_empty=False, max_length=MAX_ITEMS)
+
+class WishlistProductsSerializer(serializers.Serializer):
+    """Products selected on the wishlist, for batch removal or moving to the cart"""
+    products = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_ITEMS
+    )
+    quantity = serializers.IntegerField(min_value=1, default=1)
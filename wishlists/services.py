@@ -0,0 +1,105 @@
+from django.db import transaction
+from carts.services import ADD, InvalidCartOperations, apply_cart_operations
+from products.models import Product
+from .models import Wishlist, WishlistItem
+
+MAX_ITEMS = 200
+
+
+class InvalidWishlistItems(Exception):
+    """Raised with the errors per product id when a batch cannot be applied"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f'{len(errors)} invalid wishlist item(s)')
+
+
+def wishlist_for(user):
+    """The user's oldest wishlist, created if they have none"""
+    wishlist = Wishlist.objects.filter(user=user).order_by('id').first()
+    if wishlist is None:
+        wishlist = Wishlist.objects.create(user=user)
+    return wishlist
+
+
+def add_wishlist_items(user, items):
+    """
+    Add ``items`` (dicts with product and size) to the user's wishlist in
+    one transaction. A product already on any of the user's wishlists has
+    its size updated instead of being listed twice. All products are
+    checked with one query before anything is written; on failure
+    InvalidWishlistItems is raised. Returns the number of items created.
+    """
+    sizes = {item['product']: item.get('size') or None for item in items}
+    with transaction.atomic():
+        products = Product.objects.only('id', 'name', 'sizes').in_bulk(sizes)
+        errors = {}
+        for product_id, size in sizes.items():
+            product = products.get(product_id)
+            if product is None:
+                errors[product_id] = {'product': f'Product {product_id} does not exist.'}
+            elif size is not None and size not in product.sizes:
+                errors[product_id] = {'size': f"Size '{size}' is not available for {product.name}."}
+        if errors:
+            raise InvalidWishlistItems(errors)
+
+        wishlist = wishlist_for(user)
+        existing = WishlistItem.objects.filter(wishlist__user=user, product_id__in=sizes).order_by('id')
+        to_update = []
+        for item in existing:
+            size = sizes.pop(item.product_id, item.size)
+            if size != item.size:
+                item.size = size
+                to_update.append(item)
+        if to_update:
+            WishlistItem.objects.bulk_update(to_update, ['size'])
+        created = WishlistItem.objects.bulk_create([
+            WishlistItem(wishlist=wishlist, product_id=product_id, size=size) for product_id, size in sizes.items()
+        ])
+    return len(created)
+
+
+def remove_wishlist_items(user, product_ids):
+    """Remove the products from all the user's wishlists in one query; returns the number of items removed"""
+    deleted, _ = WishlistItem.objects.filter(wishlist__user=user, product_id__in=product_ids).delete()
+    return deleted
+
+
+def move_items_to_cart(user, product_ids, quantity=1):
+    """
+    Move the wishlisted ``product_ids`` into the user's cart, ``quantity``
+    of each in the size picked on the wishlist, and drop them from the
+    wishlist. Both sides change in one transaction through the cart's bulk
+    operations; if any product is not wishlisted, has no size picked or is
+    no longer available in it, InvalidWishlistItems is raised and neither
+    changes. Returns the cart.
+    """
+    with transaction.atomic():
+        items = list(
+            WishlistItem.objects.select_for_update()
+            .filter(wishlist__user=user, product_id__in=product_ids).order_by('id')
+        )
+        chosen = {}
+        for item in items:
+            chosen.setdefault(item.product_id, item)
+        errors = {}
+        for product_id in product_ids:
+            item = chosen.get(product_id)
+            if item is None:
+                errors[product_id] = {'product': 'This product is not on your wishlist.'}
+            elif not item.size:
+                errors[product_id] = {'size': 'Pick a size before moving this product to the cart.'}
+        if errors:
+            raise InvalidWishlistItems(errors)
+
+        lines = list(chosen.values())
+        try:
+            cart = apply_cart_operations(user, [
+                {'op': ADD, 'product': item.product_id, 'size': item.size, 'quantity': quantity} for item in lines
+            ])
+        except InvalidCartOperations as e:
+            raise InvalidWishlistItems({
+                lines[index].product_id: error for index, error in e.errors.items()
+            }) from e
+        WishlistItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+    return cart
@@ -1,3 +1,165 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from backend.instrumentation import QueryBudgetTestMixin
+from carts.models import Cart, CartItem
+from products.models import Category, Product, ProductImage, Review
+from .models import Wishlist, WishlistItem
 
-# Create your tests here.
+User = get_user_model()
+
+
+class MyWishlistTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            email='wisher@example.com', first_name='Wish', last_name='Er',
+            phone_number='9840000000', password='secret'
+        )
+        self.category = Category.objects.create(name='Sarees', description='Sarees')
+        self.client.force_authenticate(self.user)
+
+    def create_products(self, count):
+        return Product.objects.bulk_create([
+            Product(
+                name=f'Saree {i}', slug=f'saree-{i}', category=self.category, description='Silk saree',
+                price=5000, stock=3, sizes={'M': 3}
+            )
+            for i in range(count)
+        ])
+
+    def test_my_wishlist_takes_two_queries_at_200_items(self):
+        products = self.create_products(200)
+        ProductImage.objects.create(product=products[0], image='products/saree-0.jpg')
+        Review.objects.create(product=products[0], user=self.user, quality_rating=4, value_rating=5, size='M')
+        wishlist = Wishlist.objects.create(user=self.user)
+        WishlistItem.objects.bulk_create([WishlistItem(wishlist=wishlist, product=p, size='M') for p in products])
+
+        # the wishlists, then the items joined with their product cards
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('wishlist-my-wishlist'))
+
+        items = response.data['wishlist_items']
+        self.assertEqual(len(items), 200)
+        card = items[0]['product']
+        self.assertEqual(card['name'], 'Saree 0')
+        self.assertTrue(card['thumbnail'].endswith('products/saree-0.jpg'))
+        self.assertEqual(card['rating'], {'average': 4.5, 'total_reviews': 1})
+        self.assertNotIn('description', card)
+
+    def test_duplicate_wishlists_are_shown_as_one(self):
+        first, second, third = self.create_products(3)
+        older = Wishlist.objects.create(user=self.user)
+        newer = Wishlist.objects.create(user=self.user)
+        WishlistItem.objects.create(wishlist=older, product=first, size='M')
+        WishlistItem.objects.create(wishlist=newer, product=second, size='M')
+        WishlistItem.objects.create(wishlist=newer, product=first, size='M')
+        WishlistItem.objects.create(wishlist=older, product=third, size='M')
+
+        response = self.client.get(reverse('wishlist-my-wishlist'))
+
+        self.assertEqual(response.data['id'], older.pk)
+        self.assertEqual([item['product']['name'] for item in response.data['wishlist_items']], [
+            'Saree 0', 'Saree 1', 'Saree 2',
+        ])
+
+    def test_unrequested_items_are_not_loaded(self):
+        wishlist = Wishlist.objects.create(user=self.user)
+        WishlistItem.objects.create(wishlist=wishlist, product=self.create_products(1)[0], size='M')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('wishlist-my-wishlist'), {'fields': 'id,created_at'})
+        self.assertEqual(set(response.data), {'id', 'created_at'})
+
+
+class WishlistBatchTests(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            email='batcher@example.com', first_name='Bat', last_name='Cher',
+            phone_number='9840000001', password='secret'
+        )
+        category = Category.objects.create(name='Kurtas', description='Kurtas')
+        self.products = Product.objects.bulk_create([
+            Product(
+                name=f'Kurta {i}', slug=f'kurta-{i}', category=category, description='Cotton kurta',
+                price=1000, stock=4, sizes={'S': 2, 'M': 2}
+            )
+            for i in range(10)
+        ])
+        self.client.force_authenticate(self.user)
+
+    def test_add_items_creates_and_resizes_in_bulk(self):
+        wishlist = Wishlist.objects.create(user=self.user)
+        WishlistItem.objects.create(wishlist=wishlist, product=self.products[0], size='S')
+        items = [{'product': product.pk, 'size': 'M'} for product in self.products]
+
+        # products, wishlist, existing items, one update, one insert, then the
+        # wishlist as my_wishlist returns it, inside a savepoint
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('wishlist-add-items'), {'items': items}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['wishlist_items']), 10)
+        self.assertEqual(set(WishlistItem.objects.values_list('size', flat=True)), {'M'})
+
+        response = self.client.post(reverse('wishlist-add-items'), {'items': [
+            {'product': self.products[1].pk, 'size': 'XL'}, {'product': self.products[-1].pk + 100},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['items']), {self.products[1].pk, self.products[-1].pk + 100})
+
+    def test_remove_items_in_one_query(self):
+        wishlist = Wishlist.objects.create(user=self.user)
+        WishlistItem.objects.bulk_create([WishlistItem(wishlist=wishlist, product=p) for p in self.products])
+        removed = [product.pk for product in self.products[:7]]
+
+        response = self.client.post(reverse('wishlist-remove-items'), {'products': removed}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['product']['name'] for item in response.data['wishlist_items']], [
+            'Kurta 7', 'Kurta 8', 'Kurta 9',
+        ])
+
+    def test_move_to_cart_moves_all_or_nothing(self):
+        wishlist = Wishlist.objects.create(user=self.user)
+        WishlistItem.objects.bulk_create([
+            WishlistItem(wishlist=wishlist, product=product, size='M' if i else None)
+            for i, product in enumerate(self.products[:4])
+        ])
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.products[1], size='M')
+
+        # no size picked for the first product: nothing moves
+        picked = [product.pk for product in self.products[:3]]
+        response = self.client.post(reverse('wishlist-move-to-cart'), {'products': picked}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['products']), {self.products[0].pk})
+        self.assertEqual(WishlistItem.objects.count(), 4)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+        response = self.client.post(reverse('wishlist-move-to-cart'), {'products': picked[1:]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(line['product']['name'], line['quantity']) for line in response.data['items']],
+            [('Kurta 1', 2), ('Kurta 2', 1)],
+        )
+        self.assertEqual(
+            sorted(WishlistItem.objects.values_list('product_id', flat=True)),
+            [self.products[0].pk, self.products[3].pk],
+        )
+
+    def test_move_to_cart_rejects_out_of_stock_sizes(self):
+        sold_out = self.products[0]
+        sold_out.sizes = {'S': 2, 'M': 0}
+        sold_out.save()
+        wishlist = Wishlist.objects.create(user=self.user)
+        WishlistItem.objects.create(wishlist=wishlist, product=sold_out, size='M')
+        WishlistItem.objects.create(wishlist=wishlist, product=self.products[1], size='M')
+
+        response = self.client.post(reverse('wishlist-move-to-cart'), {
+            'products': [sold_out.pk, self.products[1].pk],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['products']), {sold_out.pk})
+        self.assertEqual(WishlistItem.objects.count(), 2)
+        self.assertFalse(CartItem.objects.exists())
@@ -2,19 +2,61 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action, parser_classes
 from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
+from backend.instrumentation import InstrumentedViewMixin
+from backend.sparse import field_requested
 from .models import Wishlist, WishlistItem
-from .serializers import WishlistSerializer, WishlistItemSerializer, WishlistCreateItemSerializer
+from .serializers import (
+    WishlistSerializer, WishlistItemSerializer, WishlistCreateItemSerializer, WishlistBatchAddSerializer,
+    WishlistProductsSerializer,
+)
+from .services import (
+    InvalidWishlistItems, add_wishlist_items, move_items_to_cart, remove_wishlist_items, wishlist_for,
+)
+from carts.serializers import CartSerializer
+from carts.views import prefetch_cart_lines
+from products.cards import attach_selected_cards, prefetch_product_cards, select_product_cards
 from products.models import Product
 
-class WishlistViewSet(viewsets.ModelViewSet):
+
+def load_wishlist(user, items=True):
+    """
+    The user's wishlist, with its items and their product cards when
+    ``items``, in two queries whatever the number of items.
+
+    Nothing stops a user from owning several wishlists; the oldest is
+    returned holding the items of all of them, each product once.
+    """
+    wishlists = list(Wishlist.objects.filter(user=user).order_by('id'))
+    if not wishlists:
+        return None
+    wishlist = wishlists[0]
+    if items:
+        rows = select_product_cards(WishlistItem.objects.filter(wishlist__in=wishlists).order_by('id'))
+        merged = {}
+        for item in attach_selected_cards(rows):
+            merged.setdefault(item.product_id, item)
+        # what prefetch_related would store, so wishlist_items.all() needs no query
+        wishlist._prefetched_objects_cache = {'wishlist_items': list(merged.values())}
+    return wishlist
+
+
+class WishlistViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    query_budgets = {
+        'list': 4, 'retrieve': 4, 'my_wishlist': 3, 'add_items': 10, 'remove_items': 4, 'move_to_cart': 14,
+    }
     parser_classes = [JSONParser, FormParser, MultiPartParser]  # Accept JSON, Form, and MultiPart form-data
 
     def get_queryset(self):
         """Filter wishlist by logged-in user."""
-        return self.queryset.filter(user=self.request.user)
+        queryset = self.queryset.filter(user=self.request.user)
+        if field_requested(self.request, 'wishlist_items'):
+            queryset = queryset.prefetch_related('wishlist_items')
+        if field_requested(self.request, 'wishlist_items', 'product'):
+            queryset = queryset.prefetch_related(prefetch_product_cards('wishlist_items__product'))
+        return queryset
 
     def perform_create(self, serializer):
         """Assign the user to the wishlist."""
@@ -23,7 +65,7 @@ class WishlistViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticatedOrReadOnly], parser_classes=[JSONParser, FormParser, MultiPartParser])
     def add_item(self, request):
         """Custom action to add an item to the user's wishlist with form-data support."""
-        wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
+        wishlist = wishlist_for(request.user)
         serializer = WishlistCreateItemSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save(wishlist=wishlist)
@@ -47,7 +89,45 @@ class WishlistViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticatedOrReadOnly])
     def my_wishlist(self, request):
-        """Custom action to retrieve the user's wishlist."""
-        wishlist = self.get_queryset().first()
+        """The user's wishlist: its items with compact product cards."""
+        wishlist = load_wishlist(request.user, items=field_requested(request, 'wishlist_items'))
         serializer = self.get_serializer(wishlist)
         return Response(serializer.data)
+
+    def wishlist_response(self, request, status_code=status.HTTP_200_OK):
+        wishlist = load_wishlist(request.user, items=field_requested(request, 'wishlist_items'))
+        return Response(self.get_serializer(wishlist).data, status=status_code)
+
+    @action(detail=False, methods=['post'], url_path='items/add')
+    def add_items(self, request):
+        """Add or re-size many products on the user's wishlist in one transaction."""
+        batch = WishlistBatchAddSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        try:
+            add_wishlist_items(request.user, batch.validated_data['items'])
+        except InvalidWishlistItems as e:
+            return Response({'items': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return self.wishlist_response(request)
+
+    @action(detail=False, methods=['post'], url_path='items/remove')
+    def remove_items(self, request):
+        """Remove many products from the user's wishlist in one query."""
+        batch = WishlistProductsSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        remove_wishlist_items(request.user, batch.validated_data['products'])
+        return self.wishlist_response(request)
+
+    @action(detail=False, methods=['post'], url_path='items/move_to_cart')
+    def move_to_cart(self, request):
+        """
+        Move the selected products into the cart in the sizes picked on the
+        wishlist; all of them or, on any error, none. Returns the cart.
+        """
+        batch = WishlistProductsSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        try:
+            cart = move_items_to_cart(request.user, batch.validated_data['products'], batch.validated_data['quantity'])
+        except InvalidWishlistItems as e:
+            return Response({'products': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        prefetch_cart_lines([cart])
+        return Response(CartSerializer(cart, context=self.get_serializer_context()).data)